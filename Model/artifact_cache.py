@@ -0,0 +1,152 @@
+# artifact_cache.py
+#
+# Content-addressed cache for everything the export pipeline derives:
+#   <root>/<kind>-<hash>/manifest.json   what the key was built from
+#   <root>/<kind>-<hash>/<name>.npz      arrays (state_dict, quantized tensors)
+#   <root>/<kind>-<hash>/<file>          exported files (.mem / .mif / ...)
+#
+# A key hashes everything that can change the result: the source code of
+# the model definition and of the functions that produce the artifact,
+# hyperparameters, the dataset files and the key of the upstream artifact
+# it was derived from. So a trained state_dict is reused until SimpleCNN,
+# train_model, the hyperparameters or the MNIST cache change, and
+# re-exporting in a different format never retrains.
+#
+# Dataset digests are memoized by (size, mtime) so the 47 MB training set
+# is hashed once, not on every run.
+
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+
+ARTIFACT_DIR = "./data/artifacts"
+DIGEST_MEMO = "file_digests.json"
+KEY_HEX = 16
+
+
+def _atomic_write(path, write):
+    """Call write(tmp_path), then move it into place, so a crash never leaves a partial artifact."""
+    tmp = path + ".tmp"
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def code_digest(*objs):
+    """sha256 over the source of functions / classes / modules."""
+    h = hashlib.sha256()
+    for obj in objs:
+        h.update(inspect.getsource(obj).encode())
+    return h.hexdigest()
+
+
+class ArtifactCache:
+
+    def __init__(self, root=ARTIFACT_DIR, enabled=True):
+        self.root = root
+        self.enabled = enabled
+        self.parts = {}
+        os.makedirs(root, exist_ok=True)
+
+    ###########################################
+    # Keys
+    ###########################################
+
+    def file_digest(self, path):
+        """sha256 of a file, memoized on (size, mtime)."""
+        memo_path = os.path.join(self.root, DIGEST_MEMO)
+        memo = {}
+        if os.path.exists(memo_path):
+            with open(memo_path) as f:
+                memo = json.load(f)
+
+        st = os.stat(path)
+        stamp = [st.st_size, st.st_mtime_ns]
+        abspath = os.path.abspath(path)
+        if abspath in memo and memo[abspath][:2] == stamp:
+            return memo[abspath][2]
+
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        memo[abspath] = stamp + [h.hexdigest()]
+
+        def write(tmp):
+            with open(tmp, "w") as f:
+                json.dump(memo, f, indent=1)
+        _atomic_write(memo_path, write)
+        return memo[abspath][2]
+
+    def key(self, kind, **parts):
+        """'<kind>-<hash>' of the JSON-encoded parts (strings, numbers, upstream keys)."""
+        blob = json.dumps(parts, sort_keys=True, default=str).encode()
+        key = f"{kind}-{hashlib.sha256(blob).hexdigest()[:KEY_HEX]}"
+        self.parts[key] = parts
+        return key
+
+    def entry_dir(self, key):
+        return os.path.join(self.root, key)
+
+    def _touch_manifest(self, key, name):
+        path = os.path.join(self.entry_dir(key), "manifest.json")
+        manifest = {"key": key, "parts": self.parts.get(key, {}),
+                    "created": time.strftime("%Y-%m-%d %H:%M:%S"), "artifacts": []}
+        if os.path.exists(path):
+            with open(path) as f:
+                manifest = json.load(f)
+        if name not in manifest["artifacts"]:
+            manifest["artifacts"].append(name)
+
+        def write(tmp):
+            with open(tmp, "w") as f:
+                json.dump(manifest, f, indent=2)
+        _atomic_write(path, write)
+
+    ###########################################
+    # Arrays
+    ###########################################
+
+    def load_arrays(self, key, name):
+        """{array name: ndarray} stored under key, or None on a miss."""
+        path = os.path.join(self.entry_dir(key), f"{name}.npz")
+        if not self.enabled or not os.path.exists(path):
+            return None
+        with np.load(path) as f:
+            return {k: f[k] for k in f.files}
+
+    def save_arrays(self, key, name, arrays):
+        os.makedirs(self.entry_dir(key), exist_ok=True)
+        path = os.path.join(self.entry_dir(key), f"{name}.npz")
+
+        def write(tmp):
+            with open(tmp, "wb") as f:
+                np.savez(f, **arrays)
+        _atomic_write(path, write)
+        self._touch_manifest(key, f"{name}.npz")
+
+    ###########################################
+    # Exported files
+    ###########################################
+
+    def fetch_files(self, key, names, dest_dir="."):
+        """Copy cached exports into dest_dir. False (nothing copied) unless all are cached."""
+        src = [os.path.join(self.entry_dir(key), os.path.basename(n)) for n in names]
+        if not self.enabled or not all(os.path.exists(p) for p in src):
+            return False
+        for path in src:
+            shutil.copyfile(path, os.path.join(dest_dir, os.path.basename(path)))
+        return True
+
+    def store_files(self, key, paths):
+        os.makedirs(self.entry_dir(key), exist_ok=True)
+        for path in paths:
+            name = os.path.basename(path)
+            _atomic_write(os.path.join(self.entry_dir(key), name),
+                          lambda tmp, src=path: shutil.copyfile(src, tmp))
+            self._touch_manifest(key, name)
@@ -0,0 +1,225 @@
+# calibration.py
+#
+# Dataset-wide activation calibration for the integer pipeline.
+#
+# Streams batches through SimpleCNN, keeps one fixed-size histogram per
+# activation tensor (memory does not grow with the dataset), then picks a
+# clipping threshold per tensor with one of:
+#   - "max"        : largest value seen
+#   - "percentile" : smallest threshold covering `percentile` % of values
+#   - "mse"        : threshold minimizing expected rounding + clipping error
+#   - "kl"         : entropy calibration (KL divergence over 128 levels)
+#
+# Scales follow the mnist_model.py convention (q = x * scale) and, with
+# pow2=True, are rounded down to a power of two so the tensor is a plain
+# fixed-point value on the FPGA.
+
+import numpy as np
+import torch
+
+
+CALIB_METHODS = ("max", "percentile", "mse", "kl")
+QMAX = 127
+
+
+def forward_activations(model, x):
+    """
+    Run SimpleCNN and return the post-ReLU activations the integer
+    pipeline requantizes: {"conv1": (N,8,26,26), "conv2": (N,16,11,11)}.
+    conv2's scale is shared by the pooled FC features.
+    """
+    a1 = torch.relu(model.conv1(x))
+    a2 = torch.relu(model.conv2(model.pool(a1)))
+    return {"conv1": a1, "conv2": a2}
+
+
+###########################################
+# 1. STREAMING HISTOGRAM
+###########################################
+
+class StreamingHistogram:
+    """
+    Histogram of |x| over [0, max_val] with a fixed bin count.
+    When a batch exceeds the current range, the range grows by a power of
+    two and neighbouring bins are merged, so earlier batches never need
+    to be revisited. max_val is therefore the histogram range; the largest
+    |x| actually seen is kept separately in observed_max.
+    """
+
+    def __init__(self, bins=2048):
+        if bins & (bins - 1):
+            raise ValueError("bins must be a power of two")
+        self.bins = bins
+        self.counts = np.zeros(bins, dtype=np.float64)
+        self.max_val = 0.0
+        self.observed_max = 0.0
+        self.total = 0
+
+    def _grow(self, new_max):
+        factor = 1
+        while self.max_val * factor < new_max:
+            factor *= 2
+        if factor >= self.bins:
+            merged = np.zeros(self.bins)
+            merged[0] = self.counts.sum()
+        else:
+            merged = np.zeros(self.bins)
+            merged[:self.bins // factor] = self.counts.reshape(-1, factor).sum(axis=1)
+        self.counts = merged
+        self.max_val *= factor
+
+    def update(self, x):
+        """x: torch tensor of any shape (kept on its device for histc)."""
+        x = x.detach().abs().float()
+        batch_max = float(x.max())
+        self.observed_max = max(self.observed_max, batch_max)
+        if batch_max == 0.0 and self.max_val == 0.0:
+            self.counts[0] += x.numel()
+            self.total += x.numel()
+            return
+
+        if self.max_val == 0.0:
+            self.max_val = batch_max
+        elif batch_max > self.max_val:
+            self._grow(batch_max)
+
+        hist = torch.histc(x, bins=self.bins, min=0.0, max=self.max_val)
+        self.counts += hist.cpu().numpy().astype(np.float64)
+        self.total += x.numel()
+
+    @property
+    def bin_width(self):
+        return self.max_val / self.bins
+
+    def edges(self):
+        return np.linspace(0.0, self.max_val, self.bins + 1)
+
+
+###########################################
+# 2. THRESHOLD SELECTION
+###########################################
+
+def threshold_max(hist):
+    return hist.observed_max
+
+
+def threshold_percentile(hist, percentile=99.99):
+    cdf = np.cumsum(hist.counts) / max(hist.counts.sum(), 1.0)
+    idx = int(np.searchsorted(cdf, percentile / 100.0))
+    return (min(idx, hist.bins - 1) + 1) * hist.bin_width
+
+
+def threshold_mse(hist, num_candidates=256):
+    """
+    Expected squared error for each candidate clip value t:
+      values below t  -> uniform rounding error, step^2 / 12
+      values above t  -> clipped to t, error (x - t)^2
+    """
+    centers = (np.arange(hist.bins) + 0.5) * hist.bin_width
+    cand_idx = np.unique(np.linspace(hist.bins // 16, hist.bins, num_candidates).astype(int))
+    t = cand_idx * hist.bin_width                                  # (K,)
+
+    below = np.cumsum(hist.counts)[cand_idx - 1]                  # (K,)
+    round_err = (t / QMAX) ** 2 / 12.0 * below
+    over = np.clip(centers[None, :] - t[:, None], 0.0, None)       # (K,B)
+    clip_err = (over ** 2 * hist.counts[None, :]).sum(axis=1)
+
+    return float(t[np.argmin(round_err + clip_err)])
+
+
+def threshold_kl(hist, num_levels=QMAX + 1):
+    """
+    Entropy calibration: for each candidate cut i, fold the tail into the
+    last bin (P), requantize P to num_levels levels (Q) and keep the cut
+    with the smallest KL(P || Q).
+    """
+    counts = hist.counts
+    best_i, best_kl = hist.bins, np.inf
+
+    for i in range(num_levels, hist.bins + 1, max(1, hist.bins // 256)):
+        p = counts[:i].copy()
+        p[-1] += counts[i:].sum()
+        if p.sum() == 0:
+            continue
+
+        # Merge i bins into num_levels groups, then spread each group's
+        # mass evenly over its non-empty source bins.
+        group = (np.arange(i) * num_levels) // i
+        nonzero = counts[:i] > 0
+        g_sum = np.bincount(group, weights=counts[:i], minlength=num_levels)
+        g_cnt = np.bincount(group, weights=nonzero, minlength=num_levels)
+        q = np.where(nonzero, g_sum[group] / np.maximum(g_cnt[group], 1), 0.0)
+
+        p = p / p.sum()
+        q_sum = q.sum()
+        if q_sum == 0:
+            continue
+        q = q / q_sum
+
+        mask = p > 0
+        q_safe = np.where(q[mask] > 0, q[mask], 1e-12)
+        kl = float(np.sum(p[mask] * np.log(p[mask] / q_safe)))
+        if kl < best_kl:
+            best_kl, best_i = kl, i
+
+    return best_i * hist.bin_width
+
+
+def pow2_scale(scale):
+    """Largest power of two <= scale, so the threshold is never clipped further."""
+    return float(2.0 ** np.floor(np.log2(scale)))
+
+
+def choose_scale(hist, method="percentile", percentile=99.99, pow2=True):
+    if method == "max":
+        thr = threshold_max(hist)
+    elif method == "percentile":
+        thr = threshold_percentile(hist, percentile)
+    elif method == "mse":
+        thr = threshold_mse(hist)
+    elif method == "kl":
+        thr = threshold_kl(hist)
+    else:
+        raise ValueError(f"unknown calibration method {method!r}, expected one of {CALIB_METHODS}")
+
+    if thr <= 0.0:
+        return 1.0
+    scale = float(QMAX / thr)
+    return pow2_scale(scale) if pow2 else scale
+
+
+###########################################
+# 3. CALIBRATION PASS
+###########################################
+
+def collect_histograms(model, loader, device, num_batches=None, bins=2048):
+    """
+    Stream `num_batches` batches (all of them if None) through the model
+    and return {tensor name: StreamingHistogram}.
+    """
+    model.to(device)
+    model.eval()
+
+    hists = {}
+    with torch.no_grad():
+        for i, (images, _) in enumerate(loader):
+            if num_batches is not None and i >= num_batches:
+                break
+            for name, act in forward_activations(model, images.to(device)).items():
+                hists.setdefault(name, StreamingHistogram(bins)).update(act)
+    return hists
+
+
+def calibrate(model, loader, device, method="percentile", num_batches=None,
+              percentile=99.99, pow2=True, bins=2048):
+    """
+    One shared activation scale per tensor, ready for
+    golden_model.IntCNN.from_float(..., act_scales).
+    """
+    hists = collect_histograms(model, loader, device, num_batches, bins)
+    scales = {name: choose_scale(h, method, percentile, pow2) for name, h in hists.items()}
+
+    for name, h in hists.items():
+        print(f"Calibrated {name}: max={h.observed_max:.4f} "
+              f"values={h.total} scale={scales[name]:.4f} ({method})")
+    return scales
@@ -0,0 +1,260 @@
+# cosim.py
+#
+# Python-vs-RTL co-simulation of fc_core.v.
+#
+#   1. Generate feature vectors: the FC inputs of real frames run through
+#      the integer golden model (--int-model), plus corner cases (all
+#      zero, all +127, all -128, alternating signs, random full-range).
+#   2. Split them into shards, one directory each under --work:
+#        fc_w_flat.mem, fc_b.mem, features.mem, vec_00000.mem, ...
+#   3. Compile tb_fc_core_vec.v + fc_core.v once with Icarus Verilog or
+#      Verilator, then run one simulator process per shard in parallel.
+#   4. Diff every vector's digit, 10 scores and cycle count against
+#      golden_model.fc_int_forward_batch and perf_model's cycle model.
+#
+# Prints a pass/fail summary, writes report.json to the work directory
+# and exits non-zero on any mismatch, so it can gate a regression run.
+#
+# Usage:
+#   python cosim.py --vectors 4096 --jobs 8
+#   python cosim.py --int-model int_cnn.npz --sim verilator
+
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from golden_model import IntCNN, fc_int_forward_batch
+from memfile import read_image, to_signed, write_mem
+from perf_model import BASELINE, estimate, fc_layer
+
+
+RTL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "verilog_for_inference", "milestone_1")
+RTL_SOURCES = ("tb_fc_core_vec.v", "fc_core.v")
+TB_TOP = "tb_fc_core_vec"
+WORK_DIR = "./data/cosim"
+SIMULATORS = ("icarus", "verilator")
+
+VEC_LINE = re.compile(r"^VEC (\d+) DIGIT (\d+) CYCLES (\d+) SCORES((?: -?\d+)+)\s*$")
+TIMEOUT_LINE = re.compile(r"^VEC (\d+) TIMEOUT")
+
+
+###########################################
+# 1. VECTORS
+###########################################
+
+def corner_vectors(n_in, rng):
+    """Vectors that stress the signed multiply and the argmax."""
+    return np.stack([
+        np.zeros(n_in),                                   # scores == biases
+        np.full(n_in, 127),
+        np.full(n_in, -128),
+        np.where(np.arange(n_in) % 2, 127, -128),
+        rng.integers(-128, 128, n_in),
+    ]).astype(np.int8)
+
+
+def make_vectors(n, n_in=400, model=None, seed=0):
+    """
+    n int8 feature vectors. With an IntCNN, all but the corner cases are
+    the FC inputs of test-set frames (random frames if none are cached);
+    without one they are random post-ReLU values in [0, 127].
+    """
+    rng = np.random.default_rng(seed)
+    corners = corner_vectors(n_in, rng)[:n]
+    n_rest = n - corners.shape[0]
+
+    if model is None:
+        rest = rng.integers(0, 128, (n_rest, n_in)).astype(np.int8)
+    else:
+        try:
+            from mnist_cache import load_split
+            frames = np.asarray(load_split("test")[0][:n_rest])
+        except (ImportError, OSError, RuntimeError) as e:
+            print(f"No cached test set ({e}); using random frames")
+            frames = np.zeros((0, 28, 28), dtype=np.uint8)
+        if frames.shape[0] < n_rest:
+            extra = rng.integers(0, 256, (n_rest - frames.shape[0], 28, 28), dtype=np.uint8)
+            frames = np.concatenate([frames, extra])
+        rest = model.forward(frames, return_stages=True)[2]["features"]
+    return np.concatenate([corners, rest])
+
+
+def load_rtl_weights(rtl_dir=RTL_DIR):
+    """(fc_w (10,400) int8, fc_b (10,) int16) from the milestone_1 memory files."""
+    w = to_signed(read_image(os.path.join(rtl_dir, "fc_w_flat.mem")), 8)
+    b = to_signed(read_image(os.path.join(rtl_dir, "fc_b.mem")), 16)
+    return w.reshape(b.size, -1).astype(np.int8), b.astype(np.int16)
+
+
+def write_shard(shard_dir, feats, fc_w, fc_b):
+    os.makedirs(shard_dir, exist_ok=True)
+    write_mem(os.path.join(shard_dir, "fc_w_flat.mem"), fc_w.reshape(-1), 8)
+    write_mem(os.path.join(shard_dir, "fc_b.mem"), fc_b, 16)
+    write_mem(os.path.join(shard_dir, "features.mem"), feats[0], 8)
+    for i, vec in enumerate(feats):
+        write_mem(os.path.join(shard_dir, f"vec_{i:05d}.mem"), vec, 8)
+
+
+###########################################
+# 2. SIMULATORS
+###########################################
+
+def build(sim, build_dir, rtl_dir=RTL_DIR):
+    """Compile the testbench once. Returns the command that runs it."""
+    tool = "iverilog" if sim == "icarus" else "verilator"
+    if shutil.which(tool) is None:
+        raise RuntimeError(f"{tool} is not on PATH")
+    os.makedirs(build_dir, exist_ok=True)
+    sources = [os.path.abspath(os.path.join(rtl_dir, s)) for s in RTL_SOURCES]
+    if sim == "icarus":
+        out = os.path.abspath(os.path.join(build_dir, f"{TB_TOP}.vvp"))
+        subprocess.run(["iverilog", "-g2005", "-s", TB_TOP, "-o", out] + sources, check=True)
+        return ["vvp", "-n", out]
+
+    obj_dir = os.path.abspath(os.path.join(build_dir, "obj_dir"))
+    subprocess.run(["verilator", "--binary", "--timing", "-Wno-fatal", "--top-module", TB_TOP,
+                    "--Mdir", obj_dir] + sources, check=True, stdout=subprocess.DEVNULL)
+    return [os.path.join(obj_dir, f"V{TB_TOP}")]
+
+
+def run_shard(cmd, shard_dir, n, timeout):
+    """Run one shard in its own simulator process. Returns (returncode, stdout, stderr)."""
+    try:
+        proc = subprocess.run(cmd + [f"+N={n}"], cwd=shard_dir, capture_output=True,
+                              text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return None, "", f"timed out after {timeout} s"
+    return proc.returncode, proc.stdout, proc.stderr
+
+
+def parse_output(stdout):
+    """{vector index: (digit, cycles, scores) or None on a testbench timeout}."""
+    results = {}
+    for line in stdout.splitlines():
+        m = VEC_LINE.match(line)
+        if m:
+            scores = np.array(m.group(4).split(), dtype=np.int64)
+            results[int(m.group(1))] = (int(m.group(2)), int(m.group(3)), scores)
+            continue
+        m = TIMEOUT_LINE.match(line)
+        if m:
+            results[int(m.group(1))] = None
+    return results
+
+
+###########################################
+# 3. CO-SIMULATION
+###########################################
+
+def compare(index, got, scores, pred, cycles):
+    """Mismatch description for one vector, or None if the RTL agrees."""
+    if got is None:
+        return f"vector {index}: no done within the testbench timeout"
+    digit, rtl_cycles, rtl_scores = got
+    errors = []
+    if digit != pred:
+        errors.append(f"digit {digit} != {pred}")
+    if rtl_scores.shape != scores.shape or not np.array_equal(rtl_scores, scores):
+        bad = [c for c in range(min(rtl_scores.size, scores.size)) if rtl_scores[c] != scores[c]]
+        errors.append(f"scores differ at classes {bad or 'count'}")
+    if rtl_cycles != cycles:
+        errors.append(f"{rtl_cycles} cycles != {cycles}")
+    return f"vector {index}: " + ", ".join(errors) if errors else None
+
+
+def cosim(feats, fc_w, fc_b, sim="icarus", jobs=None, work_dir=WORK_DIR, timeout=600.0):
+    """Run every vector through the RTL and diff it. Returns the report dict."""
+    jobs = jobs or os.cpu_count() or 1
+    scores, preds = fc_int_forward_batch(feats, fc_w, fc_b)
+    cycles = estimate(BASELINE, fc_layer(fc_w.shape[1], fc_w.shape[0]))["latency_cycles"]
+
+    t0 = time.perf_counter()
+    cmd = build(sim, os.path.join(work_dir, "build"))
+    build_time = time.perf_counter() - t0
+
+    bounds = np.linspace(0, feats.shape[0], min(jobs, feats.shape[0]) + 1).astype(int)
+    shards = []
+    for s, (lo, hi) in enumerate(zip(bounds[:-1], bounds[1:])):
+        shard_dir = os.path.join(work_dir, f"shard_{s:03d}")
+        shutil.rmtree(shard_dir, ignore_errors=True)
+        write_shard(shard_dir, feats[lo:hi], fc_w, fc_b)
+        shards.append((shard_dir, lo, hi))
+
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        outputs = list(pool.map(run_shard, [cmd] * len(shards), [s[0] for s in shards],
+                                [s[2] - s[1] for s in shards], [timeout] * len(shards)))
+    sim_time = time.perf_counter() - t0
+
+    failures = []
+    for (shard_dir, lo, hi), (returncode, stdout, stderr) in zip(shards, outputs):
+        results = parse_output(stdout)
+        if returncode != 0:
+            failures.append(f"{shard_dir}: simulator exited with {returncode}: {stderr.strip()[-200:]}")
+        for i in range(hi - lo):
+            if i not in results:
+                failures.append(f"vector {lo + i}: no output from {shard_dir}")
+                continue
+            err = compare(lo + i, results[i], scores[lo + i], preds[lo + i], cycles)
+            if err:
+                failures.append(err)
+
+    return {
+        "simulator": sim,
+        "vectors": int(feats.shape[0]),
+        "shards": len(shards),
+        "jobs": jobs,
+        "expected_cycles": cycles,
+        "build_s": round(build_time, 3),
+        "sim_s": round(sim_time, 3),
+        "failures": failures,
+        "passed": not failures,
+    }
+
+
+def print_summary(report, limit=20):
+    status = "PASS" if report["passed"] else "FAIL"
+    print(f"{status}: {report['vectors']} vectors on {report['simulator']}, {report['shards']} shards "
+          f"x {report['jobs']} workers, build {report['build_s']:.1f} s, sim {report['sim_s']:.1f} s "
+          f"(digit + 10 scores + {report['expected_cycles']} cycles each)")
+    for line in report["failures"][:limit]:
+        print(f"  {line}")
+    if len(report["failures"]) > limit:
+        print(f"  ... {len(report['failures']) - limit} more")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Co-simulate fc_core.v against the integer golden model.")
+    parser.add_argument("--vectors", type=int, default=1024)
+    parser.add_argument("--int-model", default=None,
+                        help="IntCNN .npz: FC weights and real features (default: milestone_1 .mem weights)")
+    parser.add_argument("--sim", choices=SIMULATORS, default="icarus")
+    parser.add_argument("--jobs", type=int, default=None, help="parallel simulator processes (default: CPU count)")
+    parser.add_argument("--work", default=WORK_DIR)
+    parser.add_argument("--timeout", type=float, default=600.0, help="seconds per shard")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    model = IntCNN.load(args.int_model) if args.int_model else None
+    if model is None:
+        fc_w, fc_b = load_rtl_weights()
+    else:
+        fc_w, fc_b = model.params["fc.w"], model.params["fc.b"]
+    feats = make_vectors(args.vectors, fc_w.shape[1], model, args.seed)
+
+    report = cosim(feats, fc_w, fc_b, args.sim, args.jobs, args.work, args.timeout)
+    with open(os.path.join(args.work, "report.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    print_summary(report)
+    raise SystemExit(0 if report["passed"] else 1)
+
+
+if __name__ == "__main__":
+    main()
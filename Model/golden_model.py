@@ -0,0 +1,327 @@
+# golden_model.py
+#
+# Integer-only reference for the whole SimpleCNN datapath:
+#   uint8 frame (28x28) -> conv1 -> ReLU -> pool -> conv2 -> ReLU -> pool
+#   -> FC (400 -> 10) -> argmax
+#
+# Everything here is plain NumPy (no torch), so the host tools and the
+# FPGA emulator can import it without the training stack.
+#
+# Scale convention (same as quantize_to_int8 in mnist_model.py):
+#   q = round(x_float * scale)      i.e. scale = "LSBs per float unit"
+#
+# Per-layer rules:
+#   - weights : int8, symmetric, round-half-to-even (np.round), clip [-128,127]
+#   - conv bias: int32 at scale in_scale * w_scale
+#   - FC bias : int16 at scale feat_scale * w_scale (fc_b.mem is 16-bit)
+#   - accumulators are 32-bit and wrap like a Verilog reg signed [31:0]
+#   - requantization: out = (acc * M + 2^(shift-1)) >>> shift
+#       with M an unsigned REQUANT_BITS-bit integer and >>> arithmetic,
+#       i.e. round-half-up. ReLU is fused as a clamp to [0, 127].
+#   - max-pool 2x2 / stride 2, floor mode (26->13, 11->5) as nn.MaxPool2d
+#   - argmax ties go to the lowest class index (S_ARGMAX in fc_core.v)
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+INPUT_SCALE = 255.0   # frame byte = ToTensor() pixel * 255
+REQUANT_BITS = 15     # width of the requant multiplier M
+ACT_MAX = 127         # post-ReLU activations are int8 >= 0
+
+CONV_LAYERS = ("conv1", "conv2")
+
+
+###########################################
+# 1. INTEGER PRIMITIVES
+###########################################
+
+def wrap_int32(x):
+    """
+    Reduce an int64 array modulo 2^32 into int32, the way a 32-bit
+    signed register in fc_core.v wraps on overflow.
+    """
+    return np.asarray(x, dtype=np.int64).astype(np.int32)
+
+
+def argmax_first(scores):
+    """
+    Row-wise argmax where ties go to the lowest class index.
+    Matches S_ARGMAX in fc_core.v, which only replaces best_j on a
+    strictly greater score.
+    """
+    return np.argmax(scores, axis=-1)
+
+
+def requant_multiplier(ratio, bits=REQUANT_BITS):
+    """
+    Express each positive float ratio as M / 2^shift with M a `bits`-wide
+    unsigned integer in [2^(bits-1), 2^bits).
+    Returns (M, shift) as int64 arrays with the shape of `ratio`.
+    """
+    ratio = np.atleast_1d(np.asarray(ratio, dtype=np.float64))
+    if np.any(ratio <= 0):
+        raise ValueError("requant ratio must be positive")
+
+    exp = np.floor(np.log2(ratio)).astype(np.int64)
+    shift = (bits - 1) - exp
+    M = np.round(ratio * np.exp2(shift)).astype(np.int64)
+
+    # Rounding can push M to 2^bits; renormalize.
+    over = M >= (1 << bits)
+    M[over] >>= 1
+    shift[over] -= 1
+
+    if np.any(shift < 0):
+        raise ValueError("requant ratio too large for a right shift")
+    return M, shift
+
+
+def requantize(acc, M, shift, axis=1):
+    """
+    Integer requantization (acc * M) >> shift with round-half-up.
+    M and shift are per output channel and broadcast along `axis`.
+    """
+    acc = np.asarray(acc, dtype=np.int64)
+    shape = [1] * acc.ndim
+    shape[axis] = -1
+    M = np.asarray(M, dtype=np.int64).reshape(shape)
+    shift = np.asarray(shift, dtype=np.int64).reshape(shape)
+
+    rnd = np.where(shift > 0, np.left_shift(1, np.maximum(shift - 1, 0)), 0)
+    return (acc * M + rnd) >> shift
+
+
+def im2col(x, kh, kw):
+    """
+    x: (N,C,H,W) -> (N*OH*OW, C*kh*kw) patches, valid padding, stride 1.
+    Built from a strided view; only the final reshape copies.
+    """
+    n, c, h, w = x.shape
+    oh, ow = h - kh + 1, w - kw + 1
+    win = sliding_window_view(x, (kh, kw), axis=(2, 3))   # (N,C,OH,OW,kh,kw)
+    cols = win.transpose(0, 2, 3, 1, 4, 5).reshape(n * oh * ow, c * kh * kw)
+    return cols, (n, oh, ow)
+
+
+def conv2d_int(x, W_q, b_q):
+    """
+    x: (N,C,H,W) integer, W_q: (O,C,kh,kw) int8, b_q: (O,) int32
+    Returns the raw 32-bit accumulators, (N,O,OH,OW) int32.
+    """
+    o, _, kh, kw = W_q.shape
+    cols, (n, oh, ow) = im2col(np.asarray(x, dtype=np.int64), kh, kw)
+    acc = cols @ W_q.reshape(o, -1).astype(np.int64).T
+    acc += b_q.astype(np.int64)[None, :]
+    acc = acc.reshape(n, oh, ow, o).transpose(0, 3, 1, 2)
+    return wrap_int32(acc)
+
+
+def relu_requant(acc, M, shift):
+    """Requantize conv accumulators and apply ReLU as a clamp to [0,127]."""
+    return np.clip(requantize(acc, M, shift), 0, ACT_MAX).astype(np.int8)
+
+
+def maxpool2x2_int(x):
+    """2x2 / stride 2 max-pool, floor mode (drops the odd last row/col)."""
+    n, c, h, w = x.shape
+    h2, w2 = h // 2, w // 2
+    x = x[:, :, :2 * h2, :2 * w2].reshape(n, c, h2, 2, w2, 2)
+    return x.max(axis=(3, 5))
+
+
+def fc_int_forward_batch(feats_q, W_q, b_q):
+    """
+    Batched integer FC, bit-exact with fc_core.v.
+
+    feats_q: (N,400) int8
+    W_q: (10,400) int8
+    b_q: (10,) int16
+    Returns:
+      scores: (N,10) int32 (accumulator wraps like the 32-bit acc register)
+      preds: (N,) int64
+    """
+    feats_q = np.asarray(feats_q)
+    if feats_q.ndim != 2 or feats_q.shape[1] != W_q.shape[1]:
+        raise ValueError(f"feats_q must be (N,{W_q.shape[1]}), got {feats_q.shape}")
+
+    # Sum in int64, then wrap once: addition mod 2^32 is associative, so
+    # this equals the sequential 32-bit accumulation in S_ACCUM.
+    acc = feats_q.astype(np.int64) @ W_q.astype(np.int64).T
+    acc += b_q.astype(np.int64)[None, :]
+    scores = wrap_int32(acc)
+
+    preds = argmax_first(scores)
+    return scores, preds
+
+
+###########################################
+# 2. QUANTIZING A FLOAT STATE_DICT
+###########################################
+
+def quantize_weight_int8(w):
+    """Symmetric per-tensor int8 weights. Returns (w_q, scale)."""
+    w = np.asarray(w, dtype=np.float64)
+    max_abs = np.max(np.abs(w))
+    scale = 1.0 if max_abs == 0.0 else 127.0 / max_abs
+    w_q = np.clip(np.round(w * scale), -128, 127).astype(np.int8)
+    return w_q, scale
+
+
+def quantize_bias(b, scale, bits):
+    """Round bias to a signed `bits`-wide integer at the accumulator scale."""
+    lo, hi = -(1 << (bits - 1)), (1 << (bits - 1)) - 1
+    b_q = np.clip(np.round(np.asarray(b, dtype=np.float64) * scale), lo, hi)
+    return b_q.astype(np.int32 if bits > 16 else np.int16)
+
+
+def _fmt_channels(a):
+    """One value if every channel shares it, else the per-channel list."""
+    a = np.asarray(a)
+    return str(a.flat[0]) if np.all(a == a.flat[0]) else str(a.tolist())
+
+
+def _fmt_scale(a):
+    """A per-tensor scale, or the range of per-channel scales."""
+    a = np.asarray(a, dtype=np.float64)
+    if a.size == 1:
+        return f"{float(a):.4f}"
+    return f"[{a.min():.4f}..{a.max():.4f}] per channel"
+
+
+def effective_weight(p, name):
+    """Weights as the accumulator sees them: w, or w - w_zp (per output channel)."""
+    w = p[f"{name}.w"]
+    if f"{name}.w_zp" not in p:
+        return w
+    zp = np.asarray(p[f"{name}.w_zp"], dtype=np.int16)
+    return w.astype(np.int16) - zp.reshape((-1,) + (1,) * (w.ndim - 1))
+
+
+def frames_to_nchw(frames):
+    """Accept (28,28), (N,28,28), (N,784) or (N,1,28,28) uint8 frames."""
+    x = np.asarray(frames)
+    if x.dtype != np.uint8:
+        raise TypeError(f"frames must be uint8, got {x.dtype}")
+    if x.ndim == 2 and x.shape == (28, 28):
+        x = x[None]
+    if x.ndim == 2 and x.shape[1] == 784:
+        x = x.reshape(-1, 28, 28)
+    if x.ndim == 3:
+        x = x[:, None]
+    if x.ndim != 4 or x.shape[1:] != (1, 28, 28):
+        raise ValueError(f"unexpected frame shape {np.asarray(frames).shape}")
+    return x
+
+
+class IntCNN:
+    """
+    Quantized SimpleCNN. `params` holds only NumPy arrays so the model can
+    round-trip through np.savez:
+
+      <layer>.w, <layer>.b       int8 weights / int32 (conv) or int16 (fc) bias
+      <layer>.w_scale            weight scale (per tensor, or per output
+                                 channel for quantization.py's modes)
+      <layer>.w_zp               optional int weight zero point (asymmetric
+                                 modes); the datapath uses w - w_zp
+      <layer>.in_scale           scale of the layer input
+      <layer>.out_scale          scale of the requantized output (conv only)
+      <layer>.M, <layer>.shift   per-output-channel requant (conv only)
+    """
+
+    def __init__(self, params):
+        self.params = {k: np.asarray(v) for k, v in params.items()}
+
+    @classmethod
+    def from_float(cls, state_dict, act_scales):
+        """
+        state_dict: {name: float ndarray} with conv1/conv2/fc weights+biases
+        act_scales: {"conv1": s1, "conv2": s2} post-ReLU activation scales.
+                    conv2's scale is also the FC feature scale (pooling
+                    does not change it).
+        """
+        p = {}
+        in_scale = INPUT_SCALE
+        for name in CONV_LAYERS:
+            w_q, w_scale = quantize_weight_int8(state_dict[f"{name}.weight"])
+            acc_scale = in_scale * w_scale
+            out_scale = float(act_scales[name])
+            n_out = w_q.shape[0]
+            M, shift = requant_multiplier(np.full(n_out, out_scale / acc_scale))
+
+            p[f"{name}.w"] = w_q
+            p[f"{name}.b"] = quantize_bias(state_dict[f"{name}.bias"], acc_scale, 32)
+            p[f"{name}.w_scale"] = w_scale
+            p[f"{name}.in_scale"] = in_scale
+            p[f"{name}.out_scale"] = out_scale
+            p[f"{name}.M"] = M
+            p[f"{name}.shift"] = shift
+            in_scale = out_scale
+
+        w_q, w_scale = quantize_weight_int8(state_dict["fc.weight"])
+        p["fc.w"] = w_q
+        p["fc.b"] = quantize_bias(state_dict["fc.bias"], in_scale * w_scale, 16)
+        p["fc.w_scale"] = w_scale
+        p["fc.in_scale"] = in_scale
+        return cls(p)
+
+    def save(self, path):
+        np.savez(path, **self.params)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            return cls({k: f[k] for k in f.files})
+
+    def describe(self):
+        """Per-layer scales and requant rules, one line per layer."""
+        lines = []
+        for name in CONV_LAYERS:
+            p = self.params
+            lines.append(
+                f"{name}: w_scale={_fmt_scale(p[name + '.w_scale'])} "
+                f"in_scale={float(p[name + '.in_scale']):.4f} "
+                f"out_scale={float(p[name + '.out_scale']):.4f} "
+                f"M={_fmt_channels(p[name + '.M'])} "
+                f"shift={_fmt_channels(p[name + '.shift'])}"
+            )
+        lines.append(
+            f"fc: w_scale={_fmt_scale(self.params['fc.w_scale'])} "
+            f"in_scale={float(self.params['fc.in_scale']):.4f} (int16 bias, int32 acc)"
+        )
+        return "\n".join(lines)
+
+    def forward(self, frames, return_stages=False):
+        """
+        frames: uint8 frames, the same 784 bytes DrawingApp sends.
+        Returns (scores (N,10) int32, preds (N,)), plus a dict of every
+        intermediate integer tensor if return_stages is set.
+        """
+        p = self.params
+        x = frames_to_nchw(frames)
+        stages = {"input": x}
+
+        for name in CONV_LAYERS:
+            acc = conv2d_int(x, effective_weight(p, name), p[f"{name}.b"])
+            act = relu_requant(acc, p[f"{name}.M"], p[f"{name}.shift"])
+            x = maxpool2x2_int(act)
+            if return_stages:
+                stages[f"{name}_acc"] = acc
+                stages[f"{name}_act"] = act
+                stages[f"{name}_pool"] = x
+
+        feats_q = x.reshape(x.shape[0], -1).astype(np.int8)
+        scores, preds = fc_int_forward_batch(feats_q, p["fc.w"], p["fc.b"])
+        if return_stages:
+            stages["features"] = feats_q
+            stages["scores"] = scores
+            stages["preds"] = preds
+            return scores, preds, stages
+        return scores, preds
+
+    def predict(self, frames, batch_size=4096):
+        """Predicted digits for a large stack of frames, in chunks."""
+        x = frames_to_nchw(frames)
+        preds = [self.forward(x[i:i + batch_size])[1]
+                 for i in range(0, x.shape[0], batch_size)]
+        return np.concatenate(preds) if preds else np.zeros(0, dtype=np.int64)
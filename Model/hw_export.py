@@ -0,0 +1,213 @@
+# hw_export.py
+#
+# One-pass hardware export of every layer of a model:
+#   <out>/<layer>_w.{mem,mif}      int8 weights, C order (out, in, kh, kw) /
+#                                  (out, in) - the order fc_w_flat.mem and
+#                                  weights.mif already use
+#   <out>/<layer>_b.{mem,mif}      int32 (conv) / int16 (fc) biases
+#   <out>/<layer>_M, _shift        per-channel requant (IntCNN conv layers)
+#   <out>/model.bin                every tensor packed little-endian, each
+#                                  at a 4-byte aligned offset
+#   <out>/manifest.json            shape, width, scale, word count, memory
+#                                  depth and model.bin offset per tensor
+#
+# Two sources:
+#   --int-model int_cnn.npz   the quantized golden model from mnist_model.py
+#                             (accumulator-scale biases and requant
+#                             constants that match golden_model.py exactly)
+#   --state-dict X.pth|.npz   any float state_dict: every <layer>.weight is
+#                             quantized to int8 per tensor and its bias on
+#                             its own max-abs scale (both in the manifest)
+#
+# Formatting goes through memfile.py, so large models export quickly;
+# the CLI parses every file back and checks it against the tensors.
+#
+# --pack-width W additionally writes every weight tensor packed into
+# W-bit words over --banks banks (weight_layout.py) under <out>/packed.
+#
+# Usage:
+#   python hw_export.py --int-model int_cnn.npz --out hw_export
+#   python hw_export.py --state-dict ../mnist_cnn.pth --formats mif bin
+#   python hw_export.py --int-model int_cnn.npz --pack-width 64 --banks 4
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+from golden_model import CONV_LAYERS, IntCNN, quantize_bias, quantize_weight_int8
+from memfile import WRITERS, check_image, depth_for, format_bin
+from weight_layout import LAYOUTS, WORD_WIDTHS, check_round_trip, write_packed
+
+
+FORMATS = tuple(WRITERS)
+BIN_ALIGN = 4
+
+
+def _tensor(name, values, width, scale=None, signed=True):
+    return {"name": name, "values": np.asarray(values), "width": width,
+            "scale": None if scale is None else np.asarray(scale, dtype=np.float64).tolist(),
+            "signed": signed}
+
+
+###########################################
+# Collecting tensors
+###########################################
+
+def int_model_tensors(params):
+    """Hardware tensors of an IntCNN, in datapath order."""
+    p = params
+    tensors = []
+    for name in CONV_LAYERS:
+        w_scale = np.asarray(p[f"{name}.w_scale"], dtype=np.float64)
+        acc_scale = float(p[f"{name}.in_scale"]) * w_scale
+        if np.any(np.asarray(p.get(f"{name}.w_zp", 0)) != 0):
+            # w - w_zp spans [-255, 255]: a 9-bit operand the int8 MAC cannot take
+            raise ValueError(f"{name}: asymmetric weights (nonzero zero point) do not fit the int8 MAC")
+        tensors += [
+            _tensor(f"{name}_w", p[f"{name}.w"], 8, w_scale),
+            _tensor(f"{name}_b", p[f"{name}.b"], 32, acc_scale),
+            _tensor(f"{name}_M", p[f"{name}.M"], 16, signed=False),
+            _tensor(f"{name}_shift", p[f"{name}.shift"], 8, signed=False),
+        ]
+    w_scale = float(p["fc.w_scale"])
+    tensors += [
+        _tensor("fc_w", p["fc.w"], 8, w_scale),
+        _tensor("fc_b", p["fc.b"], 16, float(p["fc.in_scale"]) * w_scale),
+    ]
+    return tensors
+
+
+def state_dict_tensors(state_dict, bias_bits=32):
+    """
+    Every <layer>.weight (+ .bias) of a float state_dict. Biases use their
+    own max-abs scale, since no activation scales are known here.
+    """
+    tensors = []
+    for key in state_dict:
+        if not key.endswith(".weight"):
+            continue
+        layer = key[:-len(".weight")].replace(".", "_")
+        w_q, w_scale = quantize_weight_int8(state_dict[key])
+        tensors.append(_tensor(f"{layer}_w", w_q, 8, w_scale))
+
+        bias_key = key[:-len(".weight")] + ".bias"
+        if bias_key in state_dict:
+            b = np.asarray(state_dict[bias_key], dtype=np.float64)
+            max_abs = np.max(np.abs(b))
+            b_scale = 1.0 if max_abs == 0.0 else ((1 << (bias_bits - 1)) - 1) / max_abs
+            tensors.append(_tensor(f"{layer}_b", quantize_bias(b, b_scale, bias_bits),
+                                   bias_bits, b_scale))
+    return tensors
+
+
+def load_state_dict(path):
+    """Float {name: ndarray} from a torch checkpoint or an .npz."""
+    if path.endswith(".npz"):
+        with np.load(path) as f:
+            return {k: f[k] for k in f.files}
+
+    import torch
+    obj = torch.load(path, map_location="cpu")
+    if isinstance(obj, dict) and isinstance(obj.get("state_dict"), dict):
+        obj = obj["state_dict"]
+    return {k: v.detach().cpu().numpy() for k, v in obj.items() if isinstance(v, torch.Tensor)}
+
+
+###########################################
+# Writing
+###########################################
+
+def export_tensors(tensors, out_dir, formats=("mem", "mif", "bin"), source=None):
+    """Write every tensor in `formats` plus manifest.json. Returns the manifest."""
+    unknown = set(formats) - set(FORMATS)
+    if unknown:
+        raise ValueError(f"unknown formats {sorted(unknown)}, expected {FORMATS}")
+    os.makedirs(out_dir, exist_ok=True)
+
+    manifest = {"source": source, "formats": list(formats), "bin_align": BIN_ALIGN, "tensors": []}
+    blob = bytearray()
+    for t in tensors:
+        values = t["values"]
+        entry = {
+            "name": t["name"],
+            "shape": list(values.shape),
+            "words": int(values.size),
+            "width": t["width"],
+            "signed": t["signed"],
+            "scale": t["scale"],
+            "depth": depth_for(values.size),
+            "files": {},
+        }
+        for fmt in formats:
+            if fmt == "bin":
+                blob += b"\0" * (-len(blob) % BIN_ALIGN)
+                entry["offset"] = len(blob)
+                blob += format_bin(values, t["width"])
+                continue
+            path = os.path.join(out_dir, f"{t['name']}.{fmt}")
+            WRITERS[fmt](path, values, t["width"])
+            entry["files"][fmt] = os.path.basename(path)
+        manifest["tensors"].append(entry)
+
+    if "bin" in formats:
+        with open(os.path.join(out_dir, "model.bin"), "wb") as f:
+            f.write(bytes(blob))
+        manifest["bin_file"] = "model.bin"
+        manifest["bin_bytes"] = len(blob)
+
+    with open(os.path.join(out_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def verify_export(tensors, out_dir, formats=("mem", "mif")):
+    """Parse every written .mem/.mif back and compare it with its tensor."""
+    for t in tensors:
+        for fmt in formats:
+            path = os.path.join(out_dir, f"{t['name']}.{fmt}")
+            if os.path.exists(path):
+                check_image(path, t["values"], t["width"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export every layer to .mem/.mif/.bin with a manifest.")
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument("--int-model", help="IntCNN .npz from mnist_model.py")
+    src.add_argument("--state-dict", help="float state_dict (.pth or .npz)")
+    parser.add_argument("--out", default="hw_export")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=list(FORMATS))
+    parser.add_argument("--pack-width", type=int, choices=WORD_WIDTHS, default=None,
+                        help="also write weights packed into words of this width (weight_layout.py)")
+    parser.add_argument("--banks", type=int, default=1)
+    parser.add_argument("--layout", choices=LAYOUTS, default="row")
+    args = parser.parse_args()
+
+    if args.int_model:
+        tensors = int_model_tensors(IntCNN.load(args.int_model).params)
+        source = args.int_model
+    else:
+        tensors = state_dict_tensors(load_state_dict(args.state_dict))
+        source = args.state_dict
+
+    manifest = export_tensors(tensors, args.out, args.formats, source)
+    verify_export(tensors, args.out, args.formats)
+    for t in manifest["tensors"]:
+        print(f"{t['name']:12s} {str(t['shape']):18s} {t['words']:6d} x {t['width']:2d} bit "
+              f"(depth {t['depth']})")
+    print(f"Wrote {len(manifest['tensors'])} tensors to {args.out}/ (read back OK)")
+
+    if args.pack_width:
+        packed_dir = os.path.join(args.out, "packed")
+        for t in tensors:
+            if t["width"] != 8 or not t["name"].endswith("_w"):
+                continue
+            write_packed(packed_dir, t["values"], args.pack_width, args.banks, args.layout, t["name"])
+            check_round_trip(packed_dir, t["name"], t["values"])
+        print(f"Packed weights ({args.pack_width}-bit words, {args.banks} banks, {args.layout}) "
+              f"in {packed_dir}/ (round trip OK)")
+
+
+if __name__ == "__main__":
+    main()
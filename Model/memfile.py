@@ -0,0 +1,422 @@
+# memfile.py
+#
+# Vectorized writers and parsers for FPGA memory images:
+#   .mem  one hex word per line, for $readmemh (features.mem, fc_w_flat.mem)
+#   .mif  Quartus memory initialization file (weights.mif)
+#   .bin  packed little-endian words (write only)
+#
+# Values are signed or unsigned integers of any width up to 32 bits
+# (wider words, e.g. packed weight rows, go through the *_wide functions);
+# negatives are written in two's complement, masked to `width` bits, the
+# same as the old per-element `int(v) & 0xFF` loops. Each file is built as
+# one ASCII byte array with NumPy and written in a single call, so a
+# 100k-word image takes milliseconds instead of a Python loop per word.
+#
+# The parsers read what the writers (and Quartus / hand-edited files) use:
+#   .mem  hex words separated by whitespace, // and /* */ comments,
+#         @addr directives, _ separators
+#   .mif  DEPTH / WIDTH / ADDRESS_RADIX / DATA_RADIX header, -- and %..%
+#         comments, "a : v;", "a : v0 v1 ...;" and "[a..b] : v;" entries
+# Both return unsigned words as int64; unwritten addresses read as 0.
+# diff_images() / check_image() compare an image against the model.
+#
+# Run `python memfile.py diff a.mem b.mif` to compare two images.
+
+import argparse
+import re
+import sys
+from collections import namedtuple
+
+import numpy as np
+
+
+HEX_DIGITS = np.frombuffer(b"0123456789ABCDEF", dtype=np.uint8)
+DEC_DIGITS = np.frombuffer(b"0123456789", dtype=np.uint8)
+SPACE = ord(" ")
+NEWLINE = ord("\n")
+
+# ASCII -> digit value, -1 for anything that is not a hex digit
+DIGIT_VALUE = np.full(256, -1, dtype=np.int64)
+for _i, _c in enumerate(b"0123456789ABCDEF"):
+    DIGIT_VALUE[_c] = _i
+    DIGIT_VALUE[ord(chr(_c).lower())] = _i
+
+MIF_RADIX = {"HEX": 16, "DEC": 10, "UNS": 10, "OCT": 8, "BIN": 2}
+
+ImageDiff = namedtuple("ImageDiff", "addresses a b len_a len_b")
+
+
+def hex_width(width):
+    """Hex digits per word."""
+    return (width + 3) // 4
+
+
+def depth_for(n):
+    """Smallest power of two >= n (memory depth for n words)."""
+    return 1 << max(0, int(n) - 1).bit_length()
+
+
+def to_unsigned(values, width):
+    """Two's-complement bit pattern of each value, masked to `width` bits, as int64."""
+    return np.asarray(values).reshape(-1).astype(np.int64) & ((1 << width) - 1)
+
+
+def to_signed(values, width):
+    """Reinterpret unsigned `width`-bit words as two's-complement signed."""
+    u = np.asarray(values, dtype=np.int64)
+    sign = 1 << (width - 1)
+    return (u ^ sign) - sign
+
+
+def _hex_chars(values, width):
+    """(n, hex_width) ASCII array of upper-case, zero-padded hex words."""
+    u = to_unsigned(values, width)
+    shifts = 4 * np.arange(hex_width(width) - 1, -1, -1)
+    return HEX_DIGITS[(u[:, None] >> shifts) & 0xF]
+
+
+def _dec_chars(values, ndigits):
+    """(n, ndigits) ASCII array of right-aligned, space-padded decimals."""
+    v = np.asarray(values, dtype=np.int64).reshape(-1)
+    pows = 10 ** np.arange(ndigits - 1, -1, -1, dtype=np.int64)
+    chars = DEC_DIGITS[(v[:, None] // pows) % 10]
+    leading = (v[:, None] < pows) & (pows > 1)     # blank leading zeros, keep a lone 0
+    chars[leading] = SPACE
+    return chars
+
+
+def _join(*columns):
+    """Concatenate per-row ASCII columns (2-D arrays or constant bytes) into bytes."""
+    n = next(c.shape[0] for c in columns if isinstance(c, np.ndarray))
+    parts = [c if isinstance(c, np.ndarray)
+             else np.broadcast_to(np.frombuffer(c, dtype=np.uint8), (n, len(c)))
+             for c in columns]
+    return np.concatenate(parts, axis=1).tobytes()
+
+
+###########################################
+# Formatting
+###########################################
+
+def format_mem(values, width=8):
+    """$readmemh text: one hex word per line."""
+    values = np.asarray(values).reshape(-1)
+    if values.size == 0:
+        return b""
+    return _join(_hex_chars(values, width), b"\n")
+
+
+def format_mif(values, width=8, depth=None):
+    """
+    Quartus MIF with decimal addresses and hex data, laid out like
+    extract.py's weights.mif. Addresses past the data up to depth-1 are
+    filled with a single [a..b] : 0 range entry.
+    """
+    values = np.asarray(values).reshape(-1)
+    return _format_mif(_hex_chars(values, width), width, depth)
+
+
+def _format_mif(hex_chars, width, depth=None):
+    """MIF text around an (n, digits) ASCII array of hex words."""
+    n = hex_chars.shape[0]
+    depth = depth_for(n) if depth is None else depth
+    if n > depth:
+        raise ValueError(f"{n} words do not fit in DEPTH = {depth}")
+
+    header = (f"DEPTH = {depth};\nWIDTH = {width};\n"
+              "ADDRESS_RADIX = DEC;\nDATA_RADIX = HEX;\nCONTENT BEGIN\n").encode()
+    body = b""
+    if n:
+        ndigits = max(3, len(str(depth - 1)))
+        body = _join(b"  ", _dec_chars(np.arange(n), ndigits), b" : ", hex_chars, b";\n")
+    fill = b""
+    if n < depth:
+        fill = f"  [{n}..{depth - 1}] : {0:0{hex_width(width)}X};\n".encode()
+    return header + body + fill + b"END;\n"
+
+
+def format_bin(values, width=8):
+    """Packed little-endian words of ceil(width / 8) bytes."""
+    nbytes = {1: 1, 2: 2, 3: 4, 4: 4}[(width + 7) // 8]
+    return to_unsigned(values, width).astype(f"<u{nbytes}").tobytes()
+
+
+###########################################
+# Writing
+###########################################
+
+def write_mem(path, values, width=8):
+    with open(path, "wb") as f:
+        f.write(format_mem(values, width))
+
+
+def write_mif(path, values, width=8, depth=None):
+    with open(path, "wb") as f:
+        f.write(format_mif(values, width, depth))
+
+
+def write_bin(path, values, width=8):
+    with open(path, "wb") as f:
+        f.write(format_bin(values, width))
+
+
+WRITERS = {"mem": write_mem, "mif": write_mif, "bin": write_bin}
+
+
+###########################################
+# Wide words
+###########################################
+
+# Words wider than 32 bits (packed weight rows) do not fit the int64
+# path above. They are handled as (n, nbytes) uint8 rows instead, byte 0
+# in the least significant position, so Verilog lane l of a word is
+# word[8*l +: 8].
+
+def _wide_hex_chars(rows):
+    """(n, 2 * nbytes) ASCII hex of little-endian byte rows, most significant byte first."""
+    b = np.asarray(rows, dtype=np.uint8)[:, ::-1]
+    nibbles = np.stack([b >> 4, b & 0xF], axis=2).reshape(b.shape[0], -1)
+    return HEX_DIGITS[nibbles]
+
+
+def format_mem_wide(rows):
+    rows = np.asarray(rows, dtype=np.uint8)
+    if rows.shape[0] == 0:
+        return b""
+    return _join(_wide_hex_chars(rows), b"\n")
+
+
+def format_mif_wide(rows, depth=None):
+    rows = np.asarray(rows, dtype=np.uint8)
+    return _format_mif(_wide_hex_chars(rows), 8 * rows.shape[1], depth)
+
+
+def write_wide(path, rows, depth=None):
+    """Write byte rows as .mem, .mif or .bin (by extension)."""
+    rows = np.asarray(rows, dtype=np.uint8)
+    ext = path.lower().rsplit(".", 1)[-1]
+    data = {"mem": lambda: format_mem_wide(rows),
+            "mif": lambda: format_mif_wide(rows, depth),
+            "bin": rows.tobytes}[ext]()
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def _hex_rows(tokens, nbytes):
+    """Hex tokens -> (n, nbytes) little-endian byte rows."""
+    if not tokens:
+        return np.zeros((0, nbytes), dtype=np.uint8)
+    digits = 2 * nbytes
+    if max(len(t) for t in tokens) > digits:
+        raise ValueError(f"word wider than {8 * nbytes} bits")
+    raw = bytes.fromhex(b"".join(t.rjust(digits, b"0") for t in tokens).decode())
+    return np.frombuffer(raw, dtype=np.uint8).reshape(-1, nbytes)[:, ::-1].copy()
+
+
+def read_wide_image(path, nbytes):
+    """
+    (n, nbytes) byte rows of a wide .mem, .mif or .bin file. MIF files must
+    be hex data with "a : v;" entries and an optional zero "[a..b]" fill,
+    as format_mif_wide writes them; the result has DEPTH rows.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    ext = path.lower().rsplit(".", 1)[-1]
+    if ext == "bin":
+        return np.frombuffer(data, dtype=np.uint8).reshape(-1, nbytes).copy()
+    if ext == "mem":
+        data = re.sub(rb"//[^\n]*", b"", data).replace(b"_", b"")
+        return _hex_rows(data.split(), nbytes)
+
+    depth = int(re.search(rb"DEPTH\s*=\s*(\d+)", data).group(1))
+    entries = re.findall(rb"^\s*(\d+)\s*:\s*([0-9A-Fa-f]+)\s*;", data, flags=re.M)
+    rows = np.zeros((depth, nbytes), dtype=np.uint8)
+    if entries:
+        addresses = np.array([int(a) for a, _ in entries])
+        rows[addresses] = _hex_rows([v for _, v in entries], nbytes)
+    return rows
+
+
+###########################################
+# Parsing
+###########################################
+
+def parse_tokens(tokens, radix=16):
+    """
+    List of ASCII number tokens (bytes) -> int64 array, in one NumPy pass:
+    tokens become a fixed-width byte matrix, digits are looked up and
+    weighted by radix ** position.
+    """
+    if len(tokens) == 0:
+        return np.zeros(0, dtype=np.int64)
+    chars = np.array(tokens, dtype=bytes)
+    width = chars.dtype.itemsize
+    mat = chars.view(np.uint8).reshape(-1, width)
+    present = mat != 0                                   # right-padded with NUL
+    digits = DIGIT_VALUE[mat]
+    if np.any(present & ((digits < 0) | (digits >= radix))):
+        bad = tokens[int(np.flatnonzero(np.any(present & ((digits < 0) | (digits >= radix)), axis=1))[0])]
+        raise ValueError(f"invalid base-{radix} number {bad!r}")
+
+    lengths = present.sum(axis=1)
+    power = lengths[:, None] - 1 - np.arange(width)
+    weights = np.where(power >= 0, radix ** np.maximum(power, 0), 0)
+    return (np.where(present, digits, 0) * weights).sum(axis=1)
+
+
+def _dense(addresses, values, depth=None):
+    """Scatter (address, value) pairs into a zero-filled array."""
+    size = int(addresses.max()) + 1 if addresses.size else 0
+    depth = size if depth is None else depth
+    if size > depth:
+        raise ValueError(f"address {size - 1} is past DEPTH = {depth}")
+    out = np.zeros(depth, dtype=np.int64)
+    out[addresses] = values
+    return out
+
+
+def parse_mem(data):
+    """
+    $readmemh text (bytes or str) -> unsigned words. @addr directives set
+    the next address; words land at consecutive addresses from there.
+    """
+    if isinstance(data, str):
+        data = data.encode()
+    data = re.sub(rb"/\*.*?\*/", b" ", data, flags=re.S)
+    data = re.sub(rb"//[^\n]*", b"", data).replace(b"_", b"")
+
+    if b"@" not in data:
+        return parse_tokens(data.split())
+
+    addresses, values = [], []
+    next_addr = 0
+    for chunk in re.split(rb"(@[0-9A-Fa-f]+)", data):
+        if chunk.startswith(b"@"):
+            next_addr = int(chunk[1:], 16)
+            continue
+        words = parse_tokens(chunk.split())
+        addresses.append(np.arange(next_addr, next_addr + words.size))
+        values.append(words)
+        next_addr += words.size
+    return _dense(np.concatenate(addresses), np.concatenate(values))
+
+
+def _mif_entry(entry, addr_radix, data_radix):
+    """One "a : v0 v1 ...;" or "[a..b] : v0 v1 ...;" entry -> (addresses, values)."""
+    addr, _, vals = entry.partition(b":")
+    words = parse_tokens(vals.split(), data_radix)
+    addr = addr.strip()
+    if addr.startswith(b"["):
+        lo, hi = parse_tokens([a.strip() for a in addr.strip(b"[]").split(b"..")], addr_radix)
+        span = np.arange(lo, hi + 1)
+        return span, np.resize(words, span.size)     # a pattern repeats over the range
+    start = parse_tokens([addr], addr_radix)[0]
+    return np.arange(start, start + words.size), words
+
+
+def parse_mif(data):
+    """
+    Quartus MIF text -> (unsigned words (DEPTH,), header dict). Plain
+    "a : v" entries are parsed in bulk; range and multi-value entries one
+    by one (there are only a few of them in practice).
+    """
+    if isinstance(data, str):
+        data = data.encode()
+    data = re.sub(rb"--[^\n]*", b"", data)
+    data = re.sub(rb"%[^%]*%", b"", data)
+
+    head, sep, body = data.partition(b"CONTENT")
+    if not sep:
+        raise ValueError("MIF has no CONTENT section")
+    header = {k.decode().upper(): v.decode().strip().upper()
+              for k, v in re.findall(rb"(\w+)\s*=\s*([^;]+);", head)}
+    depth = int(header["DEPTH"])
+    addr_radix = MIF_RADIX[header.get("ADDRESS_RADIX", "HEX")]
+    data_radix = MIF_RADIX[header.get("DATA_RADIX", "HEX")]
+
+    body = body.split(b"BEGIN", 1)[-1].rsplit(b"END", 1)[0]
+    ranged = re.findall(rb"\[[^;]*", body)
+    plain = re.sub(rb"\[[^;]*;", b"", body)
+
+    # Bulk path: every plain entry is exactly "address : value"
+    tokens = plain.replace(b";", b" ").replace(b":", b" ").split()
+    if len(tokens) == 2 * plain.count(b":"):
+        complex_entries = ranged
+        simple_addr = parse_tokens(tokens[0::2], addr_radix)
+        simple_val = parse_tokens(tokens[1::2], data_radix)
+    else:
+        complex_entries = ranged + [e for e in plain.split(b";") if e.strip()]
+        simple_addr = simple_val = np.zeros(0, dtype=np.int64)
+
+    # Ranges first, so explicit entries win where they overlap
+    parsed = [_mif_entry(e, addr_radix, data_radix) for e in complex_entries]
+    addresses = [a for a, _ in parsed] + [simple_addr]
+    values = [v for _, v in parsed] + [simple_val]
+    return _dense(np.concatenate(addresses), np.concatenate(values), depth), header
+
+
+def read_image(path):
+    """Unsigned words of a .mem or .mif file (by extension)."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if path.lower().endswith(".mif"):
+        return parse_mif(data)[0]
+    return parse_mem(data)
+
+
+###########################################
+# Comparing
+###########################################
+
+def diff_images(a, b, width=None):
+    """
+    Word-by-word differences between two images. The shorter one is
+    treated as zero-filled (like a MIF range fill). With `width`, values
+    are compared as `width`-bit patterns, so -1 matches 0xFF at width 8.
+    """
+    a = np.asarray(a, dtype=np.int64).reshape(-1)
+    b = np.asarray(b, dtype=np.int64).reshape(-1)
+    n = max(a.size, b.size)
+    pa = np.zeros(n, dtype=np.int64)
+    pb = np.zeros(n, dtype=np.int64)
+    pa[:a.size] = a
+    pb[:b.size] = b
+    if width is not None:
+        pa, pb = to_unsigned(pa, width), to_unsigned(pb, width)
+    addresses = np.flatnonzero(pa != pb)
+    return ImageDiff(addresses, pa[addresses], pb[addresses], a.size, b.size)
+
+
+def format_diff(diff, limit=20):
+    lines = [f"{diff.addresses.size} differing words (sizes {diff.len_a} / {diff.len_b})"]
+    for addr, va, vb in list(zip(diff.addresses, diff.a, diff.b))[:limit]:
+        lines.append(f"  @{addr:6d}: {va:#x} != {vb:#x}")
+    if diff.addresses.size > limit:
+        lines.append(f"  ... {diff.addresses.size - limit} more")
+    return "\n".join(lines)
+
+
+def check_image(path, expected, width):
+    """Read `path` back and raise ValueError unless it holds `expected`."""
+    diff = diff_images(read_image(path), expected, width)
+    if diff.addresses.size:
+        raise ValueError(f"{path} does not match the model:\n{format_diff(diff)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare FPGA memory images (.mem / .mif).")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_diff = sub.add_parser("diff", help="word-by-word difference of two images")
+    p_diff.add_argument("a")
+    p_diff.add_argument("b")
+    p_diff.add_argument("--width", type=int, default=None)
+    p_diff.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    diff = diff_images(read_image(args.a), read_image(args.b), args.width)
+    print(format_diff(diff, args.limit))
+    sys.exit(1 if diff.addresses.size else 0)
+
+
+if __name__ == "__main__":
+    main()
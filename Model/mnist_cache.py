@@ -0,0 +1,152 @@
+# mnist_cache.py
+#
+# One-time conversion of MNIST into contiguous uint8 .npy files:
+#   <cache_dir>/train_images.npy  (60000,28,28) uint8
+#   <cache_dir>/train_labels.npy  (60000,)      int64
+#   <cache_dir>/test_images.npy   (10000,28,28) uint8
+#   <cache_dir>/test_labels.npy   (10000,)      int64
+#
+# CachedMNISTLoader then serves (images, labels) batches with the same
+# layout as the torchvision DataLoader in mnist_model.py
+# (float32 (B,1,28,28) in [0,1], int64 labels), without PIL or ToTensor()
+# per sample. The whole split is normalized once into one tensor; an
+# unshuffled batch is a view of it, a shuffled batch is a single gather
+# through a per-epoch index permutation.
+
+import os
+import numpy as np
+import torch
+
+
+CACHE_DIR = "./data/mnist_cache"
+SPLITS = ("train", "test")
+
+
+def _cache_paths(cache_dir, split):
+    return (os.path.join(cache_dir, f"{split}_images.npy"),
+            os.path.join(cache_dir, f"{split}_labels.npy"))
+
+
+def build_cache(root="./data", cache_dir=CACHE_DIR, force=False):
+    """
+    Convert the torchvision MNIST files under `root` into the .npy cache.
+    Reads the dataset's uint8 tensor directly, so no per-sample transform
+    runs. Skips splits that are already cached unless force is set.
+    """
+    from torchvision import datasets
+
+    os.makedirs(cache_dir, exist_ok=True)
+    for split in SPLITS:
+        img_path, lbl_path = _cache_paths(cache_dir, split)
+        if not force and os.path.exists(img_path) and os.path.exists(lbl_path):
+            continue
+
+        ds = datasets.MNIST(root=root, train=(split == "train"), download=True)
+        images = np.ascontiguousarray(ds.data.numpy(), dtype=np.uint8)
+        labels = ds.targets.numpy().astype(np.int64)
+
+        # Write to a temp name first so an interrupted run never leaves a
+        # half-written file that looks like a valid cache.
+        for path, arr in ((img_path, images), (lbl_path, labels)):
+            tmp = path + ".tmp.npy"
+            np.save(tmp, arr)
+            os.replace(tmp, path)
+        print(f"Cached MNIST {split}: {images.shape[0]} images -> {img_path}")
+
+
+def cache_files(cache_dir=CACHE_DIR):
+    """Every cached .npy path (images and labels of both splits)."""
+    return [path for split in SPLITS for path in _cache_paths(cache_dir, split)]
+
+
+def load_split(split, cache_dir=CACHE_DIR):
+    """Memory-mapped (images uint8 (N,28,28), labels int64 (N,)) for a split."""
+    if split not in SPLITS:
+        raise ValueError(f"split must be one of {SPLITS}, got {split!r}")
+    img_path, lbl_path = _cache_paths(cache_dir, split)
+    if not os.path.exists(img_path):
+        build_cache(cache_dir=cache_dir)
+    return np.load(img_path, mmap_mode="r"), np.load(lbl_path, mmap_mode="r")
+
+
+class CachedMNISTLoader:
+    """
+    Drop-in replacement for DataLoader(datasets.MNIST(..., ToTensor())).
+
+    frames : the raw uint8 memmap, (N,28,28), for the integer golden model
+    images : float32 (N,1,28,28) in [0,1], normalized once at construction
+    """
+
+    def __init__(self, split, batch_size=64, shuffle=False, cache_dir=CACHE_DIR,
+                 drop_last=False, seed=None, indices=None, pin_memory=False):
+        self.frames, labels = load_split(split, cache_dir)
+        if indices is not None:
+            # A subset (e.g. the holdout_indices() split) is copied off the memmap
+            self.frames, labels = self.frames[indices], labels[indices]
+        images = np.asarray(self.frames, dtype=np.float32)   # one copy, off the memmap
+        self.images = torch.from_numpy(images).unsqueeze(1).div_(255.0)
+        self.labels = torch.from_numpy(np.array(labels))
+        if pin_memory and torch.cuda.is_available():
+            # Unshuffled batches are views, so they stay page-locked
+            self.images = self.images.pin_memory()
+            self.labels = self.labels.pin_memory()
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.generator = torch.Generator()
+        if seed is not None:
+            self.generator.manual_seed(seed)
+
+    def __len__(self):
+        n = self.labels.shape[0]
+        if self.drop_last:
+            return n // self.batch_size
+        return (n + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self):
+        n = self.labels.shape[0]
+        stop = n - n % self.batch_size if self.drop_last else n
+
+        if not self.shuffle:
+            for i in range(0, stop, self.batch_size):
+                yield self.images[i:i + self.batch_size], self.labels[i:i + self.batch_size]
+            return
+
+        perm = torch.randperm(n, generator=self.generator)
+        for i in range(0, stop, self.batch_size):
+            idx = perm[i:i + self.batch_size]
+            yield self.images.index_select(0, idx), self.labels.index_select(0, idx)
+
+
+def holdout_indices(n, val_size, seed=0):
+    """
+    (train, validation) index arrays: a fixed random val_size of n, the
+    same on every run, so early stopping always sees the same images.
+    """
+    perm = np.random.default_rng(seed).permutation(n)
+    return np.sort(perm[val_size:]), np.sort(perm[:val_size])
+
+
+def get_cached_mnist_loaders(batch_size=64, cache_dir=CACHE_DIR, seed=None, val_size=0,
+                             pin_memory=False):
+    """
+    Cached equivalent of mnist_model.get_mnist_loaders. With val_size > 0
+    the training split loses val_size held-out images, returned as a third
+    (unshuffled) loader.
+    """
+    train_idx = val_idx = None
+    if val_size:
+        train_idx, val_idx = holdout_indices(len(load_split("train", cache_dir)[1]), val_size)
+    train_loader = CachedMNISTLoader("train", batch_size, shuffle=True, cache_dir=cache_dir, seed=seed,
+                                     indices=train_idx, pin_memory=pin_memory)
+    test_loader = CachedMNISTLoader("test", batch_size, shuffle=False, cache_dir=cache_dir,
+                                    pin_memory=pin_memory)
+    if not val_size:
+        return train_loader, test_loader
+    val_loader = CachedMNISTLoader("train", batch_size, shuffle=False, cache_dir=cache_dir,
+                                   indices=val_idx, pin_memory=pin_memory)
+    return train_loader, test_loader, val_loader
+
+
+if __name__ == "__main__":
+    build_cache(force=True)
@@ -10,13 +10,23 @@
 #
 # These files match the expectations of fc_core.v
 
+import argparse
 import os
 import numpy as np
 import torch
 import torch.nn as nn
 import torch.optim as optim
 from torchvision import datasets, transforms
-from torch.utils.data import DataLoader
+from torch.utils.data import DataLoader, Subset
+
+import calibration
+import golden_model
+from artifact_cache import ArtifactCache, code_digest
+from calibration import calibrate
+from golden_model import IntCNN, fc_int_forward_batch
+from hw_export import export_tensors, int_model_tensors, verify_export
+from memfile import check_image, write_mem
+from mnist_cache import cache_files, get_cached_mnist_loaders, holdout_indices
 
 
 ###########################################
@@ -62,7 +72,13 @@ class SimpleCNN(nn.Module):
 # 2. DATA LOADING
 ###########################################
 
-def get_mnist_loaders(batch_size=64):
+def get_mnist_loaders(batch_size=64, num_workers=0, pin_memory=False, val_size=0, seed=None):
+    """
+    torchvision MNIST loaders (downloaded into ./data if missing). Decoding
+    runs in num_workers processes. With val_size > 0 the training set loses
+    val_size held-out images (mnist_cache.holdout_indices), returned as a
+    third loader.
+    """
     transform = transforms.Compose([
         transforms.ToTensor(),  # converts to [0,1] float32
     ])
@@ -70,7 +86,7 @@ def get_mnist_loaders(batch_size=64):
     train_dataset = datasets.MNIST(
         root="./data",
         train=True,
-        download=False,
+        download=True,
         transform=transform,
     )
 
@@ -81,48 +97,172 @@ def get_mnist_loaders(batch_size=64):
         transform=transform,
     )
 
-    train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True)
-    test_loader  = DataLoader(test_dataset, batch_size=batch_size, shuffle=False)
+    opts = {"batch_size": batch_size, "num_workers": num_workers,
+            "pin_memory": pin_memory and torch.cuda.is_available(),
+            "persistent_workers": num_workers > 0}
+    generator = None
+    if seed is not None:
+        generator = torch.Generator()
+        generator.manual_seed(seed)
+
+    val_dataset = None
+    if val_size:
+        train_idx, val_idx = holdout_indices(len(train_dataset), val_size)
+        train_dataset, val_dataset = Subset(train_dataset, train_idx), Subset(train_dataset, val_idx)
 
-    return train_loader, test_loader
+    train_loader = DataLoader(train_dataset, shuffle=True, generator=generator, **opts)
+    test_loader  = DataLoader(test_dataset, shuffle=False, **opts)
+    if val_dataset is None:
+        return train_loader, test_loader
+    return train_loader, test_loader, DataLoader(val_dataset, shuffle=False, **opts)
+
+
+def torchvision_files(root="./data"):
+    """The decompressed MNIST idx files get_mnist_loaders reads."""
+    raw = os.path.join(root, "MNIST", "raw")
+    return [os.path.join(raw, os.path.splitext(os.path.basename(url))[0])
+            for url, _ in datasets.MNIST.resources]
 
 
 ###########################################
-# 3. TRAINING LOOP (brief, just to get a working model)
+# 3. TRAINING LOOP
 ###########################################
 
-def train_model(model, train_loader, device, epochs=2, lr=1e-3):
+# Loss and accuracy are summed in device tensors and read once per epoch,
+# so a step never waits on a host sync. With a validation loader the best
+# epoch (held-out accuracy) is kept and training stops after `patience`
+# epochs without improvement. A checkpoint is written after every epoch;
+# resume=True continues from it.
+
+SCHEDULES = ("none", "cosine", "onecycle")
+
+
+def make_scheduler(optimizer, schedule, lr, total_steps):
+    """Per-step LR schedule, or None."""
+    if schedule in (None, "none"):
+        return None
+    if schedule == "cosine":
+        return optim.lr_scheduler.CosineAnnealingLR(optimizer, T_max=total_steps)
+    if schedule == "onecycle":
+        return optim.lr_scheduler.OneCycleLR(optimizer, max_lr=lr, total_steps=total_steps)
+    raise ValueError(f"schedule must be one of {SCHEDULES}, got {schedule!r}")
+
+
+def evaluate_accuracy(model, loader, device):
+    """Accuracy (%), with the correct count kept on the device until the end."""
+    model.eval()
+    correct = torch.zeros((), dtype=torch.int64, device=device)
+    total = 0
+    with torch.no_grad():
+        for images, labels in loader:
+            images = images.to(device, non_blocking=True)
+            labels = labels.to(device, non_blocking=True)
+            correct += (model(images).argmax(dim=1) == labels).sum()
+            total += labels.size(0)
+    return correct.item() / max(total, 1) * 100.0
+
+
+def save_checkpoint(path, state):
+    """torch.save through a temp file, so an interrupted save keeps the last one."""
+    tmp = path + ".tmp"
+    torch.save(state, tmp)
+    os.replace(tmp, path)
+
+
+def train_model(model, train_loader, device, epochs=2, lr=1e-3, masks=None, val_loader=None,
+                patience=None, schedule=None, amp=False, checkpoint=None, resume=False):
+    """
+    masks: optional {parameter name: 0/1 tensor} (pruning.py). Masked
+    weights are zeroed before training and again after every step, so a
+    pruned model is fine-tuned without regrowing them.
+
+    epochs is the maximum when val_loader and patience are given. amp runs
+    the forward pass in float16 (CUDA) / bfloat16 (CPU) autocast.
+    """
     model.to(device)
-    model.train()
 
     criterion = nn.CrossEntropyLoss()
     optimizer = optim.Adam(model.parameters(), lr=lr)
-
-    for epoch in range(epochs):
-        running_loss = 0.0
+    scheduler = make_scheduler(optimizer, schedule, lr, epochs * len(train_loader))
+    scaler = torch.amp.GradScaler("cuda", enabled=amp and device.type == "cuda")
+    amp_dtype = torch.float16 if device.type == "cuda" else torch.bfloat16
+    params = dict(model.named_parameters())
+    masks = {name: m.to(device) for name, m in (masks or {}).items()}
+
+    def apply_masks():
+        with torch.no_grad():
+            for name, m in masks.items():
+                params[name].mul_(m)
+
+    apply_masks()
+
+    start_epoch, best_acc, best_state, bad_epochs = 0, -1.0, None, 0
+    if resume and checkpoint and os.path.exists(checkpoint):
+        state = torch.load(checkpoint, map_location=device)
+        model.load_state_dict(state["model"])
+        optimizer.load_state_dict(state["optimizer"])
+        if scheduler is not None and state["scheduler"] is not None:
+            scheduler.load_state_dict(state["scheduler"])
+        scaler.load_state_dict(state["scaler"])
+        start_epoch, best_acc = state["epoch"], state["best_acc"]
+        best_state, bad_epochs = state["best_state"], state["bad_epochs"]
+        print(f"Resumed from {checkpoint} after epoch {start_epoch}")
+
+    for epoch in range(start_epoch, epochs):
+        model.train()
+        running_loss = torch.zeros((), device=device)
+        correct = torch.zeros((), dtype=torch.int64, device=device)
         total = 0
-        correct = 0
 
         for images, labels in train_loader:
-            images = images.to(device)
-            labels = labels.to(device)
-
-            optimizer.zero_grad()
-            outputs = model(images)
-            loss = criterion(outputs, labels)
-            loss.backward()
-            optimizer.step()
-
-            running_loss += loss.item() * images.size(0)
-
-            _, predicted = torch.max(outputs, 1)
+            images = images.to(device, non_blocking=True)
+            labels = labels.to(device, non_blocking=True)
+
+            optimizer.zero_grad(set_to_none=True)
+            with torch.autocast(device.type, dtype=amp_dtype, enabled=amp):
+                outputs = model(images)
+                loss = criterion(outputs, labels)
+            scaler.scale(loss).backward()
+            scaler.step(optimizer)
+            scaler.update()
+            if scheduler is not None:
+                scheduler.step()
+            apply_masks()
+
+            running_loss += loss.detach().float() * labels.size(0)
+            correct += (outputs.detach().argmax(dim=1) == labels).sum()
             total += labels.size(0)
-            correct += (predicted == labels).sum().item()
-
-        epoch_loss = running_loss / total
-        epoch_acc  = correct / total * 100.0
-        print(f"Epoch {epoch+1}/{epochs} - loss: {epoch_loss:.4f} - acc: {epoch_acc:.2f}%")
 
+        epoch_loss = running_loss.item() / total
+        epoch_acc  = correct.item() / total * 100.0
+        line = f"Epoch {epoch+1}/{epochs} - loss: {epoch_loss:.4f} - acc: {epoch_acc:.2f}%"
+
+        stop = False
+        if val_loader is not None:
+            val_acc = evaluate_accuracy(model, val_loader, device)
+            line += f" - val acc: {val_acc:.2f}%"
+            if val_acc > best_acc:
+                best_acc, bad_epochs = val_acc, 0
+                best_state = {k: v.detach().clone() for k, v in model.state_dict().items()}
+            else:
+                bad_epochs += 1
+                stop = patience is not None and bad_epochs >= patience
+        print(line + f" - lr: {optimizer.param_groups[0]['lr']:.2e}")
+
+        if checkpoint:
+            save_checkpoint(checkpoint, {
+                "epoch": epoch + 1, "model": model.state_dict(), "optimizer": optimizer.state_dict(),
+                "scheduler": None if scheduler is None else scheduler.state_dict(),
+                "scaler": scaler.state_dict(), "best_acc": best_acc, "best_state": best_state,
+                "bad_epochs": bad_epochs,
+            })
+        if stop:
+            print(f"Early stop: no val improvement in {patience} epochs")
+            break
+
+    if best_state is not None:
+        model.load_state_dict(best_state)
+        print(f"Restored best epoch (val acc {best_acc:.2f}%)")
     return model
 
 
@@ -174,6 +314,11 @@ def quantize_to_int8(x):
     x_q = np.clip(np.round(x_scaled), -128, 127).astype(np.int8)
     return x_q, scale
 
+def quantize_with_scale(x, scale):
+    """Quantize with a fixed (calibrated) scale instead of x's own max-abs."""
+    x = np.asarray(x, dtype=np.float64)
+    return np.clip(np.round(x * scale), -128, 127).astype(np.int8)
+
 def quantize_bias_to_int16(b, feat_scale, w_scale):
     """
     Rough scaling: feat ~ feat_scale * feat_float, w ~ w_scale * w_float.
@@ -200,24 +345,25 @@ def quantize_bias_to_int16(b, feat_scale, w_scale):
 # 6. WRITE .mem FILES
 ###########################################
 
+# Formatting is vectorized in memfile.py; check_exports() reads the files
+# back and compares them with the tensors they were written from.
+
 def write_features_mem(feats_q, path="features.mem"):
     assert feats_q.shape == (400,)
-    with open(path, "w") as f:
-        for v in feats_q:
-            f.write(f"{(int(v) & 0xFF):02X}\n")  # 2-digit hex
+    write_mem(path, feats_q, 8)     # 2-digit hex
 
 def write_fc_w_flat_mem(W_q, path="fc_w_flat.mem"):
     assert W_q.shape == (10, 400)
-    W_flat = W_q.reshape(-1)  # length 4000
-    with open(path, "w") as f:
-        for v in W_flat:
-            f.write(f"{(int(v) & 0xFF):02X}\n")
+    write_mem(path, W_q.reshape(-1), 8)  # length 4000
 
 def write_fc_b_mem(b_q, path="fc_b.mem"):
     assert b_q.shape == (10,)
-    with open(path, "w") as f:
-        for v in b_q:
-            f.write(f"{(int(v) & 0xFFFF):04X}\n")  # 4-digit hex
+    write_mem(path, b_q, 16)        # 4-digit hex
+
+def check_exports(feats_q, W_q, b_q, paths=("features.mem", "fc_w_flat.mem", "fc_b.mem")):
+    """Raise if a written .mem file does not parse back to its tensor."""
+    for path, values, width in zip(paths, (feats_q, W_q, b_q), (8, 8, 16)):
+        check_image(path, values, width)
 
 
 ###########################################
@@ -233,65 +379,260 @@ def fc_int_forward(feats_q, W_q, b_q):
       scores: (10,) int32
       pred_digit: int
     """
-    feats_q = feats_q.astype(np.int32)
-    W_q = W_q.astype(np.int32)
-    b_q = b_q.astype(np.int32)
+    scores, preds = fc_int_forward_batch(np.asarray(feats_q)[None, :], W_q, b_q)
+    return scores[0], int(preds[0])
 
-    scores = np.zeros(10, dtype=np.int32)
-    for j in range(10):
-        acc = int(b_q[j])
-        for i in range(400):
-            acc += int(feats_q[i]) * int(W_q[j, i])
-        scores[j] = acc
 
-    pred = int(np.argmax(scores))
-    return scores, pred
+def eval_int_fc(model, test_loader, device, feat_scale, W_q, b_q):
+    """
+    Quantize the features of every test image with feat_scale and score
+    them through fc_int_forward_batch. Returns (accuracy %, preds, labels).
+    """
+    model.to(device)
+    model.eval()
+
+    feats_all = []
+    labels_all = []
+    with torch.no_grad():
+        for images, labels in test_loader:
+            _, feats = model(images.to(device), return_features=True)
+            feats_all.append(feats.cpu().numpy())
+            labels_all.append(labels.numpy())
+
+    feats = np.concatenate(feats_all)
+    labels = np.concatenate(labels_all)
+    feats_q = quantize_with_scale(feats, feat_scale)
+
+    _, preds = fc_int_forward_batch(feats_q, W_q, b_q)
+    acc = float(np.mean(preds == labels) * 100.0)
+    return acc, preds, labels
 
 
 ###########################################
-# 8. MAIN
+# 7b. FULL-NETWORK INTEGER MODEL (golden_model.py)
 ###########################################
 
-def main():
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    print("Using device:", device)
+def build_int_model(model, act_scales):
+    """Quantize a trained SimpleCNN into a golden_model.IntCNN."""
+    sd = {k: v.detach().cpu().numpy() for k, v in model.state_dict().items()}
+    return IntCNN.from_float(sd, act_scales)
+
+
+def images_to_frames(images):
+    """ToTensor() floats in [0,1] back to the uint8 bytes the board gets."""
+    return torch.round(images * 255.0).to(torch.uint8).squeeze(1).numpy()
+
 
-    # 1) Load data
-    train_loader, test_loader = get_mnist_loaders(batch_size=64)
+def eval_int_cnn(int_model, test_loader):
+    """Accuracy (%) of the integer-only pipeline on raw uint8 frames."""
+    correct = 0
+    total = 0
+    for images, labels in test_loader:
+        _, preds = int_model.forward(images_to_frames(images))
+        correct += int(np.sum(preds == labels.numpy()))
+        total += labels.size(0)
+    return correct / total * 100.0
 
-    # 2) Create and train model (few epochs is enough for demo)
+
+###########################################
+# 7c. ARTIFACT CACHE (artifact_cache.py)
+###########################################
+
+EXPORT_FILES = ("features.mem", "fc_w_flat.mem", "fc_b.mem", "int_cnn.npz")
+# Defaults of the keyed trainer options, so every caller of train_or_load
+# (main, pruning.py) gets the same key for the same run
+TRAIN_OPTS = {"schedule": "none", "patience": None, "amp": False, "val_size": 0, "loader": "cache"}
+
+
+def train_or_load(cache, train_loader, device, epochs=2, lr=1e-3, batch_size=64,
+                  seed=0, retrain=False, val_loader=None, opts=None, checkpoint=None, resume=False):
+    """
+    Trained SimpleCNN for these hyperparameters and this dataset, from the
+    cache if an identical run has been done before. Returns (model, key).
+    opts are the train_model options that change the result (schedule,
+    patience, amp) plus anything else to key on (val_size, loader); missing
+    ones take their TRAIN_OPTS defaults. The data digest covers the files
+    of opts["loader"], so build its loaders before calling this.
+    """
+    opts = {**TRAIN_OPTS, **(opts or {})}
+    data_files = cache_files() if opts["loader"] == "cache" else torchvision_files()
+    key = cache.key(
+        "train",
+        code=code_digest(SimpleCNN, train_model, make_scheduler, evaluate_accuracy),
+        data=[cache.file_digest(path) for path in data_files],
+        epochs=epochs, lr=lr, batch_size=batch_size, seed=seed, **opts,
+    )
     model = SimpleCNN()
+    state = None if retrain else cache.load_arrays(key, "state_dict")
+    if state is not None:
+        print(f"Loaded trained model from cache ({key})")
+        model.load_state_dict({k: torch.from_numpy(v) for k, v in state.items()})
+        return model.to(device), key
+
     print("Training model...")
-    model = train_model(model, train_loader, device, epochs=2, lr=1e-3)
+    torch.manual_seed(seed)
+    train_opts = {k: opts[k] for k in ("schedule", "patience", "amp")}
+    model = train_model(model, train_loader, device, epochs=epochs, lr=lr, val_loader=val_loader,
+                        checkpoint=checkpoint, resume=resume, **train_opts)
+    cache.save_arrays(key, "state_dict",
+                      {k: v.detach().cpu().numpy() for k, v in model.state_dict().items()})
+    return model, key
+
 
-    # 3) Get one sample's features + FC params
+def quantize_or_load(cache, model, train_key, train_loader, test_loader, device,
+                     method="percentile"):
+    """
+    Calibrated scales, quantized FC tensors, the IntCNN parameters and the
+    integer accuracies derived from a trained model, cached under a key
+    chained to train_key. Returns (arrays dict, key).
+    """
+    key = cache.key(
+        "quant",
+        train=train_key,
+        code=code_digest(calibration, golden_model, get_sample_and_fc_params,
+                         quantize_to_int8, quantize_with_scale, quantize_bias_to_int16,
+                         build_int_model),
+        method=method,
+    )
+    q = cache.load_arrays(key, "quantized")
+    if q is not None:
+        print(f"Loaded quantized tensors from cache ({key})")
+        return q, key
+
+    # One sample's features + FC params
     feat, W_fc, b_fc, label0 = get_sample_and_fc_params(model, test_loader, device)
 
-    print("Feature vector shape:", feat.shape)
-    print("FC weight shape:", W_fc.shape)
-    print("FC bias shape:", b_fc.shape)
+    # Calibrate activation scales over the whole training set, then
+    # quantize. The feature scale is conv2's (pooling keeps it).
+    act_scales = calibrate(model, train_loader, device, method=method)
+    feat_scale = act_scales["conv2"]
+    W_q, w_scale = quantize_to_int8(W_fc)
+    b_q, b_scale = quantize_bias_to_int16(b_fc, feat_scale, w_scale)
+    int_fc_acc, _, _ = eval_int_fc(model, test_loader, device, feat_scale, W_q, b_q)
+
+    # Integer-only full network from raw uint8 frames
+    int_model = build_int_model(model, act_scales)
+    int_cnn_acc = eval_int_cnn(int_model, test_loader)
+
+    q = {
+        "feats_q": quantize_with_scale(feat, feat_scale),
+        "label0": np.array(label0),
+        "W_q": W_q, "b_q": b_q,
+        "feat_scale": np.array(feat_scale),
+        "w_scale": np.array(w_scale),
+        "b_scale": np.array(b_scale),
+        "int_fc_acc": np.array(int_fc_acc),
+        "int_cnn_acc": np.array(int_cnn_acc),
+    }
+    q.update({f"act_scale.{name}": np.array(v) for name, v in act_scales.items()})
+    q.update({f"int.{name}": v for name, v in int_model.params.items()})
+    cache.save_arrays(key, "quantized", q)
+    return q, key
+
 
-    # 4) Quantize
-    feats_q, feat_scale = quantize_to_int8(feat)
-    W_q, w_scale        = quantize_to_int8(W_fc)
-    b_q, b_scale        = quantize_bias_to_int16(b_fc, feat_scale, w_scale)
+###########################################
+# 8. MAIN
+###########################################
 
-    print("Feature scale:", feat_scale)
-    print("Weight scale:", w_scale)
-    print("Bias scale:  ", b_scale)
+def main():
+    parser = argparse.ArgumentParser(description="Train SimpleCNN and export the fc_core memory images.")
+    parser.add_argument("--epochs", type=int, default=2)
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--calib", default="percentile", choices=calibration.CALIB_METHODS)
+    parser.add_argument("--retrain", action="store_true", help="ignore a cached trained model")
+    parser.add_argument("--no-cache", action="store_true", help="do not read any cached artifact")
+    # Trainer
+    parser.add_argument("--loader", choices=("cache", "torchvision"), default="cache",
+                        help="in-memory .npy cache, or torchvision decoding in --workers processes")
+    parser.add_argument("--workers", type=int, default=0, help="DataLoader worker processes (torchvision)")
+    parser.add_argument("--pin-memory", action="store_true", help="page-locked batches for CUDA copies")
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op CPU threads")
+    parser.add_argument("--schedule", choices=SCHEDULES, default="none")
+    parser.add_argument("--val-size", type=int, default=0,
+                        help="hold out this many training images for early stopping")
+    parser.add_argument("--patience", type=int, default=None,
+                        help="stop after this many epochs without a better val accuracy")
+    parser.add_argument("--amp", action="store_true", help="mixed precision (bfloat16 on CPU)")
+    parser.add_argument("--checkpoint", default=None, help="write a resumable checkpoint every epoch")
+    parser.add_argument("--resume", action="store_true", help="continue from --checkpoint")
+    args = parser.parse_args()
+    if args.patience is not None and not args.val_size:
+        parser.error("--patience needs a held-out set: pass --val-size")
 
-    # 5) Integer FC simulation
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    print("Using device:", device)
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    cache = ArtifactCache(enabled=not args.no_cache)
+
+    # 1) Load data (uint8 .npy cache, built from ./data/MNIST on first run),
+    #    with an optional held-out split for early stopping
+    if args.loader == "cache":
+        loaders = get_cached_mnist_loaders(batch_size=args.batch_size, seed=args.seed,
+                                           val_size=args.val_size, pin_memory=args.pin_memory)
+    else:
+        loaders = get_mnist_loaders(args.batch_size, args.workers, args.pin_memory,
+                                    val_size=args.val_size, seed=args.seed)
+    train_loader, test_loader = loaders[:2]
+    val_loader = loaders[2] if args.val_size else None
+
+    # 2) Create and train model (few epochs is enough for demo), or reuse
+    #    the cached state_dict of an identical run
+    opts = {"schedule": args.schedule, "patience": args.patience, "amp": args.amp,
+            "val_size": args.val_size, "loader": args.loader}
+    model, train_key = train_or_load(cache, train_loader, device, args.epochs, args.lr,
+                                     args.batch_size, args.seed, retrain=args.retrain,
+                                     val_loader=val_loader, opts=opts,
+                                     checkpoint=args.checkpoint, resume=args.resume)
+
+    # 3-5) Calibrate, quantize and evaluate (cached per trained model)
+    q, quant_key = quantize_or_load(cache, model, train_key, train_loader, test_loader,
+                                    device, method=args.calib)
+    feats_q, W_q, b_q = q["feats_q"], q["W_q"], q["b_q"]
+
+    print("Feature vector shape:", feats_q.shape)
+    print("FC weight shape:", W_q.shape)
+    print("FC bias shape:", b_q.shape)
+    print("Feature scale:", float(q["feat_scale"]))
+    print("Weight scale:", float(q["w_scale"]))
+    print("Bias scale:  ", float(q["b_scale"]))
+
+    # Integer FC simulation
     scores_int, pred_digit_int = fc_int_forward(feats_q, W_q, b_q)
     print("Integer scores:", scores_int)
     print("Predicted digit (int FC):", pred_digit_int)
-    print("True label:", label0)
-
-    # 6) Write mem files
-    write_features_mem(feats_q, "features.mem")
-    write_fc_w_flat_mem(W_q,   "fc_w_flat.mem")
-    write_fc_b_mem(b_q,        "fc_b.mem")
-
-    print("\nWrote files: features.mem, fc_w_flat.mem, fc_b.mem")
+    print("True label:", int(q["label0"]))
+    print(f"Integer FC test accuracy: {float(q['int_fc_acc']):.2f}%")
+
+    int_model = IntCNN({k[len("int."):]: v for k, v in q.items() if k.startswith("int.")})
+    print(int_model.describe())
+    print(f"Integer CNN test accuracy: {float(q['int_cnn_acc']):.2f}%")
+
+    # 6) Write mem files (copied from the cache if this export was done before)
+    export_key = cache.key(
+        "export",
+        quant=quant_key,
+        code=code_digest(write_features_mem, write_fc_w_flat_mem, write_fc_b_mem, IntCNN.save),
+    )
+    if cache.fetch_files(export_key, EXPORT_FILES):
+        print(f"Copied exports from cache ({export_key})")
+    else:
+        write_features_mem(feats_q, "features.mem")
+        write_fc_w_flat_mem(W_q,   "fc_w_flat.mem")
+        write_fc_b_mem(b_q,        "fc_b.mem")
+        int_model.save("int_cnn.npz")
+        cache.store_files(export_key, EXPORT_FILES)
+    check_exports(feats_q, W_q, b_q)
+
+    # Every layer of the integer model, with manifest.json (hw_export.py),
+    # parsed back; verify_export raises ValueError on any mismatch
+    hw_tensors = int_model_tensors(int_model.params)
+    export_tensors(hw_tensors, "hw_export", source="int_cnn.npz")
+    verify_export(hw_tensors, "hw_export")
+
+    print("\nWrote files: features.mem, fc_w_flat.mem, fc_b.mem, int_cnn.npz, hw_export/")
     print("These correspond to the integer FC that predicts:", pred_digit_int)
 
 
@@ -0,0 +1,331 @@
+# perf_model.py
+#
+# Cycle and resource model of the inference datapath, for choosing the
+# MAC-array width before writing RTL.
+#
+# Baseline: fc_core.v (milestone_1) does one MAC per cycle:
+#   IDLE     1 cycle                  (the edge that samples start)
+#   ACCUM    N_IN cycles per class
+#   PREP     1 cycle per class        (store score, load next bias)
+#   ARGMAX   N_OUT + 1 cycles         (scan, then register pred + done)
+# = 1 + 10 * (400 + 1) + 11 = 4022 cycles from start to done.
+# simulate_fc_core() steps that FSM cycle by cycle and check_baseline()
+# holds the closed-form model below to the same count.
+#
+# Each stage (conv1, conv2, fc) is a reduction of length K per output
+# (C * kh * kw for a conv, N_IN for the FC). A configuration sets:
+#   lanes      int8 MACs per cycle (a dot product over K, adder tree;
+#              lanes beyond K work on several output channels at once)
+#   bram_ports weight banks read in parallel, each port_bits wide
+#   port_bits  width of one weight read port
+#   pipelined  False: every output waits for the adder tree to drain and
+#              spends one store cycle (PREP), pooling and argmax are
+#              separate passes - the fc_core.v structure.
+#              True: outputs issue back to back, requant / ReLU / pool /
+#              running argmax are fused into the store stage.
+#   dataflow   "shared": one MAC array runs the stages in turn.
+#              "per-layer": each stage has its own array, so frames
+#              overlap and throughput is set by the slowest stage.
+#
+# Resource estimates are for the DE1-SoC (Cyclone V 5CSEMA5): a DSP block
+# holds three 9x9 multipliers, and a M10K block is 10 kbit in the widths
+# listed in M10K_CONFIGS. They are estimates - adders, requant multipliers
+# and control are not counted.
+#
+# Usage:
+#   python perf_model.py                     # validate + sweep, Pareto table
+#   python perf_model.py --lanes 4 --ports 2 --pipelined
+#   python perf_model.py --csv sweep.csv --all
+
+import argparse
+import csv
+import itertools
+import math
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from golden_model import fc_int_forward_batch
+
+
+CLOCK_MHZ = 50.0
+
+# DE1-SoC, Cyclone V 5CSEMA5F31C6
+DEVICE_DSP = 87
+DEVICE_M10K = 397
+MULTS_PER_DSP = 3                     # 9x9 mode, int8 x int8
+M10K_CONFIGS = ((8192, 1), (4096, 2), (2048, 4), (1024, 8), (1024, 10),
+                (512, 16), (512, 20), (256, 32), (256, 40))   # (depth, width)
+
+Layer = namedtuple("Layer", "name kind outputs k weights in_acts out_hw")
+Config = namedtuple("Config", "lanes bram_ports port_bits pipelined dataflow")
+
+BASELINE = Config(lanes=1, bram_ports=1, port_bits=8, pipelined=False, dataflow="shared")
+DATAFLOWS = ("shared", "per-layer")
+
+
+###########################################
+# 1. LAYER GEOMETRY
+###########################################
+
+def cnn_layers(in_hw=28, convs=((1, 8, 3), (8, 16, 3)), n_classes=10):
+    """SimpleCNN stages: (in_ch, out_ch, kernel) per conv + 2x2 pool, then the FC."""
+    layers = []
+    hw = in_hw
+    for i, (c_in, c_out, k) in enumerate(convs, 1):
+        out_hw = hw - k + 1
+        layers.append(Layer(f"conv{i}", "conv", c_out * out_hw * out_hw, c_in * k * k,
+                            c_out * c_in * k * k, c_in * hw * hw, out_hw))
+        hw = out_hw // 2
+    n_in = convs[-1][1] * hw * hw
+    layers.append(Layer("fc", "fc", n_classes, n_in, n_classes * n_in, n_in, None))
+    return layers
+
+
+def fc_layer(n_in=400, n_out=10):
+    """fc_core.v on its own."""
+    return [Layer("fc", "fc", n_out, n_in, n_out * n_in, n_in, None)]
+
+
+###########################################
+# 2. fc_core.v, CYCLE BY CYCLE
+###########################################
+
+def simulate_fc_core(feats, fc_w, biases):
+    """
+    Step the fc_core.v FSM one clock edge at a time from the edge that
+    samples start. Returns (pred_digit, scores, cycles), cycles counting
+    up to and including the edge that raises done.
+    """
+    n_out, n_in = fc_w.shape
+    w_flat = fc_w.reshape(-1).astype(np.int64)
+    feats = np.asarray(feats, dtype=np.int64)
+    scores = [0] * n_out
+
+    def wrap(v):
+        return (v + (1 << 31)) % (1 << 32) - (1 << 31)
+
+    state, cycles = "IDLE", 0
+    j = k = best_j = best_score = acc = 0
+    while True:
+        cycles += 1
+        if state == "IDLE":
+            j, k, acc = 0, 0, int(biases[0])
+            state = "ACCUM"
+        elif state == "ACCUM":
+            acc = wrap(acc + int(feats[k]) * int(w_flat[j * n_in + k]))
+            if k == n_in - 1:
+                state = "PREP"
+            else:
+                k += 1
+        elif state == "PREP":
+            scores[j] = acc
+            if j == n_out - 1:
+                # best_score <= scores[0] reads the value stored in an
+                # earlier PREP (n_out > 1), as the nonblocking RTL does
+                j, best_j, best_score = 0, 0, scores[0]
+                state = "ARGMAX"
+            else:
+                j, k, acc = j + 1, 0, int(biases[j + 1])
+                state = "ACCUM"
+        else:
+            if j < n_out:
+                if scores[j] > best_score:
+                    best_score, best_j = scores[j], j
+                j += 1
+            else:
+                return best_j, np.array(scores, dtype=np.int64), cycles
+
+
+def check_baseline(n_in=400, n_out=10, seed=0):
+    """
+    The FSM stepper must agree with golden_model on the result and with
+    the closed-form model on the cycle count. Returns the cycle count.
+    """
+    rng = np.random.default_rng(seed)
+    feats = rng.integers(0, 128, n_in, dtype=np.int8)
+    fc_w = rng.integers(-128, 128, (n_out, n_in), dtype=np.int8)
+    biases = rng.integers(-2000, 2000, n_out, dtype=np.int16)
+
+    digit, scores, cycles = simulate_fc_core(feats, fc_w, biases)
+    ref_scores, ref_pred = fc_int_forward_batch(feats[None, :], fc_w, biases)
+    if not (np.array_equal(scores, ref_scores[0]) and digit == ref_pred[0]):
+        raise AssertionError("fc_core stepper disagrees with golden_model")
+
+    modelled = estimate(BASELINE, fc_layer(n_in, n_out))["latency_cycles"]
+    if cycles != modelled or cycles != 1 + n_out * (n_in + 1) + n_out + 1:
+        raise AssertionError(f"baseline: FSM {cycles} cycles, model {modelled}")
+    return cycles
+
+
+###########################################
+# 3. CYCLE MODEL
+###########################################
+
+def macs_per_cycle(cfg):
+    """MACs actually issued per cycle: lanes, capped by weight bandwidth."""
+    return max(1, min(cfg.lanes, cfg.bram_ports * cfg.port_bits // 8))
+
+
+def tree_depth(n):
+    return math.ceil(math.log2(n)) if n > 1 else 0
+
+
+def stage_cycles(layer, cfg):
+    """Cycles for one stage of one frame, excluding the start cycle."""
+    m = macs_per_cycle(cfg)
+    # Lanes beyond K compute several outputs (channels) side by side
+    par = max(1, m // layer.k)
+    steps = -(-layer.k // m)
+    groups = -(-layer.outputs // par)
+    depth = tree_depth(min(m, layer.k))
+    if cfg.pipelined:
+        # Outputs back to back; fill + drain the tree and store stage once
+        cycles = groups * steps + depth + 1
+        if layer.kind == "fc":
+            cycles += 1                       # register pred after the last compare
+        return cycles
+
+    # Wait for the tree, then one store (PREP) cycle per output
+    cycles = groups * (steps + depth + 1)
+    if layer.kind == "conv":
+        cycles += layer.outputs               # separate pooling pass, one read per cycle
+    else:
+        cycles += layer.outputs + 1           # S_ARGMAX scan
+    return cycles
+
+
+def m10k_blocks(depth, width):
+    """Fewest M10K blocks holding `depth` words of `width` bits."""
+    if depth == 0 or width == 0:
+        return 0
+    return min(-(-depth // d) * -(-width // w) for d, w in M10K_CONFIGS)
+
+
+def resources(cfg, layers):
+    """{"dsp", "m10k"} estimate."""
+    m = macs_per_cycle(cfg)
+    engines = len(layers) if cfg.dataflow == "per-layer" else 1
+    dsp = engines * -(-m // MULTS_PER_DSP)
+
+    m10k = 0
+    bank_bytes = cfg.bram_ports * cfg.port_bits // 8
+    for layer in layers:
+        # Weights striped over bram_ports banks, one port_bits word per bank per cycle
+        words = -(-layer.weights // bank_bytes)
+        m10k += cfg.bram_ports * m10k_blocks(words, cfg.port_bits)
+        # Input activations, m bytes wide so the array is fed every cycle
+        m10k += m10k_blocks(-(-layer.in_acts // m), 8 * m)
+    return {"dsp": dsp, "m10k": m10k}
+
+
+def estimate(cfg, layers=None, clock_mhz=CLOCK_MHZ):
+    """Latency, throughput and resources of one configuration."""
+    if cfg.dataflow not in DATAFLOWS:
+        raise ValueError(f"dataflow must be one of {DATAFLOWS}, got {cfg.dataflow!r}")
+    layers = cnn_layers() if layers is None else layers
+
+    stages = {layer.name: stage_cycles(layer, cfg) for layer in layers}
+    latency = 1 + sum(stages.values())
+    interval = latency if cfg.dataflow == "shared" else 1 + max(stages.values())
+    res = resources(cfg, layers)
+    return {
+        **cfg._asdict(),
+        "macs_per_cycle": macs_per_cycle(cfg),
+        **{f"{name}_cycles": c for name, c in stages.items()},
+        "latency_cycles": latency,
+        "latency_us": latency / clock_mhz,
+        "throughput_fps": clock_mhz * 1e6 / interval,
+        **res,
+        "fits": res["dsp"] <= DEVICE_DSP and res["m10k"] <= DEVICE_M10K,
+    }
+
+
+###########################################
+# 4. DESIGN-SPACE SWEEP
+###########################################
+
+def config_grid(lanes=(1, 2, 4, 8, 16, 32, 64, 128), ports=(1, 2, 4, 8),
+                port_bits=(8, 16, 32), pipelined=(False, True), dataflows=DATAFLOWS):
+    return [Config(*c) for c in itertools.product(lanes, ports, port_bits, pipelined, dataflows)]
+
+
+def sweep(configs, layers=None, clock_mhz=CLOCK_MHZ):
+    return [estimate(cfg, layers, clock_mhz) for cfg in configs]
+
+
+def pareto(rows):
+    """Rows no other fitting row beats on latency, throughput, DSP and M10K at once."""
+    keys = [(r["latency_cycles"], -r["throughput_fps"], r["dsp"], r["m10k"]) for r in rows]
+    front = []
+    for i, ki in enumerate(keys):
+        if not rows[i]["fits"]:
+            continue
+        dominated = any(rows[j]["fits"] and kj != ki and all(a <= b for a, b in zip(kj, ki))
+                        for j, kj in enumerate(keys))
+        if not dominated:
+            front.append(rows[i])
+    # One row per distinct cost point
+    seen = {}
+    for r in front:
+        seen.setdefault((r["latency_cycles"], r["throughput_fps"], r["dsp"], r["m10k"]), r)
+    return sorted(seen.values(), key=lambda r: r["latency_cycles"])
+
+
+def format_rows(rows):
+    lines = [f"{'lanes':>5s} {'ports':>5s} {'bits':>4s} {'pipe':>4s} {'dataflow':>9s} "
+             f"{'MAC/c':>5s} {'cycles':>7s} {'latency':>10s} {'frames/s':>10s} {'DSP':>4s} {'M10K':>4s}"]
+    for r in rows:
+        lines.append(f"{r['lanes']:5d} {r['bram_ports']:5d} {r['port_bits']:4d} "
+                     f"{'yes' if r['pipelined'] else 'no':>4s} {r['dataflow']:>9s} "
+                     f"{r['macs_per_cycle']:5d} {r['latency_cycles']:7d} {r['latency_us']:8.2f}us "
+                     f"{r['throughput_fps']:10.0f} {r['dsp']:4d} {r['m10k']:4d}"
+                     + ("" if r["fits"] else "  (does not fit)"))
+    return "\n".join(lines)
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cycle / resource model of the inference datapath.")
+    parser.add_argument("--clock-mhz", type=float, default=CLOCK_MHZ)
+    parser.add_argument("--fc-only", action="store_true", help="model fc_core alone, not conv1 + conv2 + fc")
+    parser.add_argument("--lanes", type=int, default=None, help="estimate one configuration instead of sweeping")
+    parser.add_argument("--ports", type=int, default=1)
+    parser.add_argument("--port-bits", type=int, default=32)
+    parser.add_argument("--pipelined", action="store_true")
+    parser.add_argument("--dataflow", choices=DATAFLOWS, default="shared")
+    parser.add_argument("--all", action="store_true", help="print every swept configuration, not only the Pareto front")
+    parser.add_argument("--csv", default=None, help="write every swept configuration to this file")
+    args = parser.parse_args()
+
+    print(f"fc_core.v baseline: {check_baseline()} cycles (FSM stepper == model)")
+    layers = fc_layer() if args.fc_only else cnn_layers()
+
+    if args.lanes is not None:
+        cfg = Config(args.lanes, args.ports, args.port_bits, args.pipelined, args.dataflow)
+        r = estimate(cfg, layers, args.clock_mhz)
+        print(format_rows([r]))
+        print("  " + ", ".join(f"{layer.name} {r[layer.name + '_cycles']}" for layer in layers) + " cycles")
+        return
+
+    t0 = time.perf_counter()
+    rows = sweep(config_grid(), layers, args.clock_mhz)
+    elapsed = time.perf_counter() - t0
+    base = estimate(BASELINE, layers, args.clock_mhz)
+    print(f"Swept {len(rows)} configurations in {elapsed * 1000.0:.1f} ms at {args.clock_mhz:g} MHz "
+          f"(single-MAC baseline: {base['latency_cycles']} cycles, {base['throughput_fps']:.0f} frames/s)")
+    print(format_rows(rows if args.all else pareto(rows)))
+    if args.csv:
+        write_csv(args.csv, rows)
+        print(f"Wrote {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
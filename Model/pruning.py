@@ -0,0 +1,204 @@
+# pruning.py
+#
+# Magnitude pruning of SimpleCNN with masked fine-tuning, and a sweep
+# over sparsity levels that reports what the sparse hardware would gain.
+#
+# Per level:
+#   1. prune the trained model's conv1 / conv2 / fc weights, either
+#        unstructured : the smallest |w| of each layer
+#        structured   : whole 3x3 kernels (conv, by L1 norm) and whole
+#                       FC input features (columns, by L1 norm), so a
+#                       sparse engine skips entire loops
+#   2. fine-tune with the mask held (mnist_model.train_model(masks=...))
+#   3. calibrate and quantize to an IntCNN (int8 rounding zeroes a few
+#      more weights), then run the test set through
+#      sparse_model.sparse_forward, which counts dense / nonzero-weight /
+#      nonzero-weight-and-activation MACs
+#
+# The trained base model and each fine-tuned model are cached with
+# artifact_cache.py, keyed on the level and the training code.
+#
+# Usage:
+#   python pruning.py --levels 0 0.5 0.75 0.9
+#   python pruning.py --structured --export 0.75 --out hw_export/sparse
+
+import argparse
+import copy
+import json
+import os
+
+import numpy as np
+import torch
+
+import calibration
+import sparse_model
+from artifact_cache import ArtifactCache, code_digest
+from golden_model import IntCNN
+from mnist_cache import get_cached_mnist_loaders, load_split
+from mnist_model import build_int_model, train_model, train_or_load
+
+
+PRUNABLE = ("conv1.weight", "conv2.weight", "fc.weight")
+EVAL_CHUNK = 64
+
+
+###########################################
+# 1. MASKS
+###########################################
+
+def _keep_largest(scores, sparsity):
+    """0/1 mask that zeroes the round(sparsity * n) smallest scores."""
+    flat = scores.reshape(-1)
+    n_prune = int(round(sparsity * flat.numel()))
+    mask = torch.ones_like(flat)
+    if n_prune > 0:
+        mask[torch.argsort(flat)[:n_prune]] = 0.0
+    return mask.reshape(scores.shape)
+
+
+def magnitude_masks(model, sparsity, structured=False, names=PRUNABLE):
+    """{parameter name: 0/1 mask} pruning `sparsity` of each layer."""
+    params = dict(model.named_parameters())
+    masks = {}
+    for name in names:
+        w = params[name].detach().abs().cpu()
+        if not structured:
+            masks[name] = _keep_largest(w, sparsity)
+        elif w.dim() == 4:
+            # (out, in, kh, kw): whole kernels
+            masks[name] = _keep_largest(w.sum(dim=(2, 3)), sparsity)[:, :, None, None].expand_as(w).clone()
+        else:
+            # (out, in): whole input features
+            masks[name] = _keep_largest(w.sum(dim=0), sparsity)[None, :].expand_as(w).clone()
+    return masks
+
+
+def prune_or_load(cache, base, train_key, train_loader, device, sparsity, structured=False,
+                  epochs=1, lr=5e-4):
+    """Pruned + fine-tuned copy of `base` (cached). Returns (model, key)."""
+    key = cache.key(
+        "prune",
+        train=train_key,
+        code=code_digest(_keep_largest, magnitude_masks, train_model),
+        sparsity=sparsity, structured=structured, epochs=epochs, lr=lr,
+    )
+    model = copy.deepcopy(base)
+    state = cache.load_arrays(key, "state_dict")
+    if state is not None:
+        print(f"Loaded pruned model from cache ({key})")
+        model.load_state_dict({k: torch.from_numpy(v) for k, v in state.items()})
+        return model.to(device), key
+
+    masks = magnitude_masks(model, sparsity, structured)
+    print(f"Fine-tuning at {sparsity:.0%} {'structured' if structured else 'unstructured'} sparsity...")
+    model = train_model(model, train_loader, device, epochs=epochs, lr=lr, masks=masks)
+    cache.save_arrays(key, "state_dict",
+                      {k: v.detach().cpu().numpy() for k, v in model.state_dict().items()})
+    return model, key
+
+
+###########################################
+# 2. EVALUATION
+###########################################
+
+def eval_float(model, test_loader, device):
+    model.to(device)
+    model.eval()
+    correct = total = 0
+    with torch.no_grad():
+        for images, labels in test_loader:
+            preds = model(images.to(device)).argmax(dim=1).cpu()
+            correct += int((preds == labels).sum())
+            total += labels.size(0)
+    return correct / total * 100.0
+
+
+def eval_sparse(params, frames, labels):
+    """Integer accuracy (%) and per-frame MAC counts through sparse_forward."""
+    csrs = sparse_model.model_csr(params)
+    correct = 0
+    macs = {}
+    for i in range(0, len(frames), EVAL_CHUNK):
+        _, preds, stats = sparse_model.sparse_forward(params, frames[i:i + EVAL_CHUNK], csrs)
+        correct += int(np.sum(preds == labels[i:i + EVAL_CHUNK]))
+        for layer, counts in stats.items():
+            for kind, n in counts.items():
+                macs[kind] = macs.get(kind, 0) + n
+    n = len(frames)
+    return {
+        "int_acc": correct / n * 100.0,
+        **{kind: total / n for kind, total in macs.items()},
+        "fc_cycles": sparse_model.sparse_fc_cycles(csrs["fc"]),
+    }
+
+
+def sweep(levels, base, train_key, cache, train_loader, test_loader, device, structured=False,
+          epochs=1, lr=5e-4, calib="percentile"):
+    """One report row (and the IntCNN params) per sparsity level."""
+    frames, labels = (np.asarray(a) for a in load_split("test"))
+    rows, models = [], {}
+    for level in levels:
+        model = base if level == 0 else prune_or_load(cache, base, train_key, train_loader, device,
+                                                      level, structured, epochs, lr)[0]
+        act_scales = calibration.calibrate(model, train_loader, device, method=calib)
+        params = build_int_model(model, act_scales).params
+        row = {"sparsity": level, "structured": structured,
+               "float_acc": eval_float(model, test_loader, device),
+               "int8_zeros": sparse_model.sparsity(params)}
+        row.update(eval_sparse(params, frames, labels))
+        rows.append(row)
+        models[level] = params
+    return rows, models
+
+
+def format_rows(rows):
+    dense = rows[0]["dense_macs"]
+    lines = [f"{'sparsity':>8s} {'float':>7s} {'int8':>7s} {'MACs/frame':>11s} {'speedup':>7s} "
+             f"{'active MACs':>11s} {'speedup':>7s} {'fc cycles':>9s}"]
+    for r in rows:
+        lines.append(f"{r['sparsity']:8.0%} {r['float_acc']:6.2f}% {r['int_acc']:6.2f}% "
+                     f"{r['weight_macs']:11.0f} {dense / r['weight_macs']:6.2f}x "
+                     f"{r['active_macs']:11.0f} {dense / r['active_macs']:6.2f}x {r['fc_cycles']:9d}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prune SimpleCNN, fine-tune, and report sparse MAC savings.")
+    parser.add_argument("--levels", type=float, nargs="+", default=[0.0, 0.5, 0.75, 0.9])
+    parser.add_argument("--structured", action="store_true", help="prune whole kernels / FC input features")
+    parser.add_argument("--epochs", type=int, default=2, help="epochs of the dense base model")
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--finetune-epochs", type=int, default=1)
+    parser.add_argument("--finetune-lr", type=float, default=5e-4)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--calib", default="percentile", choices=calibration.CALIB_METHODS)
+    parser.add_argument("--export", type=float, default=None, help="write CSR .mem files for this level")
+    parser.add_argument("--out", default=os.path.join("hw_export", "sparse"))
+    parser.add_argument("--report", default="pruning_report.json")
+    parser.add_argument("--no-cache", action="store_true")
+    args = parser.parse_args()
+
+    levels = sorted(set(args.levels) | {0.0} | ({args.export} if args.export is not None else set()))
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    cache = ArtifactCache(enabled=not args.no_cache)
+    train_loader, test_loader = get_cached_mnist_loaders(batch_size=args.batch_size, seed=args.seed)
+
+    base, train_key = train_or_load(cache, train_loader, device, args.epochs, args.lr,
+                                    args.batch_size, args.seed)
+    rows, models = sweep(levels, base, train_key, cache, train_loader, test_loader, device,
+                         args.structured, args.finetune_epochs, args.finetune_lr, args.calib)
+
+    print(format_rows(rows))
+    with open(args.report, "w") as f:
+        json.dump(rows, f, indent=2)
+    print(f"Wrote {args.report}")
+
+    if args.export is not None:
+        sparse_model.export_sparse(models[args.export], args.out)
+        IntCNN(models[args.export]).save(os.path.join(args.out, "int_cnn.npz"))
+        print(f"Wrote CSR images for {args.export:.0%} sparsity to {args.out}/")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+# quantization.py
+#
+# Weight quantization modes for the integer pipeline, and the
+# multiply + shift requantization that goes with them.
+#
+# Modes (conv layers; scale convention q = round(w * scale) + zp):
+#   tensor        symmetric, one scale per tensor (= quantize_weight_int8)
+#   channel       symmetric, one scale per output channel
+#   tensor-asym   asymmetric [min, max] -> [-128, 127] with a zero point
+#   channel-asym  asymmetric, per output channel
+#   tensor-pow2   symmetric, scale rounded down to a power of two
+#   channel-pow2  symmetric, per channel, power-of-two scales
+#
+# Requantization between layers is out = (acc * M + 2^(shift-1)) >> shift
+# (golden_model.requantize). In the pow2 modes every scale in the chain is
+# a power of two (the input frame is read as byte / 256 instead of / 255),
+# so each ratio is exactly 2^-shift and M = 1: the hardware needs only an
+# arithmetic right shift, no multiplier.
+#
+# The asymmetric modes are for accuracy comparison only: the accumulator
+# sees w - w_zp, which spans [-255, 255] and needs a 9-bit weight operand,
+# so they cannot be exported for the int8 MAC (HW_MODES are the rest).
+#
+# The FC layer stays symmetric per tensor in every mode (power of two in
+# the pow2 modes): fc_core.v takes the argmax of the raw int32 scores, so
+# all 10 classes must share one accumulator scale.
+#
+# Run `python quantization.py --state-dict ... --int-model int_cnn.npz` to
+# print the test accuracy of every mode, and --export MODE to write that
+# mode's tensors with hw_export.py (symmetric modes only).
+
+import argparse
+from collections import namedtuple
+
+import numpy as np
+
+from golden_model import (CONV_LAYERS, INPUT_SCALE, REQUANT_BITS, IntCNN, quantize_bias,
+                          requant_multiplier)
+
+
+QMIN, QMAX = -128, 127
+POW2_INPUT_SCALE = 256.0
+
+QuantMode = namedtuple("QuantMode", "granularity symmetric pow2")
+
+MODES = {
+    "tensor": QuantMode("tensor", True, False),
+    "channel": QuantMode("channel", True, False),
+    "tensor-asym": QuantMode("tensor", False, False),
+    "channel-asym": QuantMode("channel", False, False),
+    "tensor-pow2": QuantMode("tensor", True, True),
+    "channel-pow2": QuantMode("channel", True, True),
+}
+# Modes whose weights the int8 MAC consumes directly
+HW_MODES = tuple(name for name, mode in MODES.items() if mode.symmetric)
+
+
+###########################################
+# 1. WEIGHT SCALES
+###########################################
+
+def pow2_floor(x):
+    """Largest power of two <= x, elementwise (x > 0)."""
+    return np.exp2(np.floor(np.log2(np.asarray(x, dtype=np.float64))))
+
+
+def weight_scale(w, mode):
+    """
+    (scale, zero_point) for `w` under `mode`: scalars per tensor, or (C,)
+    arrays over the first (output channel) axis per channel.
+    """
+    w = np.asarray(w, dtype=np.float64)
+    axes = tuple(range(1, w.ndim)) if mode.granularity == "channel" else None
+
+    if mode.symmetric:
+        span = np.max(np.abs(w), axis=axes)
+        levels = QMAX
+    else:
+        lo = np.minimum(np.min(w, axis=axes), 0.0)
+        hi = np.maximum(np.max(w, axis=axes), 0.0)
+        span = hi - lo
+        levels = QMAX - QMIN
+    scale = np.where(span > 0, levels / np.where(span > 0, span, 1.0), 1.0)
+
+    if mode.pow2:
+        scale = pow2_floor(scale)
+
+    if mode.symmetric:
+        zp = np.zeros_like(scale, dtype=np.int64)
+    else:
+        zp = np.clip(np.round(QMIN - lo * scale), QMIN, QMAX).astype(np.int64)
+    return scale, zp
+
+
+def quantize_weight(w, mode):
+    """int8 weights q = clip(round(w * scale) + zp). Returns (w_q, scale, zp)."""
+    w = np.asarray(w, dtype=np.float64)
+    scale, zp = weight_scale(w, mode)
+    shape = (-1,) + (1,) * (w.ndim - 1)
+    s = np.reshape(scale, shape) if np.ndim(scale) else scale
+    z = np.reshape(zp, shape) if np.ndim(zp) else zp
+    w_q = np.clip(np.round(w * s) + z, QMIN, QMAX).astype(np.int8)
+    return w_q, scale, zp
+
+
+def dequantize_weight(w_q, scale, zp):
+    shape = (-1,) + (1,) * (w_q.ndim - 1)
+    s = np.reshape(scale, shape) if np.ndim(scale) else scale
+    z = np.reshape(zp, shape) if np.ndim(zp) else zp
+    return (w_q.astype(np.float64) - z) / s
+
+
+def weight_sqnr_db(w, mode):
+    """Signal-to-quantization-noise ratio of `w` under `mode`, in dB."""
+    w = np.asarray(w, dtype=np.float64)
+    err = w - dequantize_weight(*quantize_weight(w, mode))
+    noise = np.mean(err * err)
+    return float("inf") if noise == 0 else float(10.0 * np.log10(np.mean(w * w) / noise))
+
+
+###########################################
+# 2. REQUANTIZATION (multiply + shift)
+###########################################
+
+def requant_params(ratio, shift_only=False):
+    """
+    (M, shift) with out = (acc * M + 2^(shift-1)) >> shift ~= acc * ratio.
+    shift_only forces M = 1: exact for power-of-two ratios, otherwise the
+    ratio is rounded to the nearest power of two.
+    """
+    return requant_multiplier(ratio, bits=1 if shift_only else REQUANT_BITS)
+
+
+def build_int_model(state_dict, act_scales, mode):
+    """
+    IntCNN for a float SimpleCNN state_dict under `mode` (a MODES key or
+    QuantMode). act_scales are the calibrated post-ReLU scales, as
+    calibration.calibrate returns them.
+    """
+    mode = MODES[mode] if isinstance(mode, str) else mode
+    p = {}
+    in_scale = POW2_INPUT_SCALE if mode.pow2 else INPUT_SCALE
+    for name in CONV_LAYERS:
+        w_q, w_scale, zp = quantize_weight(state_dict[f"{name}.weight"], mode)
+        n_out = w_q.shape[0]
+        acc_scale = np.broadcast_to(in_scale * np.asarray(w_scale), (n_out,))
+        out_scale = float(act_scales[name])
+        if mode.pow2:
+            out_scale = float(pow2_floor(out_scale))
+        M, shift = requant_params(out_scale / acc_scale, shift_only=mode.pow2)
+
+        p[f"{name}.w"] = w_q
+        p[f"{name}.b"] = quantize_bias(state_dict[f"{name}.bias"], acc_scale, 32)
+        p[f"{name}.w_scale"] = w_scale
+        p[f"{name}.in_scale"] = in_scale
+        p[f"{name}.out_scale"] = out_scale
+        p[f"{name}.M"] = M
+        p[f"{name}.shift"] = shift
+        if not mode.symmetric:
+            p[f"{name}.w_zp"] = zp
+        in_scale = out_scale
+
+    fc_mode = QuantMode("tensor", True, mode.pow2)
+    w_q, w_scale, _ = quantize_weight(state_dict["fc.weight"], fc_mode)
+    p["fc.w"] = w_q
+    p["fc.b"] = quantize_bias(state_dict["fc.bias"], in_scale * w_scale, 16)
+    p["fc.w_scale"] = w_scale
+    p["fc.in_scale"] = in_scale
+    return IntCNN(p)
+
+
+###########################################
+# 3. MODE COMPARISON
+###########################################
+
+def evaluate_modes(state_dict, act_scales, frames, labels, modes=tuple(MODES)):
+    """
+    {mode: {"accuracy", "weight_sqnr_db", "shift_only"}} on uint8 test
+    frames. weight_sqnr_db is over the conv weights (the FC is shared).
+    """
+    report = {}
+    for name in modes:
+        mode = MODES[name]
+        model = build_int_model(state_dict, act_scales, mode)
+        preds = model.predict(frames)
+        sqnr = [weight_sqnr_db(state_dict[f"{layer}.weight"], mode) for layer in CONV_LAYERS]
+        report[name] = {
+            "accuracy": float(np.mean(preds == labels) * 100.0),
+            "weight_sqnr_db": float(np.mean(sqnr)),
+            "shift_only": bool(all(np.all(model.params[f"{layer}.M"] == 1) for layer in CONV_LAYERS)),
+        }
+    return report
+
+
+def format_report(report):
+    lines = [f"{'mode':14s} {'accuracy':>9s} {'conv SQNR':>10s}  requant"]
+    for name, r in report.items():
+        lines.append(f"{name:14s} {r['accuracy']:8.2f}% {r['weight_sqnr_db']:8.1f} dB  "
+                     f"{'shift only' if r['shift_only'] else 'multiply + shift'}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare weight quantization modes on the MNIST test set.")
+    parser.add_argument("--state-dict", required=True, help="float SimpleCNN state_dict (.pth or .npz)")
+    parser.add_argument("--int-model", default="int_cnn.npz",
+                        help="IntCNN .npz whose conv out_scale values are the calibrated activation scales")
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    parser.add_argument("--limit", type=int, default=None, help="only the first N test images")
+    parser.add_argument("--export", choices=HW_MODES, default=None,
+                        help="write this mode's tensors with hw_export.py (int8 MAC: symmetric modes)")
+    parser.add_argument("--out", default="hw_export")
+    args = parser.parse_args()
+
+    from hw_export import export_tensors, int_model_tensors, load_state_dict, verify_export
+    from mnist_cache import load_split
+
+    state_dict = load_state_dict(args.state_dict)
+    ref = IntCNN.load(args.int_model).params
+    act_scales = {name: float(ref[f"{name}.out_scale"]) for name in CONV_LAYERS}
+
+    frames, labels = load_split("test")
+    frames, labels = np.asarray(frames[:args.limit]), np.asarray(labels[:args.limit])
+    print(format_report(evaluate_modes(state_dict, act_scales, frames, labels, args.modes)))
+
+    if args.export:
+        model = build_int_model(state_dict, act_scales, args.export)
+        tensors = int_model_tensors(model.params)
+        export_tensors(tensors, args.out, source=f"quantization:{args.export}")
+        verify_export(tensors, args.out)
+        print(f"Exported {args.export} to {args.out}/ (read back OK)")
+
+
+if __name__ == "__main__":
+    main()
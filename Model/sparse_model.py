@@ -0,0 +1,182 @@
+# sparse_model.py
+#
+# Sparse integer reference for a pruned IntCNN, and its CSR export.
+#
+# Each weight matrix (n_out, K) - conv layers as (out_ch, in_ch*kh*kw),
+# zero-point corrected like golden_model.effective_weight - is stored as
+# CSR:
+#   row_ptr (n_out + 1,)  start of each output's nonzeros
+#   col_idx (nnz,)        feature index k of each nonzero
+#   values  (nnz,)        the nonzero int8 weights
+# A sparse engine walks only the nonzeros, so an output costs nnz_j MAC
+# cycles instead of K.
+#
+# sparse_forward() runs the whole network through the CSR matrices and
+# must match IntCNN.forward bit for bit; it also counts
+#   dense_macs   K per output            (what fc_core does today)
+#   weight_macs  nonzero weights         (static: skip zero weights)
+#   active_macs  nonzero weight x nonzero activation pairs
+#                                        (dynamic: also skip zero inputs)
+#
+# .mem export per layer (write_csr):
+#   <name>_ptr.mem     16-bit row pointers
+#   <name>_idx.mem     16-bit column indices
+#   <name>_val.mem     8-bit values
+#   <name>_stream.mem  one 24-bit word per nonzero, {idx[15:0], val[7:0]},
+#                      so a streaming MAC reads index + value in one access
+#
+# Plain NumPy, like golden_model.py.
+
+import os
+from collections import namedtuple
+
+import numpy as np
+
+from golden_model import (CONV_LAYERS, effective_weight, frames_to_nchw, im2col, maxpool2x2_int,
+                          relu_requant, wrap_int32, argmax_first)
+from memfile import check_image, write_mem
+
+
+CSR = namedtuple("CSR", "row_ptr col_idx values shape")
+
+INDEX_BITS = 16
+STREAM_BITS = INDEX_BITS + 8
+
+
+###########################################
+# 1. CSR
+###########################################
+
+def csr_encode(w):
+    """CSR of the (n_out, K) view of an integer weight tensor."""
+    w2 = np.asarray(w).reshape(np.shape(w)[0], -1)
+    rows, cols = np.nonzero(w2)
+    row_ptr = np.zeros(w2.shape[0] + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=w2.shape[0]), out=row_ptr[1:])
+    return CSR(row_ptr, cols.astype(np.int64), w2[rows, cols], w2.shape)
+
+
+def csr_decode(csr):
+    w = np.zeros(csr.shape, dtype=csr.values.dtype)
+    rows = np.repeat(np.arange(csr.shape[0]), np.diff(csr.row_ptr))
+    w[rows, csr.col_idx] = csr.values
+    return w
+
+
+def csr_matmul(x, csr):
+    """
+    x (M, K) integer @ W.T through the nonzeros only -> (M, n_out) int64,
+    plus the number of products whose activation was nonzero.
+    """
+    x = np.asarray(x, dtype=np.int64)
+    n_out = csr.shape[0]
+    out = np.zeros((x.shape[0], n_out), dtype=np.int64)
+    if csr.values.size == 0:
+        return out, 0
+
+    gathered = x[:, csr.col_idx]                              # (M, nnz)
+    prods = gathered * csr.values.astype(np.int64)[None, :]
+    # reduceat over each row's slice; empty rows stay 0
+    nnz = np.diff(csr.row_ptr)
+    starts = csr.row_ptr[:-1][nnz > 0]
+    out[:, nnz > 0] = np.add.reduceat(prods, starts, axis=1)
+    return out, int(np.count_nonzero(gathered))
+
+
+###########################################
+# 2. SPARSE FORWARD
+###########################################
+
+def model_csr(params):
+    """{layer: CSR} for conv1, conv2 and fc of IntCNN params."""
+    csrs = {name: csr_encode(effective_weight(params, name)) for name in CONV_LAYERS}
+    csrs["fc"] = csr_encode(params["fc.w"])
+    return csrs
+
+
+def sparse_forward(params, frames, csrs=None):
+    """
+    IntCNN.forward through CSR weights. Returns (scores, preds, stats) with
+    stats[layer] = {"dense_macs", "weight_macs", "active_macs"} summed over
+    the batch.
+    """
+    p = params
+    csrs = model_csr(p) if csrs is None else csrs
+    x = frames_to_nchw(frames)
+    stats = {}
+
+    for name in CONV_LAYERS:
+        csr = csrs[name]
+        o = csr.shape[0]
+        kh, kw = p[f"{name}.w"].shape[2:]
+        cols, (n, oh, ow) = im2col(np.asarray(x, dtype=np.int64), kh, kw)
+        acc, active = csr_matmul(cols, csr)
+        acc += p[f"{name}.b"].astype(np.int64)[None, :]
+        acc = wrap_int32(acc.reshape(n, oh, ow, o).transpose(0, 3, 1, 2))
+        x = maxpool2x2_int(relu_requant(acc, p[f"{name}.M"], p[f"{name}.shift"]))
+        positions = cols.shape[0]
+        stats[name] = {"dense_macs": positions * o * csr.shape[1],
+                       "weight_macs": positions * csr.values.size, "active_macs": active}
+
+    feats = x.reshape(x.shape[0], -1).astype(np.int8)
+    csr = csrs["fc"]
+    acc, active = csr_matmul(feats, csr)
+    scores = wrap_int32(acc + p["fc.b"].astype(np.int64)[None, :])
+    n = feats.shape[0]
+    stats["fc"] = {"dense_macs": n * csr.shape[0] * csr.shape[1],
+                   "weight_macs": n * csr.values.size, "active_macs": active}
+    return scores, argmax_first(scores), stats
+
+
+def sparse_fc_cycles(csr):
+    """
+    fc_core cycles if S_ACCUM walked the nonzeros of each class instead of
+    all N_IN features: 1 + sum(nnz_j + 1) + N_OUT + 1 (4022 when dense).
+    """
+    n_out = csr.shape[0]
+    return int(1 + np.sum(np.diff(csr.row_ptr) + 1) + n_out + 1)
+
+
+def sparsity(params):
+    """Fraction of zero int8 weights per layer."""
+    return {name: float(np.mean(np.asarray(params[f"{name}.w"]) == 0)) for name in CONV_LAYERS + ("fc",)}
+
+
+###########################################
+# 3. .mem EXPORT
+###########################################
+
+def csr_stream(csr):
+    """{idx, val} 24-bit words, in row order."""
+    return (csr.col_idx << 8) | (csr.values.astype(np.int64) & 0xFF)
+
+
+def write_csr(out_dir, name, csr):
+    """Write the four CSR images for one layer and read them back. Returns the paths."""
+    if csr.shape[1] > (1 << INDEX_BITS) or csr.values.size >= (1 << INDEX_BITS):
+        raise ValueError(f"{name}: does not fit {INDEX_BITS}-bit indices")
+    if csr.values.size and (csr.values.min() < -128 or csr.values.max() > 127):
+        raise ValueError(f"{name}: values do not fit int8 (asymmetric zero point?)")
+    os.makedirs(out_dir, exist_ok=True)
+
+    images = (
+        (f"{name}_ptr.mem", csr.row_ptr, INDEX_BITS),
+        (f"{name}_idx.mem", csr.col_idx, INDEX_BITS),
+        (f"{name}_val.mem", csr.values, 8),
+        (f"{name}_stream.mem", csr_stream(csr), STREAM_BITS),
+    )
+    paths = []
+    for filename, values, width in images:
+        path = os.path.join(out_dir, filename)
+        write_mem(path, values, width)
+        check_image(path, values, width)
+        paths.append(path)
+    return paths
+
+
+def export_sparse(params, out_dir):
+    """CSR images of every layer. Returns {layer: CSR}."""
+    csrs = model_csr(params)
+    for name, csr in csrs.items():
+        write_csr(out_dir, name, csr)
+    return csrs
@@ -0,0 +1,199 @@
+# weight_layout.py
+#
+# Packs int8 weight matrices into wide, banked memory words, so a MAC
+# array can fetch all of its operands in one access.
+#
+# fc_w_flat.mem stores one weight per address at j * N_IN + k (class j,
+# feature k). Here a weight matrix W (n_out, K) - a conv layer is its
+# (out_ch, in_ch * kh * kw) view - is split into words of L = width / 8
+# int8 lanes, and consecutive words are interleaved over B banks:
+#
+#   layout "row"    (feature-parallel, one class at a time; a row is
+#                   padded to K_pad = ceil(K / L) * L)
+#       word(j, k) = j * K_pad / L + k // L      lane = k % L
+#       -> L consecutive features of one class per word; the array
+#          multiplies them with L features of the same vector.
+#   layout "class"  (class-parallel, one feature broadcast to L classes;
+#                   classes padded to J_pad = ceil(n_out / L) * L)
+#       word(j, k) = (j // L) * K + k             lane = j % L
+#       -> weights of L classes for one feature per word.
+#
+#   bank = word % B       address = word // B
+#
+# so B banks read at the same address return B consecutive words: B * L
+# weights per cycle. Lane l of a word is word[8*l +: 8] (little-endian),
+# padding lanes are 0.
+#
+# write_packed() writes <name>_bank<b>.{mem,mif,bin} and <name>_layout.json
+# (the address map); read_packed() parses the files back and
+# unpack_weights() rebuilds W, which must equal the input exactly.
+#
+# Usage:
+#   python weight_layout.py --int-model int_cnn.npz --width 64 --banks 4 --layout class
+#   python weight_layout.py --mem fc_w_flat.mem --shape 10 400 --width 32 --banks 2
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+from golden_model import CONV_LAYERS, IntCNN
+from memfile import depth_for, read_image, read_wide_image, to_signed, write_wide
+
+
+LAYOUTS = ("row", "class")
+WORD_WIDTHS = (8, 16, 32, 64, 128, 256)
+
+
+###########################################
+# 1. ADDRESS MAP
+###########################################
+
+def layout_meta(shape, width=32, banks=1, layout="row", name="w"):
+    """Address-map parameters for a (n_out, K) int8 matrix."""
+    if layout not in LAYOUTS:
+        raise ValueError(f"layout must be one of {LAYOUTS}, got {layout!r}")
+    if width % 8 or width < 8:
+        raise ValueError(f"word width must be a multiple of 8 bits, got {width}")
+    if banks < 1:
+        raise ValueError(f"banks must be >= 1, got {banks}")
+
+    n_out, k = (int(d) for d in shape)
+    lanes = width // 8
+    if layout == "row":
+        k_pad = -(-k // lanes) * lanes
+        words = n_out * k_pad // lanes
+        formula = "word = j * K_pad / L + k // L, lane = k % L"
+    else:
+        k_pad = k
+        words = -(-n_out // lanes) * k
+        formula = "word = (j // L) * K + k, lane = j % L"
+    bank_words = -(-words // banks)
+    return {
+        "name": name,
+        "layout": layout,
+        "shape": [n_out, k],
+        "width": width,
+        "lanes": lanes,
+        "banks": banks,
+        "k_pad": k_pad,
+        "words": words,
+        "bank_words": bank_words,
+        "bank_depth": depth_for(bank_words),
+        "weights_per_access": banks * lanes,
+        "formula": formula + "; bank = word % B, address = word // B",
+    }
+
+
+def address_map(meta):
+    """(bank, address, lane) of every weight, each an (n_out, K) int array."""
+    n_out, k = meta["shape"]
+    lanes = meta["lanes"]
+    j, kk = np.meshgrid(np.arange(n_out), np.arange(k), indexing="ij")
+    if meta["layout"] == "row":
+        word = j * (meta["k_pad"] // lanes) + kk // lanes
+        lane = kk % lanes
+    else:
+        word = (j // lanes) * k + kk
+        lane = j % lanes
+    return word % meta["banks"], word // meta["banks"], lane
+
+
+###########################################
+# 2. PACKING
+###########################################
+
+def pack_weights(w, width=32, banks=1, layout="row", name="w"):
+    """
+    int8 (n_out, ...) weights -> ((banks, bank_words, lanes) uint8 words,
+    layout meta). Trailing dimensions are flattened into K.
+    """
+    w = np.asarray(w)
+    w2 = w.reshape(w.shape[0], -1)
+    meta = layout_meta(w2.shape, width, banks, layout, name)
+    meta["tensor_shape"] = list(w.shape)
+
+    words = np.zeros((banks, meta["bank_words"], meta["lanes"]), dtype=np.uint8)
+    bank, addr, lane = address_map(meta)
+    words[bank, addr, lane] = w2.astype(np.int8).view(np.uint8)
+    return words, meta
+
+
+def unpack_weights(words, meta):
+    """Inverse of pack_weights: the int8 weights in their original shape."""
+    bank, addr, lane = address_map(meta)
+    w2 = np.asarray(words, dtype=np.uint8)[bank, addr, lane].view(np.int8)
+    return w2.reshape(meta.get("tensor_shape", meta["shape"]))
+
+
+def bank_file(meta, b, fmt):
+    return f"{meta['name']}_bank{b}.{fmt}"
+
+
+def write_packed(out_dir, w, width=32, banks=1, layout="row", name="w", formats=("mem", "mif")):
+    """Write every bank in `formats` and <name>_layout.json. Returns the meta."""
+    os.makedirs(out_dir, exist_ok=True)
+    words, meta = pack_weights(w, width, banks, layout, name)
+    meta["files"] = {fmt: [bank_file(meta, b, fmt) for b in range(banks)] for fmt in formats}
+    for fmt in formats:
+        for b in range(banks):
+            depth = meta["bank_depth"] if fmt == "mif" else None
+            write_wide(os.path.join(out_dir, bank_file(meta, b, fmt)), words[b], depth)
+    with open(os.path.join(out_dir, f"{name}_layout.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def read_packed(out_dir, name, fmt="mem"):
+    """Parse a written layout back: ((banks, bank_words, lanes) words, meta)."""
+    with open(os.path.join(out_dir, f"{name}_layout.json")) as f:
+        meta = json.load(f)
+    words = np.stack([read_wide_image(os.path.join(out_dir, bank_file(meta, b, fmt)), meta["lanes"])
+                      [:meta["bank_words"]] for b in range(meta["banks"])])
+    return words, meta
+
+
+def check_round_trip(out_dir, name, w, formats=("mem", "mif")):
+    """Raise ValueError unless every written format unpacks back to `w`."""
+    for fmt in formats:
+        got = unpack_weights(*read_packed(out_dir, name, fmt))
+        if got.shape != np.shape(w) or not np.array_equal(got, w):
+            raise ValueError(f"{name} ({fmt}) does not round-trip")
+
+
+###########################################
+# 3. CLI
+###########################################
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack int8 weights into wide, banked memory words.")
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument("--int-model", help="IntCNN .npz: pack conv1, conv2 and fc")
+    src.add_argument("--mem", help="a byte-per-address .mem image such as fc_w_flat.mem")
+    parser.add_argument("--shape", type=int, nargs=2, default=(10, 400), help="(n_out, K) of --mem")
+    parser.add_argument("--width", type=int, choices=WORD_WIDTHS, default=32)
+    parser.add_argument("--banks", type=int, default=1)
+    parser.add_argument("--layout", choices=LAYOUTS, default="row")
+    parser.add_argument("--formats", nargs="+", choices=("mem", "mif", "bin"), default=["mem", "mif"])
+    parser.add_argument("--out", default=os.path.join("hw_export", "packed"))
+    args = parser.parse_args()
+
+    if args.int_model:
+        p = IntCNN.load(args.int_model).params
+        tensors = {f"{name}_w": p[f"{name}.w"] for name in CONV_LAYERS + ("fc",)}
+    else:
+        w = to_signed(read_image(args.mem), 8).astype(np.int8)
+        tensors = {os.path.splitext(os.path.basename(args.mem))[0]: w.reshape(args.shape)}
+
+    for name, w in tensors.items():
+        meta = write_packed(args.out, w, args.width, args.banks, args.layout, name, args.formats)
+        check_round_trip(args.out, name, w, args.formats)
+        pad = meta["banks"] * meta["bank_words"] * meta["lanes"] - w.size
+        print(f"{name:10s} {str(list(w.shape)):16s} -> {meta['banks']} x {meta['bank_words']} words "
+              f"x {meta['width']} bit ({meta['weights_per_access']} weights/access, {pad} pad bytes)")
+    print(f"Wrote {args.out}/ (round trip OK)")
+
+
+if __name__ == "__main__":
+    main()
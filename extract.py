@@ -1,7 +1,12 @@
 # save as: extract_conv1_to_mif.py
+import os, sys
 import torch, numpy as np
 import re
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "Model"))
+from artifact_cache import ArtifactCache, code_digest  # noqa: E402
+from memfile import check_image, write_mif  # noqa: E402
+
 CKPT = "mnist_cnn.pth"     # <-- put your file name here
 MIF  = "weights.mif"
 
@@ -67,21 +72,15 @@ def to_q1p7(x):
     return xq
 
 def write_mif_8x5x5(weights_q, path):
-    # weights_q: [8,1,5,5] int8
-    with open(path, "w") as f:
-        f.write("DEPTH = 512;\nWIDTH = 8;\nADDRESS_RADIX = DEC;\nDATA_RADIX = HEX;\nCONTENT BEGIN\n")
-        addr = 0
-        for filt in range(8):
-            for ky in range(5):
-                for kx in range(5):
-                    byte = int(weights_q[filt, 0, ky, kx].item()) & 0xFF
-                    f.write(f"  {addr:3d} : {byte:02X};\n")
-                    addr += 1
-        f.write(f"  [{addr}..511] : 00;\nEND;\n")
+    # weights_q: [8,1,5,5] int8 -> 200 words, [200..511] filled with 00
+    assert tuple(weights_q.shape) == (8, 1, 5, 5)
+    w = np.asarray(weights_q)
+    write_mif(path, w, width=8, depth=512)
+    check_image(path, w, 8)             # parse it back: must match the weights
     print(f"✅ Wrote {path}")
 
-if __name__ == "__main__":
-    sd = load_state_dict_any(CKPT)
+def extract_conv1_q(path):
+    sd = load_state_dict_any(path)
     k = pick_conv1_key(sd)
     w = sd[k].float()                 # e.g., [10,1,5,5] or [16,1,3,3], etc.
     # Force shape to [>=8, 1, 5, 5]
@@ -91,5 +90,19 @@ if __name__ == "__main__":
     if w.shape[0] < 8:
         raise RuntimeError(f"conv1 out_channels={w.shape[0]} < 8; need at least 8.")
     w8 = w[:8, :, :5, :5]             # take first 8 filters
-    w8_q = to_q1p7(w8)
+    return to_q1p7(w8)
+
+if __name__ == "__main__":
+    # Keyed on the checkpoint bytes and this script, so re-running (or
+    # only changing write_mif_8x5x5) skips torch.load
+    cache = ArtifactCache()
+    key = cache.key("conv1", ckpt=cache.file_digest(CKPT),
+                    code=code_digest(load_state_dict_any, pick_conv1_key, center_to_5x5,
+                                     to_q1p7, extract_conv1_q))
+    cached = cache.load_arrays(key, "conv1_q")
+    if cached is not None:
+        w8_q = torch.from_numpy(cached["w8_q"])
+    else:
+        w8_q = extract_conv1_q(CKPT)
+        cache.save_arrays(key, "conv1_q", {"w8_q": w8_q.numpy()})
     write_mif_8x5x5(w8_q, MIF)
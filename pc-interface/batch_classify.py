@@ -0,0 +1,262 @@
+"""
+Headless batch classification: replay an image dataset through the board.
+
+Streams frames from MNIST IDX files, a directory of PNGs or an .npy stack
+to the serial port and compares the board's answers with the labels and
+with the integer golden model (Model/golden_model.py). Writes a JSON
+summary (accuracy, confusion matrix, latency percentiles, frames/s) and
+an optional per-frame CSV. Use this to regression-test a new bitstream
+under realistic load; point --port at fpga_emulator.py to dry-run it.
+
+Usage:
+    python batch_classify.py --port /dev/ttyUSB0 \\
+        --idx-images t10k-images-idx3-ubyte --idx-labels t10k-labels-idx1-ubyte \\
+        --model ../Model/int_cnn.npz --json report.json --csv frames.csv
+"""
+import argparse
+import csv
+import glob
+import gzip
+import json
+import os
+import re
+import struct
+import sys
+import time
+
+import numpy as np
+import serial
+
+from frame_codec import encode_auto
+from frame_protocol import LEGACY_HEADER, PipelinedLink
+from preprocess import preprocess_batch
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Model")
+sys.path.insert(0, MODEL_DIR)
+from golden_model import IntCNN  # noqa: E402
+
+
+NUM_CLASSES = 10
+IDX_IMAGES_MAGIC = 0x00000803
+IDX_LABELS_MAGIC = 0x00000801
+
+
+###########################################
+# Dataset loaders -> (frames (N,28,28) uint8, labels (N,) int or None)
+###########################################
+
+def _open_maybe_gz(path):
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+
+def load_idx(images_path, labels_path=None):
+    """MNIST IDX ubyte files (optionally .gz)."""
+    with _open_maybe_gz(images_path) as f:
+        magic, n, rows, cols = struct.unpack(">IIII", f.read(16))
+        if magic != IDX_IMAGES_MAGIC:
+            raise ValueError(f"{images_path}: not an IDX image file (magic 0x{magic:08X})")
+        frames = np.frombuffer(f.read(n * rows * cols), dtype=np.uint8).reshape(n, rows, cols)
+
+    labels = None
+    if labels_path:
+        with _open_maybe_gz(labels_path) as f:
+            magic, n_lbl = struct.unpack(">II", f.read(8))
+            if magic != IDX_LABELS_MAGIC:
+                raise ValueError(f"{labels_path}: not an IDX label file (magic 0x{magic:08X})")
+            labels = np.frombuffer(f.read(n_lbl), dtype=np.uint8).astype(np.int64)
+    return frames, labels
+
+
+def load_png_dir(path):
+    """
+    Every *.png under `path`, converted to 28x28 grayscale. The label is
+    taken from the parent directory name (e.g. 7/xyz.png) or a leading
+    digit in the file name (e.g. 7_xyz.png); -1 if neither exists.
+    """
+    from PIL import Image
+
+    files = sorted(glob.glob(os.path.join(path, "**", "*.png"), recursive=True))
+    if not files:
+        raise ValueError(f"no .png files under {path}")
+
+    frames = np.empty((len(files), 28, 28), dtype=np.uint8)
+    labels = np.full(len(files), -1, dtype=np.int64)
+    for i, name in enumerate(files):
+        img = Image.open(name).convert("L")
+        if img.size != (28, 28):
+            img = img.resize((28, 28), Image.LANCZOS)
+        frames[i] = np.asarray(img)
+
+        parent = os.path.basename(os.path.dirname(name))
+        match = re.match(r"(\d)(?:_|$)", os.path.basename(name))
+        if parent.isdigit() and len(parent) == 1:
+            labels[i] = int(parent)
+        elif match:
+            labels[i] = int(match.group(1))
+    return frames, (labels if np.all(labels >= 0) else None)
+
+
+def load_npy(path, labels_path=None):
+    frames = np.load(path).astype(np.uint8).reshape(-1, 28, 28)
+    labels = np.load(labels_path).astype(np.int64) if labels_path else None
+    return frames, labels
+
+
+###########################################
+# Senders -> (board digits (N,) with -1 = no reply, latencies (N,) seconds)
+###########################################
+
+def run_framed(ser, frames, window, timeout, retries):
+    link = PipelinedLink(ser, window=window, timeout=timeout, retries=retries)
+    digits = np.full(len(frames), -1, dtype=np.int64)
+    latency = np.full(len(frames), np.nan)
+
+    def record(completions):
+        for done in completions:
+            latency[done.tag] = done.latency
+            if done.reply is not None and done.reply.digit is not None:
+                digits[done.tag] = done.reply.digit
+
+    for i, frame in enumerate(frames):
+        fmt, payload = encode_auto(frame)
+        link.send(payload, tag=i, fmt=fmt)
+        record(link.collect())
+    record(link.drain())
+    return digits, latency
+
+
+def run_legacy(ser, frames, frame_gap):
+    """Stop-and-wait 0xAA frames; expects a one-byte digit reply."""
+    digits = np.full(len(frames), -1, dtype=np.int64)
+    latency = np.full(len(frames), np.nan)
+    for i, frame in enumerate(frames):
+        t0 = time.perf_counter()
+        ser.write(bytes([LEGACY_HEADER]) + frame.tobytes())
+        ser.flush()
+        reply = ser.read(1)
+        latency[i] = time.perf_counter() - t0
+        if reply:
+            digits[i] = reply[0]
+        if frame_gap > 0:
+            time.sleep(frame_gap)
+    return digits, latency
+
+
+###########################################
+# Report
+###########################################
+
+def confusion_matrix(labels, preds):
+    """Rows = true label, cols = predicted digit; unanswered frames are skipped."""
+    cm = np.zeros((NUM_CLASSES, NUM_CLASSES), dtype=np.int64)
+    ok = (preds >= 0) & (preds < NUM_CLASSES)
+    np.add.at(cm, (labels[ok], preds[ok]), 1)
+    return cm
+
+
+def build_report(digits, latency, elapsed, labels=None, golden=None):
+    answered = digits >= 0
+    lat_ms = latency[~np.isnan(latency)] * 1000.0
+    report = {
+        "frames": int(digits.size),
+        "answered": int(answered.sum()),
+        "elapsed_s": round(elapsed, 4),
+        "frames_per_s": round(digits.size / elapsed, 2) if elapsed > 0 else 0.0,
+        "latency_ms": {
+            f"p{q}": round(float(np.percentile(lat_ms, q)), 3) if lat_ms.size else None
+            for q in (50, 95, 99)
+        },
+    }
+    if labels is not None:
+        report["board_accuracy"] = round(float(np.mean(digits == labels)) * 100.0, 3)
+        report["confusion_matrix"] = confusion_matrix(labels, digits).tolist()
+    if golden is not None:
+        report["golden_agreement"] = round(float(np.mean(digits == golden)) * 100.0, 3)
+        report["golden_mismatches"] = np.flatnonzero(answered & (digits != golden))[:100].tolist()
+        if labels is not None:
+            report["golden_accuracy"] = round(float(np.mean(golden == labels)) * 100.0, 3)
+    return report
+
+
+def write_csv(path, digits, latency, labels=None, golden=None):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["index", "label", "board", "golden", "latency_ms"])
+        for i in range(digits.size):
+            writer.writerow([
+                i,
+                "" if labels is None else int(labels[i]),
+                int(digits[i]),
+                "" if golden is None else int(golden[i]),
+                "" if np.isnan(latency[i]) else f"{latency[i] * 1000.0:.3f}",
+            ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay an image dataset through the FPGA.")
+    parser.add_argument("--port", required=True, help="serial port or pyserial URL")
+    parser.add_argument("--baud", type=int, default=115200)
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument("--idx-images", help="MNIST IDX image file (.gz ok)")
+    src.add_argument("--png-dir", help="directory of PNG digits")
+    src.add_argument("--npy", help="(N,28,28) uint8 .npy stack")
+    parser.add_argument("--idx-labels", help="MNIST IDX label file (with --idx-images)")
+    parser.add_argument("--labels", help=".npy labels (with --npy)")
+    parser.add_argument("--limit", type=int, default=None, help="only the first N frames")
+    parser.add_argument("--preprocess", action="store_true", help="apply MNIST-style preprocessing")
+    parser.add_argument("--model", default=os.path.join(MODEL_DIR, "int_cnn.npz"),
+                        help="IntCNN .npz for the golden comparison ('' to skip)")
+    parser.add_argument("--protocol", choices=("framed", "legacy"), default="framed")
+    parser.add_argument("--window", type=int, default=8, help="framed: requests in flight")
+    parser.add_argument("--timeout", type=float, default=1.0)
+    parser.add_argument("--retries", type=int, default=2)
+    parser.add_argument("--gap", type=float, default=0.2, help="legacy: seconds between frames")
+    parser.add_argument("--json", default="batch_report.json")
+    parser.add_argument("--csv", default=None)
+    args = parser.parse_args()
+
+    if args.idx_images:
+        frames, labels = load_idx(args.idx_images, args.idx_labels)
+    elif args.png_dir:
+        frames, labels = load_png_dir(args.png_dir)
+    else:
+        frames, labels = load_npy(args.npy, args.labels)
+
+    if args.limit:
+        frames = frames[:args.limit]
+        labels = labels[:args.limit] if labels is not None else None
+    if args.preprocess:
+        frames = preprocess_batch(frames)
+    frames = np.ascontiguousarray(frames)
+
+    golden = None
+    if args.model:
+        golden = IntCNN.load(args.model).predict(frames)
+
+    print(f"Sending {len(frames)} frames to {args.port} ({args.protocol})...")
+    # Framed mode polls with short reads and keeps its own deadlines
+    read_timeout = 0.05 if args.protocol == "framed" else args.timeout
+    with serial.serial_for_url(args.port, args.baud, timeout=read_timeout) as ser:
+        ser.reset_input_buffer()
+        t0 = time.perf_counter()
+        if args.protocol == "framed":
+            digits, latency = run_framed(ser, frames, args.window, args.timeout, args.retries)
+        else:
+            digits, latency = run_legacy(ser, frames, args.gap)
+        elapsed = time.perf_counter() - t0
+
+    report = build_report(digits, latency, elapsed, labels, golden)
+    with open(args.json, "w") as f:
+        json.dump(report, f, indent=2)
+    if args.csv:
+        write_csv(args.csv, digits, latency, labels, golden)
+
+    for key in ("frames", "answered", "board_accuracy", "golden_agreement",
+                "golden_accuracy", "frames_per_s", "latency_ms"):
+        if key in report:
+            print(f"{key}: {report[key]}")
+    print(f"Report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
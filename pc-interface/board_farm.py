@@ -0,0 +1,217 @@
+"""
+Headless multi-board dispatcher for FPGA digit classification.
+
+Holds a pool of serial ports (one per DE1-SoC + Arduino), queues frames and
+sends each 0xAA + 784-byte frame to whichever board is idle. One worker
+thread per board pulls from a shared queue, so a slow board never holds up
+the others. Results come back as concurrent.futures.Future objects.
+
+Ports are opened with serial.serial_for_url, so a device path, the pty from
+fpga_emulator.py or any pyserial URL works as a stand-in for a board.
+
+Usage:
+    python board_farm.py --ports /dev/ttyUSB0 /dev/ttyUSB1 --npy frames.npy
+"""
+import argparse
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+import serial
+
+
+FRAME_HEADER = b'\xAA'
+FRAME_PIXELS = 28 * 28
+
+# Same lockout DrawingApp uses between frames: time for the Arduino to
+# shift 6272 bits into arduino_mnist_capture.
+DEFAULT_FRAME_GAP = 0.2
+
+
+def frame_to_payload(frame):
+    """28x28 (or 784) uint8 array -> 784 raw bytes, as DrawingApp.classify sends."""
+    payload = np.asarray(frame, dtype=np.uint8).reshape(-1).tobytes()
+    if len(payload) != FRAME_PIXELS:
+        raise ValueError(f"Payload length is {len(payload)}, expected {FRAME_PIXELS}.")
+    return payload
+
+
+class BoardStats:
+    """Per-board counters, updated only by that board's worker thread."""
+
+    def __init__(self, port):
+        self.port = port
+        self.frames = 0
+        self.replies = 0
+        self.errors = 0
+        self.busy_time = 0.0
+        self.started = None
+        self.stopped = None
+
+    def as_dict(self):
+        end = self.stopped or time.perf_counter()
+        elapsed = (end - self.started) if self.started else 0.0
+        return {
+            "port": self.port,
+            "frames": self.frames,
+            "replies": self.replies,
+            "errors": self.errors,
+            "busy_s": round(self.busy_time, 4),
+            "frames_per_s": round(self.frames / elapsed, 2) if elapsed > 0 else 0.0,
+        }
+
+
+class BoardWorker(threading.Thread):
+    """Owns one serial port and serves frames from the shared queue."""
+
+    def __init__(self, port, jobs, baud, timeout, frame_gap, expect_reply):
+        super().__init__(name=f"board-{port}", daemon=True)
+        self.port = port
+        self.jobs = jobs
+        self.baud = baud
+        self.timeout = timeout
+        self.frame_gap = frame_gap
+        self.expect_reply = expect_reply
+        self.stats = BoardStats(port)
+        self.ser = None
+
+    def open(self):
+        self.ser = serial.serial_for_url(self.port, self.baud, timeout=self.timeout)
+        self.ser.reset_input_buffer()
+
+    def send_frame(self, payload):
+        """Send one frame; return the predicted digit, or None if no reply."""
+        self.ser.write(FRAME_HEADER)
+        self.ser.write(payload)
+        self.ser.flush()
+
+        if not self.expect_reply:
+            return None
+        reply = self.ser.read(1)
+        return reply[0] if reply else None
+
+    def run(self):
+        self.stats.started = time.perf_counter()
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                self.jobs.task_done()
+                break
+
+            payload, future = job
+            if not future.set_running_or_notify_cancel():
+                self.jobs.task_done()
+                continue
+
+            t0 = time.perf_counter()
+            try:
+                digit = self.send_frame(payload)
+                self.stats.frames += 1
+                if digit is not None:
+                    self.stats.replies += 1
+                future.set_result((self.port, digit))
+            except Exception as e:
+                self.stats.errors += 1
+                future.set_exception(e)
+            finally:
+                self.stats.busy_time += time.perf_counter() - t0
+                self.jobs.task_done()
+
+            if self.frame_gap > 0:
+                time.sleep(self.frame_gap)
+
+        self.stats.stopped = time.perf_counter()
+        if self.ser and self.ser.is_open:
+            self.ser.close()
+
+
+class BoardFarm:
+    """
+    Pool of boards behind one queue.
+
+        farm = BoardFarm(["/dev/ttyUSB0", "/dev/ttyUSB1"])
+        farm.start()
+        futures = [farm.submit(img) for img in frames]
+        digits = [f.result()[1] for f in futures]
+        farm.stop()
+    """
+
+    def __init__(self, ports, baud=115200, timeout=1.0,
+                 frame_gap=DEFAULT_FRAME_GAP, expect_reply=True):
+        if not ports:
+            raise ValueError("BoardFarm needs at least one port")
+        self.jobs = queue.Queue()
+        self.workers = [
+            BoardWorker(p, self.jobs, baud, timeout, frame_gap, expect_reply)
+            for p in ports
+        ]
+        self.started = False
+
+    def start(self):
+        # Open every port before starting any worker so a bad port fails
+        # the whole farm up front instead of silently shrinking it.
+        for w in self.workers:
+            w.open()
+        for w in self.workers:
+            w.start()
+        self.started = True
+
+    def submit(self, frame):
+        """Queue one frame; the Future resolves to (port, digit or None)."""
+        if not self.started:
+            raise RuntimeError("BoardFarm.start() has not been called")
+        future = Future()
+        self.jobs.put((frame_to_payload(frame), future))
+        return future
+
+    def classify_all(self, frames):
+        """Send a stack of frames and wait; returns [(port, digit), ...] in order."""
+        futures = [self.submit(f) for f in frames]
+        return [f.result() for f in futures]
+
+    def stop(self):
+        """Drain the queue, then stop and close every board."""
+        for _ in self.workers:
+            self.jobs.put(None)
+        for w in self.workers:
+            w.join()
+        self.started = False
+
+    def stats(self):
+        return [w.stats.as_dict() for w in self.workers]
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream frames through several FPGA boards.")
+    parser.add_argument("--ports", nargs="+", required=True, help="serial ports or pyserial URLs")
+    parser.add_argument("--npy", required=True, help="(N,28,28) uint8 frame stack")
+    parser.add_argument("--baud", type=int, default=115200)
+    parser.add_argument("--gap", type=float, default=DEFAULT_FRAME_GAP,
+                        help="seconds between frames on one board")
+    parser.add_argument("--no-reply", action="store_true",
+                        help="boards do not answer; just push frames")
+    args = parser.parse_args()
+
+    frames = np.load(args.npy)
+    t0 = time.perf_counter()
+    with BoardFarm(args.ports, args.baud, frame_gap=args.gap,
+                   expect_reply=not args.no_reply) as farm:
+        results = farm.classify_all(frames)
+    elapsed = time.perf_counter() - t0
+
+    print(f"{len(results)} frames in {elapsed:.2f} s ({len(results) / elapsed:.1f} frames/s)")
+    for s in farm.stats():
+        print(s)
+
+
+if __name__ == "__main__":
+    main()
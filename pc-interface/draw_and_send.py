@@ -4,19 +4,31 @@
 Drawing GUI + Serial Sender for FPGA Digit Classification
 Creates a 28x28 canvas for drawing digits and sends them via serial to FPGA
 """
+import queue
 import time
 import tkinter as tk
+import zlib
 from tkinter import messagebox, ttk
 import numpy as np
 import serial
 import serial.tools.list_ports
-from PIL import Image
 
+import frame_codec
+from frame_protocol import PipelinedLink
+from latency_trace import LatencyTrace, print_report
+from link_calibration import get_profile
+from serial_worker import LEGACY_FRAME_GAP, SerialWorker
+from stroke_raster import StrokeRasterizer
 
 
 
 
 
+
+# How often the Tk thread checks for serial worker results (ms)
+POLL_MS = 20
+
+
 class DrawingApp:
 
     def __init__(self, root):
@@ -37,21 +49,69 @@ class DrawingApp:
        
         # Drawing state
         self.is_drawing = False
+        self.rasterizer = StrokeRasterizer(self.grid_size, self.cell_size)
                 # Serial connection
         self.ser = None
         self.serial_port = None
 
+        # Framed-protocol link (None = legacy 0xAA frames, no reply)
+        self.link = None
+
+        # Background thread doing all serial I/O while connected
+        self.worker = None
+
+        # Per-frame send path timings, kept across reconnects
+        self.trace = LatencyTrace()
+
+        # Live mode: checksum of the last frame sent and when it went out
+        self.last_sent_hash = None
+        self.sent_at = None
+        self.live_job = None
+
         # Sending state lock to avoid overlapping frames
         self.sending = False
 
        
         self.setup_ui()
 
+        # Pick up serial worker results on the Tk thread
+        self.root.after(POLL_MS, self.poll_results)
+
     def _unlock_send(self):
         """Allow the next classify after a safe delay."""
         self.sending = False
         print("Ready for next classify.")
 
+    def poll_results(self):
+        """Apply results posted by the serial worker, then poll again"""
+        while self.worker is not None:
+            try:
+                result = self.worker.results.get_nowait()
+            except queue.Empty:
+                break
+
+            latency_ms = (time.perf_counter() - self.sent_at) * 1000.0 if self.sent_at else 0.0
+            prefix = "Live: " if self.live_var.get() else ""
+
+            if result.status == "sent":
+                print("Frame sent: 1 header + 784 pixels")
+                self.result_label.config(
+                    text=f"{prefix}Sent to FPGA ({latency_ms:.0f} ms)", fg='#27ae60'
+                )
+            elif result.status == "reply":
+                reply = result.reply
+                # Legacy: the board echoes just the digit byte
+                digit = reply if isinstance(reply, int) else reply.digit
+                self.result_label.config(
+                    text=f"{prefix}Predicted: {digit} ({latency_ms:.0f} ms)", fg='#27ae60'
+                )
+            elif result.status == "error":
+                self.result_label.config(text=result.error, fg='#e74c3c')
+            elif result.status == "ready":
+                self._unlock_send()
+
+        self.root.after(POLL_MS, self.poll_results)
+
     def setup_ui(self):
         """Set up the user interface"""
         # Configure root window
@@ -85,6 +145,9 @@ class DrawingApp:
             highlightthickness=0
         )
         self.canvas.pack()
+
+        # One rectangle per cell, created once; drawing only recolors them
+        self.create_cell_grid()
        
         # Mouse event bindings
         self.canvas.bind('<Button-1>', self.start_drawing)
@@ -143,6 +206,84 @@ class DrawingApp:
             highlightthickness=0
         )
         classify_btn.grid(row=0, column=1, padx=10)
+
+        # MNIST-style crop / resize / centering before sending
+        self.preprocess_var = tk.BooleanVar(value=True)
+        preprocess_check = tk.Checkbutton(
+            control_frame,
+            text="MNIST preprocess",
+            variable=self.preprocess_var,
+            bg='#1e1e1e',
+            fg='#ffffff',
+            selectcolor='#2d2d2d',
+            activebackground='#1e1e1e',
+            activeforeground='#ffffff',
+            font=('Helvetica', 10),
+            highlightthickness=0
+        )
+        preprocess_check.grid(row=0, column=2, padx=10)
+
+        # Opt-in PNG dump + image viewer of every sent frame (off the Tk thread)
+        self.save_image_var = tk.BooleanVar(value=False)
+        save_image_check = tk.Checkbutton(
+            control_frame,
+            text="Save + show sent image",
+            variable=self.save_image_var,
+            bg='#1e1e1e',
+            fg='#ffffff',
+            selectcolor='#2d2d2d',
+            activebackground='#1e1e1e',
+            activeforeground='#ffffff',
+            font=('Helvetica', 10),
+            highlightthickness=0
+        )
+        save_image_check.grid(row=1, column=2, padx=10, pady=(5, 0))
+
+        # Live mode: stream the canvas while drawing, at most live_rate_var Hz
+        self.live_var = tk.BooleanVar(value=False)
+        live_check = tk.Checkbutton(
+            control_frame,
+            text="Live classify",
+            variable=self.live_var,
+            command=self.toggle_live,
+            bg='#1e1e1e',
+            fg='#ffffff',
+            selectcolor='#2d2d2d',
+            activebackground='#1e1e1e',
+            activeforeground='#ffffff',
+            font=('Helvetica', 10),
+            highlightthickness=0
+        )
+        live_check.grid(row=1, column=0, padx=10, pady=(5, 0))
+
+        self.live_rate_var = tk.StringVar(value="10")
+        live_rate = tk.Spinbox(
+            control_frame,
+            from_=1,
+            to=50,
+            width=5,
+            textvariable=self.live_rate_var,
+            font=('Helvetica', 10)
+        )
+        live_rate.grid(row=1, column=1, padx=10, pady=(5, 0))
+
+        # Dump the send path timings (histograms + suggested lockout)
+        timings_btn = tk.Button(
+            control_frame,
+            text="Export timings",
+            command=self.export_timings,
+            width=18,
+            bg='#3498db',
+            fg='#ffffff',
+            font=('Helvetica', 10, 'bold'),
+            relief=tk.SOLID,
+            bd=1,
+            cursor='hand2',
+            activebackground='#2980b9',
+            activeforeground='#ffffff',
+            highlightthickness=0
+        )
+        timings_btn.grid(row=2, column=1, padx=10, pady=(10, 0))
        
         # Serial setup frame
         serial_frame = tk.LabelFrame(
@@ -211,7 +352,7 @@ class DrawingApp:
             serial_frame,
             textvariable=self.baud_var,
             width=25,
-            values=["9600", "115200", "230400", "460800"],
+            values=["9600", "115200", "230400", "460800", "921600"],
             state='readonly',
             font=('Helvetica', 10)
         )
@@ -234,6 +375,50 @@ class DrawingApp:
             highlightthickness=0
         )
         self.connect_btn.grid(row=1, column=2, padx=5, pady=(10, 0))
+
+        # Protocol selection
+        protocol_label = tk.Label(
+            serial_frame,
+            text="Protocol:",
+            bg='#2d2d2d',
+            fg='#ffffff',
+            font=('Helvetica', 10)
+        )
+        protocol_label.grid(row=2, column=0, sticky='w', pady=(10, 0), padx=(0, 10))
+
+        self.protocol_var = tk.StringVar(value="Legacy (0xAA)")
+        protocol_combo = ttk.Combobox(
+            serial_frame,
+            textvariable=self.protocol_var,
+            width=25,
+            values=["Legacy (0xAA)", "Framed v1"],
+            state='readonly',
+            font=('Helvetica', 10)
+        )
+        protocol_combo.grid(row=2, column=1, padx=5, pady=(10, 0))
+
+        # Pixel encoding for framed requests
+        encoding_label = tk.Label(
+            serial_frame,
+            text="Encoding:",
+            bg='#2d2d2d',
+            fg='#ffffff',
+            font=('Helvetica', 10)
+        )
+        encoding_label.grid(row=3, column=0, sticky='w', pady=(10, 0), padx=(0, 10))
+
+        # Lossless auto by default; "auto (4-bit)" trades pixel precision
+        # for a smaller payload
+        self.encoding_var = tk.StringVar(value=frame_codec.AUTO)
+        encoding_combo = ttk.Combobox(
+            serial_frame,
+            textvariable=self.encoding_var,
+            width=25,
+            values=list(frame_codec.ENCODING_CHOICES),
+            state='readonly',
+            font=('Helvetica', 10)
+        )
+        encoding_combo.grid(row=3, column=1, padx=5, pady=(10, 0))
        
         # Status label
         self.status_label = tk.Label(
@@ -263,11 +448,14 @@ class DrawingApp:
     def toggle_connection(self):
         """Connect or disconnect from serial port"""
         if self.ser and self.ser.is_open:
-            # Disconnect
-            self.ser.close()
+            # Disconnect: the worker closes the port after its frame in
+            # progress; wait for that without blocking the event loop
+            worker = self.stop_worker()
             self.ser = None
-            self.connect_btn.config(text="Connect", bg='#16a085')
-            self.status_label.config(text="Status: Not connected", fg='#e74c3c')
+            self.link = None
+            self.connect_btn.config(text="Disconnecting...", state=tk.DISABLED)
+            self.status_label.config(text="Status: Disconnecting...", fg='#4dabf7')
+            self.wait_for_worker(worker)
         else:
             # Connect
             port = self.port_var.get()
@@ -276,79 +464,124 @@ class DrawingApp:
                 return
            
             try:
+                # Use the rate and lockout from link_calibration.py if this
+                # port has been calibrated
+                profile = get_profile(port)
+                if profile:
+                    self.baud_var.set(str(profile["baud"]))
                 baud = int(self.baud_var.get())
-                self.ser = serial.Serial(port, baud, timeout=1)
+                # Only a legacy calibration measures the whole frame exchange
+                calibrated_gap = (profile.get("frame_gap")
+                                  if profile and profile.get("mode") == "legacy" else None)
+                frame_gap = LEGACY_FRAME_GAP if calibrated_gap is None else calibrated_gap
+
+                framed = self.protocol_var.get() == "Framed v1"
+                # The framed link polls with short reads and keeps its own deadlines
+                self.ser = serial.Serial(port, baud, timeout=0.05 if framed else 1)
+                self.link = PipelinedLink(self.ser) if framed else None
+                self.worker = SerialWorker(self.ser, self.link, frame_gap, trace=self.trace)
+                self.worker.start()
                 self.connect_btn.config(text="Disconnect", bg='#e74c3c')
+                calibrated = ""
+                if profile:
+                    gap_note = "calibrated" if calibrated_gap is not None else "default"
+                    calibrated = (f", {profile.get('mode', '?')} profile, "
+                                  f"{gap_note} gap {frame_gap * 1000.0:.0f} ms")
                 self.status_label.config(
-                    text=f"Status: Connected to {port} at {baud} baud",
+                    text=f"Status: Connected to {port} at {baud} baud{calibrated}",
                     fg='#27ae60'
                 )
             except Exception as e:
                 messagebox.showerror("Connection Error", f"Failed to open port:\n{str(e)}")
+                # The port may have opened before the link or worker failed
+                if self.ser is not None and self.ser.is_open:
+                    self.ser.close()
                 self.ser = None
+                self.link = None
+                self.worker = None
+
+    def stop_worker(self):
+        """
+        Ask the serial worker to stop after any frame in progress and close
+        the port. Returns the worker (or None) without waiting for it.
+        """
+        worker = self.worker
+        if worker is not None:
+            worker.stop()
+            self.worker = None
+        self.sending = False
+        return worker
+
+    def wait_for_worker(self, worker):
+        """Re-enable Connect once the stopped worker has released the port"""
+        if worker is not None and worker.is_alive():
+            self.root.after(POLL_MS, self.wait_for_worker, worker)
+            return
+        self.connect_btn.config(text="Connect", bg='#16a085', state=tk.NORMAL)
+        self.status_label.config(text="Status: Not connected", fg='#e74c3c')
    
     def start_drawing(self, event):
         """Start drawing when mouse button is pressed"""
         self.is_drawing = True
-        self.draw(event)
+        self.rasterizer.begin(self.img, event.x, event.y)
+        self.refresh_canvas()
    
     def stop_drawing(self, event):
         """Stop drawing when mouse button is released"""
         self.is_drawing = False
+        self.rasterizer.end()
    
     def draw(self, event):
         """Draw on the canvas when mouse is dragged"""
         if not self.is_drawing:
             return
-       
-        # Convert screen coordinates to grid indices
-        col = event.x // self.cell_size
-        row = event.y // self.cell_size
-       
-        # Clamp to valid range
-        col = max(0, min(col, self.grid_size - 1))
-        row = max(0, min(row, self.grid_size - 1))
-       
-        # Draw with thicker stroke (3x3 neighborhood)
-        for dr in [-1, 0, 1]:
-            for dc in [-1, 0, 1]:
-                r = row + dr
-                c = col + dc
-               
-                # Check bounds
-                if 0 <= r < self.grid_size and 0 <= c < self.grid_size:
-                    # Set pixel to white (255)
-                    self.img[r, c] = 255
-                   
-                    # Update canvas
-                    self.draw_cell(r, c)
-   
+
+        # Anti-aliased segment from the previous event position to this one
+        self.rasterizer.extend(self.img, event.x, event.y)
+
+        # Update canvas
+        self.refresh_canvas()
+
+    def create_cell_grid(self):
+        """Preallocate the 28x28 grid of cell rectangles (all black)"""
+        # Hex color for every grayscale value
+        self.palette = [f'#{v:02x}{v:02x}{v:02x}' for v in range(256)]
+
+        self.cell_items = np.zeros((self.grid_size, self.grid_size), dtype=np.int64)
+        for row in range(self.grid_size):
+            for col in range(self.grid_size):
+                x1 = col * self.cell_size
+                y1 = row * self.cell_size
+                self.cell_items[row, col] = self.canvas.create_rectangle(
+                    x1, y1, x1 + self.cell_size, y1 + self.cell_size,
+                    fill=self.palette[0], outline=''
+                )
+
+        # Values currently shown on the canvas
+        self.shown = np.zeros_like(self.img)
+
+    def refresh_canvas(self):
+        """Recolor only the cells whose value changed since the last refresh"""
+        rows, cols = np.nonzero(self.img != self.shown)
+        for r, c in zip(rows, cols):
+            self.draw_cell(r, c)
+        self.shown[rows, cols] = self.img[rows, cols]
+
     def draw_cell(self, row, col):
-        """Draw a single cell on the canvas"""
-        x1 = col * self.cell_size
-        y1 = row * self.cell_size
-        x2 = x1 + self.cell_size
-        y2 = y1 + self.cell_size
-       
-        # Get grayscale value
+        """Recolor a single cell on the canvas"""
         value = self.img[row, col]
-       
-        # Convert to hex color
-        color = f'#{value:02x}{value:02x}{value:02x}'
-       
-        # Draw rectangle
-        self.canvas.create_rectangle(x1, y1, x2, y2, fill=color, outline='')
+        self.canvas.itemconfig(int(self.cell_items[row, col]), fill=self.palette[value])
    
     def clear_canvas(self):
         """Clear the canvas and reset image data"""
         # Reset image array
         self.img[:, :] = 0
        
-        # Clear canvas
-        self.canvas.delete('all')
-        self.canvas.config(bg='black')
+        # Clear canvas (recolors the drawn cells back to black)
+        self.refresh_canvas()
        
-        # Reset result label
+        # Reset live-mode change tracking and result label
+        self.last_sent_hash = None
         self.result_label.config(
             text="Draw a digit and click Classify",
             fg='#4dabf7'
@@ -369,109 +602,70 @@ class DrawingApp:
             print("Already sending a frame. Ignoring extra Classify press.")
             return
 
-        self.sending = True
-        try:
-            # Flatten image array and convert to bytes
-            payload = self.img.flatten().astype('uint8').tobytes()
-
-            # Basic sanity check
-            if len(payload) != 28 * 28:
-                messagebox.showerror("Error", f"Payload length is {len(payload)}, expected 784.")
-                return
-
-            # DEBUG: print first 20 values to ensure the payload is correct
-            print("Payload (first 20 bytes):", list(payload[:20]))
-            print(f"Payload size: {len(payload)}")
-
-            # Clear any stale serial data before sending a new frame
-            self.ser.reset_input_buffer()
-            self.ser.reset_output_buffer()
-            self.ser.flush()
-
-            # Send frame start byte
-            print("Sending frame header 0xAA...")
-            self.ser.write(b'\xAA')
-
-            # Small pause to let the header leave the USB buffer
-            time.sleep(0.005)
-
-            # Send the 784 pixel values
-            print("Sending 784 pixel bytes...")
-            self.ser.write(payload)
-            self.ser.flush()
-
-            print("Frame sent: 1 header + 784 pixels")
-
-            # Save and show the image that was just sent
-            self.create_image_from_payload(payload)
-
-            self.result_label.config(text="Sent to FPGA", fg='#27ae60')
-
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
-
-        finally:
-            # Give the Arduino time to shift all bits to the FPGA
-            # 6272 bit clocks at Arduino digitalWrite speed is well under 150 ms
-            # Use Tkinter after() so the GUI does not freeze
-            self.root.after(200, self._unlock_send)
-
-
-
-     
-    def create_image_from_payload(self, payload):
-        """Creates an image from the pixel data being sent to the Arduino"""
-        # Convert the payload (byte array) into a 28x28 numpy array
-        img_array = np.frombuffer(payload, dtype=np.uint8).reshape((28, 28))
-
-
-        # Create an image using Pillow from the numpy array
-        img = Image.fromarray(img_array)
-
-
-        # Ensure the image is in grayscale mode
-        img = img.convert("L")
-
-
-        # Save the image to a file
-        img.save("digit_image.png")
-
-
-        # Optionally, show the image using the default image viewer
-        img.show()
-
-
-        print("Image saved as 'digit_image.png'")
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+        self.submit_frame()
 
+    def submit_frame(self):
+        """Queue the current canvas on the serial worker."""
+        # Hand a copy of the canvas to the serial worker, which preprocesses,
+        # encodes and sends it, and return to the event loop; poll_results()
+        # shows the outcome and re-enables sending
+        self.sending = True
+        self.sent_at = time.perf_counter()
+        self.last_sent_hash = zlib.crc32(self.img.tobytes())
+        self.worker.submit(self.img, self.preprocess_var.get(), self.encoding_var.get(),
+                           save_image=self.save_image_var.get())
+        if not self.live_var.get():
+            self.result_label.config(text="Sending...", fg='#4dabf7')
+
+    def toggle_live(self):
+        """Start the live-mode loop when the checkbox is ticked"""
+        if self.live_job is not None:
+            self.root.after_cancel(self.live_job)
+            self.live_job = None
+        if self.live_var.get():
+            self.last_sent_hash = None
+            self.live_tick()
+
+    def live_tick(self):
+        """
+        Send the canvas if it changed since the last send and the worker is
+        idle. Strokes made while a frame is in flight are coalesced: only
+        the newest canvas goes out on the next tick.
+        """
+        self.live_job = None
+        if not self.live_var.get():
+            return
 
+        connected = self.worker is not None and self.ser and self.ser.is_open
+        if connected and not self.sending and np.any(self.img):
+            if zlib.crc32(self.img.tobytes()) != self.last_sent_hash:
+                self.submit_frame()
 
+        try:
+            rate = max(1.0, float(self.live_rate_var.get()))
+        except ValueError:
+            rate = 10.0
+        self.live_job = self.root.after(int(1000 / rate), self.live_tick)
+
+    def export_timings(self, path="latency_trace.json"):
+        """Write the latency trace to JSON and print its histograms"""
+        if len(self.trace) == 0:
+            messagebox.showinfo("No Timings", "Send a few frames first")
+            return
+        report = self.trace.export_json(path)
+        print_report(report)
+        lockout = report["suggested_lockout_ms"]
+        lockout_text = "n/a" if lockout is None else f"{lockout:.1f} ms"
+        self.status_label.config(
+            text=f"Timings saved to {path} (suggested lockout {lockout_text})",
+            fg='#4dabf7'
+        )
 
     def on_closing(self):
         """Clean up when closing the application"""
-        if self.ser and self.ser.is_open:
-            self.ser.close()
+        # The daemon worker closes the port if it finishes before exit;
+        # otherwise the OS does
+        self.stop_worker()
         self.root.destroy()
 
 
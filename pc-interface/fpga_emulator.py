@@ -0,0 +1,312 @@
+"""
+Software stand-in for the Arduino + FPGA board behind a virtual serial port.
+
+Opens a pty pair and behaves like the real link on the slave side:
+  - legacy frames: waits for the 0xAA header, then takes exactly 784 pixel
+    bytes, the way arduino_mnist_capture.v resets on frame_start and writes
+    pixel_index 0..783 before raising frame_ready; replies with the digit
+    as one byte
+  - framed v1 requests (frame_protocol.py): checks the CRC, decodes the
+    payload format (frame_codec.py) and replies with a reply frame carrying
+    the same seq, the digit and the 10 scores
+  - classifies with the integer golden model (Model/golden_model.py)
+
+Link behaviour is configurable so the host stack can be load-tested:
+  - baud       : bytes are consumed no faster than 10 bits per byte
+  - shift-us   : Arduino bit-bang time per bit (784 * 8 bits per frame)
+  - infer-us   : time the CNN core takes once frame_ready rises
+  - error injection: bit flips and dropped bytes on the way in, dropped
+    replies on the way out
+  - clock-mhz  : append an FPGA cycle counter (infer-us at this clock)
+    to framed replies, as a bitstream with the counter would
+
+With all timing set to 0 the emulator runs as fast as the golden model
+classifies, batching every complete frame that arrives in one read.
+
+Usage:
+    python fpga_emulator.py --model ../Model/int_cnn.npz --baud 0
+    (then point DrawingApp / board_farm.py at the printed /dev/pts/N)
+"""
+import argparse
+import os
+import random
+import select
+import struct
+import sys
+import threading
+import time
+import tty
+
+import numpy as np
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Model")
+sys.path.insert(0, MODEL_DIR)
+from golden_model import IntCNN  # noqa: E402
+
+import frame_codec
+from frame_protocol import (LEGACY_HEADER, REQUEST_SOF, FMT_RAW, STATUS_BAD_FORMAT, PROTOCOL_VERSION,
+                            HEADER_LEN, CRC_LEN, MAX_PAYLOAD, encode_reply, try_decode)
+
+
+FRAME_PIXELS = 28 * 28
+BITS_PER_UART_BYTE = 10   # start + 8 data + stop
+
+
+class FrameParser:
+    """
+    Byte-stream reassembly. Idle until a legacy header or a framed SOF.
+    A legacy header is followed by 784 pixel bytes whatever their value,
+    as in arduino_mnist_capture; a framed request is taken whole once its
+    CRC checks out. While a framed packet with a plausible header is in
+    flight (including one that failed its CRC), legacy headers inside it
+    are ignored, so a corrupted packet cannot be mistaken for a 0xAA frame
+    and swallow the 784 bytes after it; only another SOF can resync there.
+    Outside framed packets both protocols are accepted, so a host can
+    switch between them on the same port.
+
+    feed() returns (seq, fmt, payload) tuples; seq is None for legacy frames.
+    """
+
+    def __init__(self):
+        self.buf = bytearray()
+        self.in_legacy = False
+        # Leading bytes of buf that belong to a rejected framed packet
+        self.framed_span = 0
+        self.discarded = 0
+        self.bad_frames = 0
+
+    def _next_start(self):
+        starts = [i for i in (self.buf.find(LEGACY_HEADER, self.framed_span), self.buf.find(REQUEST_SOF))
+                  if i >= 0]
+        return min(starts) if starts else -1
+
+    def _packet_len(self):
+        """Length the framed header at buf[0] declares, or 0 if it is implausible."""
+        ver, _, _, length = struct.unpack_from("<BBBH", self.buf, 1)
+        if ver != PROTOCOL_VERSION or length > MAX_PAYLOAD:
+            return 0
+        return HEADER_LEN + length + CRC_LEN
+
+    def _consume(self, n):
+        del self.buf[:n]
+        self.framed_span = max(0, self.framed_span - n)
+
+    def feed(self, data):
+        self.buf += data
+        frames = []
+        while True:
+            if self.in_legacy:
+                if len(self.buf) < FRAME_PIXELS:
+                    break
+                frames.append((None, FMT_RAW, bytes(self.buf[:FRAME_PIXELS])))
+                self._consume(FRAME_PIXELS)
+                self.in_legacy = False
+                continue
+
+            start = self._next_start()
+            if start < 0:
+                self.discarded += len(self.buf)
+                self._consume(len(self.buf))
+                break
+            self.discarded += start
+            self._consume(start)
+
+            if self.buf[0] == LEGACY_HEADER:
+                self._consume(1)
+                self.in_legacy = True
+                continue
+
+            frame, used = try_decode(self.buf, REQUEST_SOF)
+            if used == 0:
+                break
+            if frame is None:
+                self.bad_frames += 1
+                self.discarded += 1
+                self.framed_span = max(self.framed_span, self._packet_len())
+            else:
+                frames.append((frame.seq, frame.kind, frame.payload))
+            self._consume(used)
+        return frames
+
+
+class LinkModel:
+    """Timing and error injection for the emulated UART + Arduino path."""
+
+    def __init__(self, baud=115200, shift_us=0.0, infer_us=0.0,
+                 bit_error_rate=0.0, drop_rate=0.0, reply_drop_rate=0.0, seed=None):
+        self.baud = baud
+        self.shift_s = shift_us * 1e-6 * FRAME_PIXELS * 8
+        self.infer_s = infer_us * 1e-6
+        self.bit_error_rate = bit_error_rate
+        self.drop_rate = drop_rate
+        self.reply_drop_rate = reply_drop_rate
+        self.rng = random.Random(seed)
+        self.np_rng = np.random.default_rng(seed)
+        self.line_free_at = 0.0
+
+    def receive_delay(self, nbytes):
+        """Sleep so reception never outruns the configured baud rate."""
+        if self.baud <= 0:
+            return
+        now = time.perf_counter()
+        self.line_free_at = max(now, self.line_free_at) + nbytes * BITS_PER_UART_BYTE / self.baud
+        if self.line_free_at > now:
+            time.sleep(self.line_free_at - now)
+
+    def corrupt(self, data):
+        """Apply byte drops and bit flips to received data."""
+        if self.drop_rate <= 0 and self.bit_error_rate <= 0:
+            return data
+        arr = np.frombuffer(data, dtype=np.uint8).copy()
+        if self.drop_rate > 0:
+            arr = arr[self.np_rng.random(arr.size) >= self.drop_rate]
+        if self.bit_error_rate > 0 and arr.size:
+            flips = self.np_rng.random((arr.size, 8)) < self.bit_error_rate
+            arr ^= np.packbits(flips, axis=1, bitorder="little").reshape(-1)
+        return arr.tobytes()
+
+    def frame_latency(self, nframes):
+        """Arduino shift-out plus CNN time for frames handled back to back."""
+        return nframes * (self.shift_s + self.infer_s)
+
+    def drop_reply(self):
+        return self.reply_drop_rate > 0 and self.rng.random() < self.reply_drop_rate
+
+
+class FpgaEmulator:
+    """
+    Emulated board on a pty. Use open() to get the slave path, then either
+    serve_forever() in the foreground or start() a background thread.
+    """
+
+    def __init__(self, model, link=None, clock_mhz=0.0):
+        self.model = model
+        self.link = link or LinkModel()
+        self.cycles = int(round(self.link.infer_s * 1e6 * clock_mhz)) if clock_mhz > 0 else None
+        self.parser = FrameParser()
+        self.master_fd = None
+        self.slave_fd = None
+        self.port = None
+        self.frames = 0
+        self.replies = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def open(self):
+        self.master_fd, self.slave_fd = os.openpty()
+        tty.setraw(self.master_fd)
+        tty.setraw(self.slave_fd)
+        self.port = os.ttyname(self.slave_fd)
+        return self.port
+
+    def classify(self, pixels):
+        """Classify raw 784-byte frames in one batch; returns (scores, digits)."""
+        stack = np.frombuffer(b"".join(pixels), dtype=np.uint8).reshape(-1, 28, 28)
+        return self.model.forward(stack)
+
+    def handle(self, data):
+        """Process received bytes; returns the reply bytes to send back."""
+        self.link.receive_delay(len(data))
+        frames = self.parser.feed(self.link.corrupt(data))
+        if not frames:
+            return b""
+
+        decoded = {}
+        for i, (_, fmt, payload) in enumerate(frames):
+            try:
+                decoded[i] = frame_codec.decode(payload, fmt).tobytes()
+            except ValueError:
+                pass
+
+        good = list(decoded)
+        results = {}
+        if good:
+            scores, preds = self.classify([decoded[i] for i in good])
+            results = {i: (int(p), s) for i, p, s in zip(good, preds, scores)}
+            latency = self.link.frame_latency(len(good))
+            if latency > 0:
+                time.sleep(latency)
+        self.frames += len(frames)
+
+        reply = bytearray()
+        for i, (seq, _, _) in enumerate(frames):
+            if self.link.drop_reply():
+                continue
+            if i not in results:
+                if seq is not None:
+                    reply += encode_reply(seq, 0, None, status=STATUS_BAD_FORMAT)
+                continue
+            digit, scores = results[i]
+            if seq is None:
+                reply += bytes([digit])
+            else:
+                reply += encode_reply(seq, digit, scores, cycles=self.cycles)
+            self.replies += 1
+        return bytes(reply)
+
+    def serve_forever(self):
+        if self.master_fd is None:
+            self.open()
+        while not self._stop.is_set():
+            ready, _, _ = select.select([self.master_fd], [], [], 0.1)
+            if not ready:
+                continue
+            try:
+                data = os.read(self.master_fd, 65536)
+            except OSError:
+                break
+            reply = self.handle(data)
+            if reply:
+                os.write(self.master_fd, reply)
+
+    def start(self):
+        if self.master_fd is None:
+            self.open()
+        self._thread = threading.Thread(target=self.serve_forever, name="fpga-emulator", daemon=True)
+        self._thread.start()
+        return self.port
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        for fd in (self.master_fd, self.slave_fd):
+            if fd is not None:
+                os.close(fd)
+        self.master_fd = self.slave_fd = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Emulate the Arduino + FPGA classifier on a pty.")
+    parser.add_argument("--model", default=os.path.join(MODEL_DIR, "int_cnn.npz"),
+                        help="IntCNN .npz written by mnist_model.py")
+    parser.add_argument("--baud", type=int, default=115200, help="0 = unlimited")
+    parser.add_argument("--shift-us", type=float, default=0.0,
+                        help="Arduino bit-bang time per bit, microseconds")
+    parser.add_argument("--infer-us", type=float, default=0.0,
+                        help="CNN core time per frame, microseconds")
+    parser.add_argument("--bit-error-rate", type=float, default=0.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="per received byte")
+    parser.add_argument("--reply-drop-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--clock-mhz", type=float, default=0.0,
+                        help="report a cycle counter in framed replies (0 = off)")
+    args = parser.parse_args()
+
+    link = LinkModel(args.baud, args.shift_us, args.infer_us, args.bit_error_rate,
+                     args.drop_rate, args.reply_drop_rate, args.seed)
+    emu = FpgaEmulator(IntCNN.load(args.model), link, args.clock_mhz)
+    print(f"Emulated board on {emu.open()} (Ctrl+C to stop)")
+    try:
+        emu.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"Frames: {emu.frames}  replies: {emu.replies}  "
+              f"bad frames: {emu.parser.bad_frames}  "
+              f"bytes discarded outside frames: {emu.parser.discarded}")
+        emu.stop()
+
+
+if __name__ == "__main__":
+    main()
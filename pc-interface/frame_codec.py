@@ -0,0 +1,218 @@
+"""
+Compact pixel encodings for framed requests (the `fmt` byte in
+frame_protocol.py). All encoders take a 28x28 / 784 uint8 frame, or its
+784 bytes, and are vectorized with NumPy.
+
+    FMT_RAW    784 bytes, one per pixel                        lossless
+    FMT_RLE    (run length 1..255, value) byte pairs           lossless
+    FMT_BIN1   1 bit per pixel (>= 128 -> 255), 98 bytes       lossless on 0/255 canvases
+    FMT_GRAY4  4 bits per pixel (v >> 4, decoded v * 17), 392  lossless on multiples of 17
+    FMT_RLE4   (v >> 4) << 4 | (run length - 1), runs 1..16     lossless on multiples of 17
+
+encode_auto() picks the smallest encoding that round-trips exactly, so
+the board sees the same pixels DrawingApp drew. Byte RLE rarely gets far
+there: the brush anti-aliases every stroke edge and preprocess()
+resamples the digit, so runs of equal bytes are short. On the reference
+strokes in test_frame_codec.py lossless auto reaches only 1.47-3.3x,
+short of 5x.
+
+encode_auto(lossy=True) first quantizes the frame to 4 bits (v >> 4,
+back to v * 17: the GRAY4 grid, at most 15 levels off per pixel) and
+then searches the same way; FMT_RLE4 wins at 3.5-6.3x on the same
+strokes. BIN1 is still only picked for frames that are already 0/255.
+DrawingApp defaults to lossless auto; lossy auto is an explicit choice.
+
+Round-trip tests: `python -m pytest test_frame_codec.py`.
+"""
+import numpy as np
+
+from frame_protocol import FMT_RAW
+
+
+FMT_RLE = 0x01
+FMT_BIN1 = 0x02
+FMT_GRAY4 = 0x03
+FMT_RLE4 = 0x04
+
+FRAME_PIXELS = 28 * 28
+MAX_RUN = 255
+MAX_RUN4 = 16
+
+FORMAT_NAMES = {
+    FMT_RAW: "raw",
+    FMT_RLE: "rle",
+    FMT_BIN1: "1-bit",
+    FMT_GRAY4: "4-bit",
+    FMT_RLE4: "4-bit rle",
+}
+
+
+def _flat(frame):
+    if isinstance(frame, (bytes, bytearray)):
+        frame = np.frombuffer(frame, dtype=np.uint8)
+    x = np.asarray(frame, dtype=np.uint8).reshape(-1)
+    if x.size != FRAME_PIXELS:
+        raise ValueError(f"frame has {x.size} pixels, expected {FRAME_PIXELS}")
+    return x
+
+
+###########################################
+# Run-length
+###########################################
+
+def encode_rle(frame):
+    x = _flat(frame)
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(x)) + 1))
+    lengths = np.diff(np.append(starts, x.size))
+    values = x[starts]
+
+    # Split runs longer than 255 into full chunks plus a remainder.
+    chunks = (lengths + MAX_RUN - 1) // MAX_RUN
+    run_values = np.repeat(values, chunks)
+    run_lengths = np.full(run_values.size, MAX_RUN, dtype=np.int64)
+    last = np.cumsum(chunks) - 1
+    run_lengths[last] = lengths - (chunks - 1) * MAX_RUN
+
+    out = np.empty(2 * run_values.size, dtype=np.uint8)
+    out[0::2] = run_lengths
+    out[1::2] = run_values
+    return out.tobytes()
+
+
+def decode_rle(payload):
+    pairs = np.frombuffer(payload, dtype=np.uint8)
+    if pairs.size % 2:
+        raise ValueError("RLE payload must be (length, value) pairs")
+    lengths = pairs[0::2].astype(np.int64)
+    if np.any(lengths == 0):
+        raise ValueError("RLE run length 0")
+    return np.repeat(pairs[1::2], lengths)
+
+
+###########################################
+# 1-bit binarized
+###########################################
+
+def encode_bin1(frame, threshold=128):
+    return np.packbits(_flat(frame) >= threshold).tobytes()
+
+
+def decode_bin1(payload):
+    bits = np.unpackbits(np.frombuffer(payload, dtype=np.uint8))
+    return (bits * 255).astype(np.uint8)
+
+
+###########################################
+# 4-bit grayscale
+###########################################
+
+def encode_gray4(frame):
+    nib = _flat(frame) >> 4
+    return ((nib[0::2] << 4) | nib[1::2]).astype(np.uint8).tobytes()
+
+
+def decode_gray4(payload):
+    packed = np.frombuffer(payload, dtype=np.uint8)
+    nib = np.empty(packed.size * 2, dtype=np.uint8)
+    nib[0::2] = packed >> 4
+    nib[1::2] = packed & 0x0F
+    return nib * np.uint8(17)
+
+
+def quantize4(frame):
+    """The frame on the 4-bit grid GRAY4 and RLE4 carry exactly (v >> 4) * 17."""
+    return (_flat(frame) >> 4) * np.uint8(17)
+
+
+###########################################
+# 4-bit run-length
+###########################################
+
+def encode_rle4(frame):
+    nib = _flat(frame) >> 4
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(nib)) + 1))
+    lengths = np.diff(np.append(starts, nib.size))
+
+    # Split runs longer than 16 into full chunks plus a remainder.
+    chunks = (lengths + MAX_RUN4 - 1) // MAX_RUN4
+    run_values = np.repeat(nib[starts], chunks)
+    run_lengths = np.full(run_values.size, MAX_RUN4, dtype=np.int64)
+    last = np.cumsum(chunks) - 1
+    run_lengths[last] = lengths - (chunks - 1) * MAX_RUN4
+    return ((run_values << 4) | (run_lengths - 1)).astype(np.uint8).tobytes()
+
+
+def decode_rle4(payload):
+    runs = np.frombuffer(payload, dtype=np.uint8)
+    return np.repeat((runs >> 4) * np.uint8(17), (runs & 0x0F).astype(np.int64) + 1)
+
+
+###########################################
+# Dispatch
+###########################################
+
+ENCODERS = {
+    FMT_RAW: lambda frame: _flat(frame).tobytes(),
+    FMT_RLE: encode_rle,
+    FMT_BIN1: encode_bin1,
+    FMT_GRAY4: encode_gray4,
+    FMT_RLE4: encode_rle4,
+}
+
+DECODERS = {
+    FMT_RAW: lambda payload: np.frombuffer(payload, dtype=np.uint8),
+    FMT_RLE: decode_rle,
+    FMT_BIN1: decode_bin1,
+    FMT_GRAY4: decode_gray4,
+    FMT_RLE4: decode_rle4,
+}
+
+
+def encode(frame, fmt):
+    if fmt not in ENCODERS:
+        raise ValueError(f"unknown frame format 0x{fmt:02X}")
+    return ENCODERS[fmt](frame)
+
+
+def decode(payload, fmt):
+    """Payload -> 784 uint8 pixels. Raises ValueError on a malformed payload."""
+    if fmt not in DECODERS:
+        raise ValueError(f"unknown frame format 0x{fmt:02X}")
+    pixels = DECODERS[fmt](payload)
+    if pixels.size != FRAME_PIXELS:
+        raise ValueError(f"{FORMAT_NAMES[fmt]} payload decodes to {pixels.size} pixels")
+    return pixels
+
+
+def encode_auto(frame, formats=(FMT_RLE, FMT_BIN1, FMT_GRAY4, FMT_RLE4), lossy=False):
+    """
+    Smallest exactly-round-tripping encoding, of the frame itself or, with
+    lossy=True, of quantize4(frame). Returns (fmt, payload).
+    """
+    x = quantize4(frame) if lossy else _flat(frame)
+    best_fmt, best = FMT_RAW, x.tobytes()
+    for fmt in formats:
+        if fmt == FMT_BIN1 and not np.all((x == 0) | (x == 255)):
+            continue
+        if fmt in (FMT_GRAY4, FMT_RLE4) and np.any(x % 17):
+            continue
+        payload = encode(x, fmt)
+        if len(payload) < len(best):
+            best_fmt, best = fmt, payload
+    return best_fmt, best
+
+
+# Encoding choices offered by DrawingApp: the two auto modes, then every format
+AUTO = "auto"
+AUTO_LOSSY = "auto (4-bit)"
+ENCODING_CHOICES = (AUTO, AUTO_LOSSY) + tuple(FORMAT_NAMES.values())
+
+
+def encode_choice(frame, choice):
+    """Encode with one of ENCODING_CHOICES. Returns (fmt, payload)."""
+    if choice in (AUTO, AUTO_LOSSY):
+        return encode_auto(frame, lossy=choice == AUTO_LOSSY)
+    for fmt, name in FORMAT_NAMES.items():
+        if name == choice:
+            return fmt, encode(frame, fmt)
+    raise ValueError(f"unknown encoding {choice!r}")
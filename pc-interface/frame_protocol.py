@@ -0,0 +1,239 @@
+"""
+Framed, pipelined serial protocol for the FPGA digit classifier.
+
+Legacy (v0, what DrawingApp has always sent):
+    0xAA | 784 pixel bytes                              no reply
+
+Framed v1, host -> board (request):
+    0xA5 | ver | seq | fmt | len_lo len_hi | payload | crc_lo crc_hi
+Framed v1, board -> host (reply):
+    0x5A | ver | seq | status | len_lo len_hi | payload | crc_lo crc_hi
+
+    ver     protocol version (PROTOCOL_VERSION)
+    seq     8-bit sequence id, echoed in the reply
+    fmt     payload format of the request (FMT_RAW = 784 raw pixels;
+            compressed formats are in frame_codec.py)
+    status  STATUS_OK, or why the board rejected the frame
+    len     payload length, little-endian
+    crc     CRC-16/CCITT-FALSE over ver..payload, little-endian
+
+Reply payload (STATUS_OK): digit (1 byte) + 10 scores (int32 LE),
+optionally followed by the FPGA cycle count for the frame (uint32 LE).
+The host tells the two apart by payload length, so bitstreams without
+the counter stay compatible.
+
+The SOF bytes differ from the legacy 0xAA header, so a board can accept
+both. PipelinedLink keeps up to `window` requests outstanding and matches
+replies by seq instead of stop-and-wait.
+"""
+import binascii
+import struct
+import time
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+
+LEGACY_HEADER = 0xAA
+REQUEST_SOF = 0xA5
+REPLY_SOF = 0x5A
+PROTOCOL_VERSION = 1
+
+FMT_RAW = 0x00
+
+STATUS_OK = 0x00
+STATUS_BAD_CRC = 0x01
+STATUS_BAD_FORMAT = 0x02
+
+HEADER_LEN = 6    # sof, ver, seq, fmt/status, len_lo, len_hi
+CRC_LEN = 2
+MAX_PAYLOAD = 4096
+NUM_CLASSES = 10
+REPLY_FORMAT = f"<B{NUM_CLASSES}i"     # digit + int32 scores
+CYCLES_FORMAT = "<I"                   # optional trailing cycle counter
+REPLY_LEN = struct.calcsize(REPLY_FORMAT)
+
+Frame = namedtuple("Frame", "seq kind payload")        # kind = fmt or status
+# cycles is None unless the board appends its cycle counter
+Reply = namedtuple("Reply", "seq status digit scores cycles", defaults=(None,))
+# reply is None if every retry timed out; latency is seconds from the first
+# transmission to the reply (or to giving up)
+Completion = namedtuple("Completion", "tag reply latency")
+
+
+def crc16(data):
+    """CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF)."""
+    return binascii.crc_hqx(data, 0xFFFF)
+
+
+def _encode(sof, seq, kind, payload):
+    body = struct.pack("<BBBH", PROTOCOL_VERSION, seq & 0xFF, kind, len(payload)) + payload
+    return bytes([sof]) + body + struct.pack("<H", crc16(body))
+
+
+def encode_request(seq, payload, fmt=FMT_RAW):
+    return _encode(REQUEST_SOF, seq, fmt, payload)
+
+
+def encode_reply(seq, digit, scores, status=STATUS_OK, cycles=None):
+    payload = b""
+    if status == STATUS_OK:
+        payload = struct.pack(REPLY_FORMAT, int(digit), *(int(s) for s in scores))
+        if cycles is not None:
+            payload += struct.pack(CYCLES_FORMAT, int(cycles) & 0xFFFFFFFF)
+    return _encode(REPLY_SOF, seq, status, payload)
+
+
+def parse_reply(frame):
+    """Frame from a FrameDecoder(REPLY_SOF) -> Reply."""
+    if frame.kind != STATUS_OK:
+        return Reply(frame.seq, frame.kind, None, None)
+    fields = struct.unpack_from(REPLY_FORMAT, frame.payload)
+    cycles = None
+    if len(frame.payload) == REPLY_LEN + struct.calcsize(CYCLES_FORMAT):
+        (cycles,) = struct.unpack_from(CYCLES_FORMAT, frame.payload, REPLY_LEN)
+    return Reply(frame.seq, STATUS_OK, fields[0], np.array(fields[1:], dtype=np.int32), cycles)
+
+
+def try_decode(buf, sof):
+    """
+    Decode one framed packet at the start of `buf` (buf[0] must be sof).
+    Returns (Frame, bytes consumed), (None, 0) if more bytes are needed,
+    or (None, 1) if the packet is invalid and its SOF byte should be
+    skipped (the real frame may start inside it).
+    """
+    if len(buf) < HEADER_LEN:
+        return None, 0
+    ver, seq, kind, length = struct.unpack_from("<BBBH", buf, 1)
+    if ver != PROTOCOL_VERSION or length > MAX_PAYLOAD:
+        return None, 1
+
+    total = HEADER_LEN + length + CRC_LEN
+    if len(buf) < total:
+        return None, 0
+
+    body = bytes(buf[1:HEADER_LEN + length])
+    (crc,) = struct.unpack_from("<H", buf, HEADER_LEN + length)
+    if crc != crc16(body):
+        return None, 1
+    return Frame(seq, kind, body[HEADER_LEN - 1:]), total
+
+
+class FrameDecoder:
+    """
+    Stream decoder for framed v1 packets starting with `sof`.
+    Bytes before a SOF, and frames whose CRC or length is bad, are skipped;
+    the decoder resyncs on the next SOF byte.
+    """
+
+    def __init__(self, sof):
+        self.sof = sof
+        self.buf = bytearray()
+        self.bad_frames = 0
+        self.discarded = 0
+
+    def feed(self, data):
+        """Add received bytes; return the list of complete, valid Frames."""
+        self.buf += data
+        frames = []
+        while True:
+            start = self.buf.find(self.sof)
+            if start < 0:
+                self.discarded += len(self.buf)
+                self.buf.clear()
+                break
+            if start:
+                self.discarded += start
+                del self.buf[:start]
+
+            frame, used = try_decode(self.buf, self.sof)
+            if used == 0:
+                break
+            if frame is None:
+                self.bad_frames += 1
+                self.discarded += 1
+            else:
+                frames.append(frame)
+            del self.buf[:used]
+        return frames
+
+
+class PipelinedLink:
+    """
+    Host side of the framed protocol on an open serial port.
+
+    Keeps up to `window` requests in flight. A request with no reply after
+    `timeout` seconds is resent up to `retries` times, then reported with
+    a None reply. The port's own read timeout should be short (e.g. 0.05 s)
+    so the link can check its deadlines.
+    """
+
+    def __init__(self, ser, window=4, timeout=1.0, retries=2):
+        if not 1 <= window < 128:
+            raise ValueError("window must be in [1, 127] for 8-bit sequence ids")
+        self.ser = ser
+        self.window = window
+        self.timeout = timeout
+        self.retries = retries
+        self.decoder = FrameDecoder(REPLY_SOF)
+        self.next_seq = 0
+        self.pending = OrderedDict()   # seq -> [packet, sent_at, tries, tag, first_sent]
+        self.done = []                 # Completion
+        self.resent = 0
+
+    def send(self, payload, tag=None, fmt=FMT_RAW):
+        """Queue one request, blocking while the window is full. Returns seq."""
+        while len(self.pending) >= self.window:
+            self.poll()
+
+        seq = self.next_seq
+        self.next_seq = (self.next_seq + 1) & 0xFF
+        packet = encode_request(seq, payload, fmt)
+        self.ser.write(packet)
+        now = time.perf_counter()
+        self.pending[seq] = [packet, now, 1, tag, now]
+        return seq
+
+    def poll(self):
+        """Read whatever has arrived, match replies, handle timeouts."""
+        data = self.ser.read(self.ser.in_waiting or 1)
+        now = time.perf_counter()
+        for frame in self.decoder.feed(data):
+            entry = self.pending.pop(frame.seq, None)
+            if entry is not None:
+                self.done.append(Completion(entry[3], parse_reply(frame), now - entry[4]))
+
+        for seq, entry in list(self.pending.items()):
+            packet, sent_at, tries, tag, first_sent = entry
+            if now - sent_at < self.timeout:
+                continue
+            if tries > self.retries:
+                del self.pending[seq]
+                self.done.append(Completion(tag, None, now - first_sent))
+            else:
+                self.ser.write(packet)
+                entry[1] = now
+                entry[2] = tries + 1
+                self.resent += 1
+
+    def collect(self):
+        """Return and clear the Completions finished so far."""
+        done, self.done = self.done, []
+        return done
+
+    def drain(self):
+        """Wait for every outstanding request, then return collect()."""
+        while self.pending:
+            self.poll()
+        return self.collect()
+
+    def classify_all(self, payloads):
+        """Send every payload through the window; Replies in input order."""
+        results = [None] * len(payloads)
+        for i, payload in enumerate(payloads):
+            self.send(payload, tag=i)
+            for done in self.collect():
+                results[done.tag] = done.reply
+        for done in self.drain():
+            results[done.tag] = done.reply
+        return results
@@ -0,0 +1,204 @@
+"""
+Timing hooks for the send path, kept in an in-memory ring buffer.
+
+Every frame gets one record with a timestamp (time.perf_counter) per stage:
+
+    enqueue   DrawingApp handed the frame to the serial worker
+    header    the worker started writing (0xAA header / framed packet)
+    payload   the pixel bytes were written
+    flush     ser.flush() returned: everything left the host
+    reply     the board's answer arrived (missing if there was none)
+
+plus an optional FPGA cycle count carried in the framed reply. Intervals
+between stages are what matter:
+
+    queue     enqueue -> header   waiting for the worker
+    header    header  -> payload  header write (+ legacy 5 ms pause)
+    payload   payload -> flush    draining the OS / USB buffers
+    board     flush   -> reply    link + Arduino shift-out + CNN + reply
+    total     enqueue -> reply
+
+suggest_lockout() sizes the legacy inter-frame gap from the measured
+`board` interval instead of a guess. export_json() writes the raw
+records, per-interval percentiles and histograms.
+
+Run `python latency_trace.py trace.json` to print an exported trace.
+"""
+import json
+import sys
+import threading
+import time
+
+import numpy as np
+
+
+STAGES = ("enqueue", "header", "payload", "flush", "reply")
+INTERVALS = {
+    "queue": ("enqueue", "header"),
+    "header": ("header", "payload"),
+    "payload": ("payload", "flush"),
+    "board": ("flush", "reply"),
+    "total": ("enqueue", "reply"),
+}
+PERCENTILES = (50, 90, 95, 99)
+
+
+class LatencyTrace:
+    """
+    Fixed-size ring of per-frame stage timestamps. begin() and mark() may
+    be called from different threads (GUI and serial worker).
+    """
+
+    def __init__(self, capacity=1024):
+        self.capacity = capacity
+        self.times = np.full((capacity, len(STAGES)), np.nan)
+        self.cycles = np.full(capacity, -1, dtype=np.int64)
+        self.ids = np.full(capacity, -1, dtype=np.int64)
+        self.next_id = 0
+        self.lock = threading.Lock()
+
+    def begin(self, t=None):
+        """Start a record (stamps `enqueue`). Returns its id."""
+        with self.lock:
+            rid = self.next_id
+            self.next_id += 1
+            slot = rid % self.capacity
+            self.times[slot] = np.nan
+            self.cycles[slot] = -1
+            self.ids[slot] = rid
+            self.times[slot, 0] = time.perf_counter() if t is None else t
+        return rid
+
+    def mark(self, rid, stage, t=None):
+        """Stamp `stage` on record rid; ignored if rid was overwritten."""
+        t = time.perf_counter() if t is None else t
+        with self.lock:
+            slot = rid % self.capacity
+            if self.ids[slot] == rid:
+                self.times[slot, STAGES.index(stage)] = t
+
+    def stamp(self, rid, stage):
+        """Timestamp of `stage` on record rid, or None if unset / overwritten."""
+        with self.lock:
+            slot = rid % self.capacity
+            if self.ids[slot] != rid:
+                return None
+            t = self.times[slot, STAGES.index(stage)]
+        return None if np.isnan(t) else float(t)
+
+    def set_cycles(self, rid, cycles):
+        """FPGA cycle counter reported in the reply, if the bitstream sends one."""
+        if cycles is None:
+            return
+        with self.lock:
+            slot = rid % self.capacity
+            if self.ids[slot] == rid:
+                self.cycles[slot] = int(cycles)
+
+    def __len__(self):
+        return min(self.next_id, self.capacity)
+
+    def records(self):
+        """(times (n, stages), cycles (n,)) for the live records, oldest first."""
+        with self.lock:
+            order = np.argsort(self.ids)
+            order = order[self.ids[order] >= 0]
+            return self.times[order].copy(), self.cycles[order].copy()
+
+    def interval(self, name):
+        """Seconds for one INTERVALS entry over every record that has both stages."""
+        start, end = (STAGES.index(s) for s in INTERVALS[name])
+        times, _ = self.records()
+        delta = times[:, end] - times[:, start]
+        return delta[~np.isnan(delta)]
+
+    def summary(self):
+        """{interval: {count, mean_ms, pNN_ms...}} for intervals with data."""
+        out = {}
+        for name in INTERVALS:
+            ms = self.interval(name) * 1000.0
+            if ms.size == 0:
+                continue
+            stats = {"count": int(ms.size), "mean_ms": round(float(ms.mean()), 3)}
+            for q, v in zip(PERCENTILES, np.percentile(ms, PERCENTILES)):
+                stats[f"p{q}_ms"] = round(float(v), 3)
+            stats["max_ms"] = round(float(ms.max()), 3)
+            out[name] = stats
+        _, cycles = self.records()
+        cycles = cycles[cycles >= 0]
+        if cycles.size:
+            out["fpga_cycles"] = {
+                "count": int(cycles.size),
+                "min": int(cycles.min()),
+                "median": int(np.median(cycles)),
+                "max": int(cycles.max()),
+            }
+        return out
+
+    def histogram(self, name, bins=20):
+        """(counts, bin edges in ms) of one interval."""
+        ms = self.interval(name) * 1000.0
+        if ms.size == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        return np.histogram(ms, bins=bins)
+
+    def suggest_lockout(self, percentile=99, margin=1.25, min_samples=10):
+        """
+        Inter-frame gap (seconds) covering `percentile` of the measured
+        flush -> reply times, times a safety margin. None until at least
+        min_samples replies have been seen.
+        """
+        board = self.interval("board")
+        if board.size < min_samples:
+            return None
+        return float(np.percentile(board, percentile)) * margin
+
+    def export_json(self, path, bins=20):
+        """Summary, histograms and raw records (ms relative to enqueue)."""
+        times, cycles = self.records()
+        histograms = {}
+        for name in INTERVALS:
+            counts, edges = self.histogram(name, bins)
+            if counts.size:
+                histograms[name] = {"counts": counts.tolist(),
+                                    "edges_ms": np.round(edges, 3).tolist()}
+        rel = (times - times[:, :1]) * 1000.0
+        records = [
+            {**{stage: (None if np.isnan(v) else round(float(v), 3))
+                for stage, v in zip(STAGES, row)},
+             "fpga_cycles": None if c < 0 else int(c)}
+            for row, c in zip(rel, cycles)
+        ]
+        lockout = self.suggest_lockout()
+        report = {
+            "summary": self.summary(),
+            "suggested_lockout_ms": None if lockout is None else round(lockout * 1000.0, 3),
+            "histograms": histograms,
+            "records": records,
+        }
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        return report
+
+
+def print_report(report, width=40):
+    """Text rendering of an export_json() report."""
+    for name, stats in report["summary"].items():
+        print(f"{name}: " + "  ".join(f"{k}={v}" for k, v in stats.items()))
+    for name, hist in report["histograms"].items():
+        print(f"\n{name} (ms)")
+        counts = hist["counts"]
+        edges = hist["edges_ms"]
+        peak = max(counts) or 1
+        for count, lo, hi in zip(counts, edges[:-1], edges[1:]):
+            print(f"  {lo:9.3f} - {hi:9.3f} | {'#' * round(width * count / peak)} {count}")
+    lockout = report["suggested_lockout_ms"]
+    print(f"\nSuggested lockout: {'not enough replies' if lockout is None else f'{lockout} ms'}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("usage: python latency_trace.py trace.json")
+        sys.exit(1)
+    with open(sys.argv[1]) as f:
+        print_report(json.load(f))
@@ -0,0 +1,256 @@
+"""
+Link rate and inter-frame gap calibration, saved per serial port.
+
+Sweeps candidate baud rates and probes the link at each one:
+
+    echo    uart_ack_test (test.v): every byte sent must come back as 0xAB.
+            Checks the raw UART only; the gap found is the link floor.
+    framed  classifier bitstream, framed v1 (frame_protocol.py): every
+            request must get a CRC-valid STATUS_OK reply on the first try,
+            and repeats of the same frame must give the same digit.
+    legacy  classifier bitstream that echoes the digit byte after an 0xAA
+            frame: every frame must be answered with a consistent digit.
+
+The highest baud with no errors wins. The inter-frame gap is then sized
+from the measured flush -> reply times (latency_trace.LatencyTrace) and,
+in legacy mode, verified by sending frames back to back at that gap and
+widening it until every one is answered.
+
+Profiles are stored in link_profiles.json next to this script, keyed by
+port; DrawingApp picks up the baud rate when it connects, and the frame
+gap only from a legacy profile (echo and framed profiles store
+frame_gap = null, since their round trip says nothing about how long the
+Arduino needs to shift a frame out).
+
+Usage:
+    python link_calibration.py --port /dev/ttyUSB0 --mode echo
+    python link_calibration.py --port /dev/pts/3 --mode legacy
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import serial
+
+from frame_protocol import LEGACY_HEADER, PipelinedLink
+from latency_trace import LatencyTrace
+from serial_worker import LEGACY_FRAME_GAP
+
+
+PROFILE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "link_profiles.json")
+CANDIDATE_BAUDS = (9600, 19200, 57600, 115200, 230400, 460800, 921600)
+PROBE_MODES = ("echo", "framed", "legacy")
+ECHO_BYTE = 0xAB
+
+# Legacy gap verification widens the gap by this factor up to MAX_GAP
+GAP_STEP = 1.5
+MAX_GAP = 1.0
+
+
+###########################################
+# Probes: return the number of errors, timing each exchange in `trace`
+###########################################
+
+def _test_frames(n, seed=0):
+    """Fixed pseudo-random frames, so every byte value crosses the link."""
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 256, (n, 28 * 28), dtype=np.uint8)
+
+
+def probe_echo(ser, count, trace):
+    """Stop-and-wait single bytes against uart_ack_test."""
+    errors = 0
+    for value in np.arange(count) * 37 % 256:
+        rid = trace.begin()
+        trace.mark(rid, "header")
+        ser.write(bytes([int(value)]))
+        trace.mark(rid, "payload")
+        ser.flush()
+        trace.mark(rid, "flush")
+        ack = ser.read(1)
+        if ack == bytes([ECHO_BYTE]):
+            trace.mark(rid, "reply")
+        else:
+            errors += 1
+    # Anything still arriving is an extra (mis-framed) byte
+    time.sleep(0.05)
+    errors += len(ser.read(ser.in_waiting))
+    return errors
+
+
+def probe_legacy(ser, count, trace, repeats=2):
+    """0xAA frames, one digit byte back per frame."""
+    frames = _test_frames(-(-count // repeats))
+    errors = 0
+    digits = {}
+    for i in range(count):
+        idx = i // repeats
+        frame = frames[idx].tobytes()
+        rid = trace.begin()
+        trace.mark(rid, "header")
+        ser.write(bytes([LEGACY_HEADER]) + frame)
+        trace.mark(rid, "payload")
+        ser.flush()
+        trace.mark(rid, "flush")
+        reply = ser.read(1)
+        if not reply or reply[0] > 9 or digits.setdefault(idx, reply[0]) != reply[0]:
+            errors += 1
+            continue
+        trace.mark(rid, "reply")
+    return errors
+
+
+def probe_framed(ser, count, trace, repeats=2):
+    """Framed v1 requests with a one-deep window, so each one is timed alone."""
+    link = PipelinedLink(ser, window=1, timeout=0.5, retries=0)
+    frames = _test_frames(-(-count // repeats))
+    errors = 0
+    digits = {}
+    for i in range(count):
+        idx = i // repeats
+        rid = trace.begin()
+        trace.mark(rid, "header")
+        link.send(frames[idx].tobytes())
+        trace.mark(rid, "payload")
+        ser.flush()
+        trace.mark(rid, "flush")
+        (done,) = link.drain()
+        reply = done.reply
+        if reply is None or reply.digit is None or digits.setdefault(idx, reply.digit) != reply.digit:
+            errors += 1
+            continue
+        trace.mark(rid, "reply", trace.stamp(rid, "payload") + done.latency)
+    return errors
+
+
+PROBES = {"echo": probe_echo, "framed": probe_framed, "legacy": probe_legacy}
+
+
+def open_port(port, baud, mode, timeout):
+    # The framed link polls with short reads and keeps its own deadlines
+    return serial.serial_for_url(port, baud, timeout=0.05 if mode == "framed" else timeout)
+
+
+def probe_baud(port, baud, mode, count=32, timeout=0.5):
+    """(errors, LatencyTrace) for `count` exchanges at one baud rate."""
+    trace = LatencyTrace(capacity=count)
+    try:
+        with open_port(port, baud, mode, timeout) as ser:
+            ser.reset_input_buffer()
+            errors = PROBES[mode](ser, count, trace)
+    except (serial.SerialException, OSError) as e:
+        print(f"  {baud}: {e}")
+        return count, trace
+    return errors, trace
+
+
+def verify_gap(port, baud, gap, count=16, timeout=0.5):
+    """
+    Send legacy frames back to back, `gap` seconds after each flush,
+    without waiting for replies. True if every frame was answered.
+    """
+    frames = _test_frames(count)
+    with open_port(port, baud, "legacy", timeout) as ser:
+        ser.reset_input_buffer()
+        for frame in frames:
+            ser.write(bytes([LEGACY_HEADER]) + frame.tobytes())
+            ser.flush()
+            time.sleep(gap)
+        replies = ser.read(count)
+    return len(replies) == count and all(r <= 9 for r in replies)
+
+
+###########################################
+# Calibration + per-port profiles
+###########################################
+
+def calibrate(port, mode="legacy", bauds=CANDIDATE_BAUDS, count=32, timeout=0.5,
+              percentile=99, margin=1.25):
+    """Sweep `bauds`, pick the fastest error-free one and size the gap. Returns the profile."""
+    if mode not in PROBE_MODES:
+        raise ValueError(f"mode must be one of {PROBE_MODES}, got {mode!r}")
+
+    results = {}
+    best = None
+    for baud in sorted(bauds):
+        errors, trace = probe_baud(port, baud, mode, count, timeout)
+        board = trace.interval("board") * 1000.0
+        p50 = float(np.median(board)) if board.size else None
+        results[baud] = {"errors": errors, "rtt_p50_ms": None if p50 is None else round(p50, 3)}
+        print(f"  {baud:>7d} baud: {errors} errors / {count}"
+              + ("" if p50 is None else f", round trip p50 {p50:.2f} ms"))
+        if errors == 0:
+            best = (baud, trace)
+
+    if best is None:
+        raise RuntimeError(f"no error-free baud rate on {port} in {sorted(bauds)}")
+    baud, trace = best
+
+    gap = trace.suggest_lockout(percentile, margin, min_samples=1)
+    if mode == "legacy":
+        while not verify_gap(port, baud, gap, timeout=timeout):
+            if gap >= MAX_GAP:
+                print(f"  gap verification failed up to {MAX_GAP} s, keeping {LEGACY_FRAME_GAP} s")
+                gap = LEGACY_FRAME_GAP
+                break
+            gap = min(MAX_GAP, max(gap * GAP_STEP, 1e-3))
+
+    # Only a legacy probe measures the full 0xAA + 784 byte exchange the GUI
+    # locks out between frames; echo / framed gaps are a link round trip
+    # and would let the next frame overrun the Arduino's shift-out.
+    return {
+        "baud": baud,
+        "frame_gap": round(gap, 6) if mode == "legacy" else None,
+        "round_trip_gap": round(gap, 6),
+        "mode": mode,
+        "calibrated_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "sweep": {str(b): r for b, r in results.items()},
+    }
+
+
+def load_profiles(path=PROFILE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def get_profile(port, path=PROFILE_PATH):
+    """Saved profile for `port`, or None if it was never calibrated."""
+    return load_profiles(path).get(port)
+
+
+def save_profile(port, profile, path=PROFILE_PATH):
+    profiles = load_profiles(path)
+    profiles[port] = profile
+    with open(path, "w") as f:
+        json.dump(profiles, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find the fastest reliable baud rate and frame gap.")
+    parser.add_argument("--port", required=True, help="serial port or pyserial URL")
+    parser.add_argument("--mode", choices=PROBE_MODES, default="legacy")
+    parser.add_argument("--bauds", type=int, nargs="+", default=list(CANDIDATE_BAUDS))
+    parser.add_argument("--count", type=int, default=32, help="exchanges per baud rate")
+    parser.add_argument("--timeout", type=float, default=0.5)
+    parser.add_argument("--margin", type=float, default=1.25, help="gap safety factor")
+    parser.add_argument("--profiles", default=PROFILE_PATH)
+    parser.add_argument("--dry-run", action="store_true", help="do not save the profile")
+    args = parser.parse_args()
+
+    print(f"Calibrating {args.port} ({args.mode})...")
+    profile = calibrate(args.port, args.mode, args.bauds, args.count, args.timeout, margin=args.margin)
+    gap = profile["frame_gap"]
+    print(f"Best: {profile['baud']} baud, "
+          + (f"frame gap {gap * 1000.0:.2f} ms" if gap is not None
+             else f"round trip gap {profile['round_trip_gap'] * 1000.0:.2f} ms (not used as a frame gap)"))
+    if not args.dry_run:
+        save_profile(args.port, profile, args.profiles)
+        print(f"Profile saved to {args.profiles}")
+
+
+if __name__ == "__main__":
+    main()
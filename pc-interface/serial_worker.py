@@ -0,0 +1,190 @@
+"""
+Background serial I/O for DrawingApp.
+
+All per-frame work that can take a while (MNIST preprocessing, encoding,
+flush, header write, payload write, waiting for a framed reply, the
+legacy inter-frame lockout, saving the PNG) runs on one worker thread,
+which also closes the port when it is stopped. The GUI thread only puts
+a job on a queue and later picks results off another queue from a
+root.after() poll, so Tk is never called from the worker and never
+waits for it.
+
+Each frame is timed through a latency_trace.LatencyTrace (enqueue, header
+write, payload write, flush, reply), so the legacy lockout can be sized
+from measurements.
+"""
+import queue
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+from PIL import Image
+
+import frame_codec
+from frame_protocol import LEGACY_HEADER
+from latency_trace import LatencyTrace
+from preprocess import preprocess
+
+
+# Give the Arduino time to shift all bits to the FPGA
+# (6272 bit clocks at Arduino digitalWrite speed is well under 150 ms)
+LEGACY_FRAME_GAP = 0.2
+
+# encoding is a frame_codec.ENCODING_CHOICES entry (framed links only)
+SendJob = namedtuple("SendJob", "image preprocess encoding save_image trace_id")
+# status: "sent" / "reply" / "error" for a frame, then "ready" once the
+# next frame may go out (after the legacy lockout). reply is a
+# frame_protocol.Reply for framed links and the digit byte for legacy ones.
+SendResult = namedtuple("SendResult", "status reply error")
+
+
+def save_frame_image(payload, path="digit_image.png", show=True):
+    """Save (and optionally open) the 28x28 frame that was sent."""
+    img = Image.fromarray(np.frombuffer(payload, dtype=np.uint8).reshape((28, 28))).convert("L")
+    img.save(path)
+    if show:
+        img.show()
+    print(f"Image saved as '{path}'")
+
+
+class SerialWorker(threading.Thread):
+    """
+    Owns the serial port while connected. Pass link=None for the legacy
+    0xAA protocol, or a frame_protocol.PipelinedLink for framed requests.
+    Pass a shared LatencyTrace to keep timings across reconnects.
+    """
+
+    def __init__(self, ser, link=None, frame_gap=LEGACY_FRAME_GAP, trace=None):
+        super().__init__(name="serial-worker", daemon=True)
+        self.ser = ser
+        self.link = link
+        self.frame_gap = frame_gap
+        self.trace = trace if trace is not None else LatencyTrace()
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+
+    def submit(self, image, preprocess_frame=False, encoding=frame_codec.AUTO, save_image=False):
+        """
+        Queue a copy of a 28x28 uint8 frame, to be MNIST-preprocessed on
+        the worker if preprocess_frame is set. Returns immediately; the
+        outcome shows up in results.
+        """
+        rid = self.trace.begin()
+        self.jobs.put(SendJob(np.array(image, dtype=np.uint8), preprocess_frame, encoding, save_image, rid))
+
+    def stop(self):
+        """
+        Ask the thread to exit after the frame in progress and close the
+        port. Does not wait: poll is_alive() (e.g. from root.after) to know
+        when the port is free again.
+        """
+        self.jobs.put(None)
+
+    def prepare(self, job):
+        """The 784 pixel bytes to send, and (fmt, encoded) for a framed link."""
+        img = preprocess(job.image) if job.preprocess else job.image
+        payload = np.ascontiguousarray(img, dtype=np.uint8).tobytes()
+        if len(payload) != 28 * 28:
+            raise ValueError(f"Payload length is {len(payload)}, expected 784.")
+        if self.link is None:
+            return payload, None, None
+        fmt, encoded = frame_codec.encode_choice(payload, job.encoding)
+        return payload, fmt, encoded
+
+    def send_legacy(self, payload, rid):
+        # Clear any stale serial data before sending a new frame
+        self.ser.reset_input_buffer()
+        self.ser.reset_output_buffer()
+
+        self.trace.mark(rid, "header")
+        self.ser.write(bytes([LEGACY_HEADER]))
+        # Small pause to let the header leave the USB buffer
+        time.sleep(0.005)
+        self.ser.write(payload)
+        self.trace.mark(rid, "payload")
+        self.ser.flush()
+        self.trace.mark(rid, "flush")
+        return SendResult("sent", None, None)
+
+    def legacy_lockout(self, rid):
+        """
+        Hold the line for frame_gap after the flush. A digit byte the board
+        echoes back in that window is timed as the reply and returned
+        (None if nothing came back).
+        """
+        flushed_at = self.trace.stamp(rid, "flush")
+        deadline = (flushed_at or time.perf_counter()) + self.frame_gap
+
+        digit = None
+        remaining = deadline - time.perf_counter()
+        if remaining > 0:
+            old_timeout = self.ser.timeout
+            self.ser.timeout = remaining
+            try:
+                byte = self.ser.read(1)
+                if byte:
+                    self.trace.mark(rid, "reply")
+                    digit = byte[0]
+            finally:
+                self.ser.timeout = old_timeout
+
+        remaining = deadline - time.perf_counter()
+        if remaining > 0:
+            time.sleep(remaining)
+        return digit
+
+    def send_framed(self, fmt, encoded, rid):
+        # The framed packet goes out in one write: header and payload together
+        self.trace.mark(rid, "header")
+        self.link.send(encoded, fmt=fmt)
+        self.trace.mark(rid, "payload")
+        self.ser.flush()
+        self.trace.mark(rid, "flush")
+
+        replies = [done.reply for done in self.link.drain()]
+        reply = replies[-1] if replies else None
+        if reply is None or reply.digit is None:
+            return SendResult("error", reply, "No valid reply from FPGA")
+        self.trace.mark(rid, "reply")
+        self.trace.set_cycles(rid, reply.cycles)
+        return SendResult("reply", reply, None)
+
+    def run(self):
+        try:
+            self.serve()
+        finally:
+            self.ser.close()
+
+    def serve(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+
+            payload = None
+            try:
+                payload, fmt, encoded = self.prepare(job)
+                if self.link is not None:
+                    result = self.send_framed(fmt, encoded, job.trace_id)
+                else:
+                    result = self.send_legacy(payload, job.trace_id)
+            except Exception as e:
+                result = SendResult("error", None, str(e))
+            self.results.put(result)
+
+            if job.save_image and payload is not None:
+                try:
+                    save_frame_image(payload)
+                except Exception as e:
+                    print(f"Could not save sent image: {e}")
+
+            if self.link is None:
+                try:
+                    digit = self.legacy_lockout(job.trace_id)
+                    if digit is not None:
+                        self.results.put(SendResult("reply", digit, None))
+                except Exception as e:
+                    print(f"Lockout read failed: {e}")
+                    time.sleep(self.frame_gap)
+            self.results.put(SendResult("ready", None, None))
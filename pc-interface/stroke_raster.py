@@ -0,0 +1,87 @@
+"""
+Anti-aliased stroke rasterizer for the 28x28 drawing grid.
+
+Each mouse motion event extends the stroke by a line segment from the
+previous event position. Every grid cell gets an intensity from its
+distance to that segment, so fast mouse movement leaves no gaps, and the
+result is max-composited into the image. Everything is computed over the
+whole grid with NumPy; there is no per-pixel Python loop.
+
+Brushes (distance d in grid cells from the stroke centre line):
+    "gaussian" : 255 inside `radius`, then exp(-(d - radius)^2 / (2 sigma^2))
+    "disk"     : 255 inside `radius`, linear 1-cell anti-aliased edge
+
+The soft edges look much closer to MNIST's anti-aliased digits than the
+old hard 3x3 block of 255.
+"""
+import numpy as np
+
+
+BRUSHES = ("gaussian", "disk")
+
+# Intensities below this are dropped so the Gaussian tail does not leave
+# a faint haze over the whole canvas.
+MIN_INTENSITY = 8
+
+
+class StrokeRasterizer:
+
+    def __init__(self, grid_size=28, cell_size=16, brush="gaussian", radius=0.8, sigma=0.7):
+        if brush not in BRUSHES:
+            raise ValueError(f"brush must be one of {BRUSHES}, got {brush!r}")
+        self.grid_size = grid_size
+        self.cell_size = cell_size
+        self.brush = brush
+        self.radius = radius
+        self.sigma = sigma
+        self.last = None
+
+        # Cell centres in grid units, (grid, grid) each
+        centers = np.arange(grid_size) + 0.5
+        self.cy, self.cx = np.meshgrid(centers, centers, indexing="ij")
+
+    def to_grid(self, x, y):
+        """Canvas pixel coordinates -> continuous grid coordinates."""
+        return x / self.cell_size, y / self.cell_size
+
+    def segment_distance(self, p0, p1):
+        """Distance from every cell centre to the segment p0-p1 (grid units)."""
+        (x0, y0), (x1, y1) = p0, p1
+        dx, dy = x1 - x0, y1 - y0
+        length2 = dx * dx + dy * dy
+        if length2 == 0.0:
+            t = 0.0
+        else:
+            t = np.clip(((self.cx - x0) * dx + (self.cy - y0) * dy) / length2, 0.0, 1.0)
+        return np.hypot(self.cx - (x0 + t * dx), self.cy - (y0 + t * dy))
+
+    def brush_intensity(self, dist):
+        """Brush profile over a distance map -> uint8 intensities."""
+        over = np.maximum(dist - self.radius, 0.0)
+        if self.brush == "gaussian":
+            value = 255.0 * np.exp(-(over * over) / (2.0 * self.sigma * self.sigma))
+        else:
+            value = 255.0 * np.clip(1.0 - over, 0.0, 1.0)
+        value = np.round(value)
+        value[value < MIN_INTENSITY] = 0
+        return value.astype(np.uint8)
+
+    def stamp(self, img, p0, p1):
+        """Max-composite the segment p0-p1 into img (in place)."""
+        np.maximum(img, self.brush_intensity(self.segment_distance(p0, p1)), out=img)
+
+    def begin(self, img, x, y):
+        """Start a stroke at canvas position (x, y)."""
+        self.last = self.to_grid(x, y)
+        self.stamp(img, self.last, self.last)
+
+    def extend(self, img, x, y):
+        """Continue the stroke to canvas position (x, y)."""
+        point = self.to_grid(x, y)
+        if self.last is None:
+            self.last = point
+        self.stamp(img, self.last, point)
+        self.last = point
+
+    def end(self):
+        self.last = None
@@ -0,0 +1,160 @@
+"""
+Round-trip tests for frame_codec.py: every format on synthetic canvases,
+random frames and anti-aliased strokes (as drawn and after preprocess()),
+malformed payloads, and the lossy auto mode's error bound.
+
+Run with `python -m pytest test_frame_codec.py`.
+"""
+import numpy as np
+import pytest
+
+import frame_codec
+from frame_codec import (ENCODERS, FMT_BIN1, FMT_GRAY4, FMT_RAW, FMT_RLE, FMT_RLE4,
+                         FRAME_PIXELS, decode, encode, encode_auto, quantize4)
+from preprocess import preprocess
+from stroke_raster import StrokeRasterizer
+
+
+# Reference strokes in canvas pixels (16 px per cell), as DrawingApp gets them
+REFERENCE_STROKES = {
+    "one": [[(224, 80), (224, 380)]],
+    "seven": [[(120, 90), (330, 90), (190, 380)]],
+    "zero": [[(224, 80), (320, 140), (330, 300), (224, 380), (130, 300), (120, 140), (224, 80)]],
+    "four": [[(280, 80), (110, 270), (340, 270)], [(280, 80), (280, 390)]],
+}
+
+
+def draw(strokes, steps=8):
+    """Rasterize polyline strokes with the GUI's anti-aliased brush."""
+    img = np.zeros((28, 28), dtype=np.uint8)
+    raster = StrokeRasterizer()
+    for points in strokes:
+        raster.begin(img, *points[0])
+        for (x0, y0), (x1, y1) in zip(points[:-1], points[1:]):
+            # Several motion events per segment, like a mouse drag
+            for t in np.linspace(0.0, 1.0, steps + 1)[1:]:
+                raster.extend(img, x0 + (x1 - x0) * t, y0 + (y1 - y0) * t)
+        raster.end()
+    return img
+
+
+def synthetic_frames():
+    rng = np.random.default_rng(0)
+    canvas = np.zeros((28, 28), dtype=np.uint8)
+    canvas[6:22, 12:15] = 255                # a stroked "1"
+    return {
+        "canvas": canvas,
+        "gray4": (rng.integers(0, 16, (28, 28)) * 17).astype(np.uint8),
+        "noise": rng.integers(0, 256, (28, 28)).astype(np.uint8),
+        "blank": np.zeros((28, 28), dtype=np.uint8),
+        "full": np.full((28, 28), 255, dtype=np.uint8),
+    }
+
+
+def stroke_frames():
+    frames = {}
+    for name, strokes in REFERENCE_STROKES.items():
+        drawn = draw(strokes)
+        frames[name] = drawn
+        frames[f"{name}/pp"] = preprocess(drawn)
+    return frames
+
+
+FRAMES = {**synthetic_frames(), **stroke_frames()}
+STROKES = stroke_frames()
+
+
+def exact_for(fmt, x):
+    """Whether fmt is lossless on the flat frame x."""
+    if fmt in (FMT_RAW, FMT_RLE):
+        return True
+    if fmt == FMT_BIN1:
+        return bool(np.all((x == 0) | (x == 255)))
+    return not np.any(x % 17)
+
+
+@pytest.mark.parametrize("name", FRAMES)
+@pytest.mark.parametrize("fmt", ENCODERS)
+def test_round_trip(name, fmt):
+    frame = FRAMES[name]
+    x = frame.reshape(-1)
+    decoded = decode(encode(frame, fmt), fmt)
+    assert decoded.dtype == np.uint8 and decoded.size == FRAME_PIXELS
+    if exact_for(fmt, x):
+        assert np.array_equal(decoded, x)
+    elif fmt in (FMT_GRAY4, FMT_RLE4):
+        assert np.array_equal(decoded, quantize4(x))
+    else:
+        assert np.array_equal(decoded, np.where(x >= 128, 255, 0))
+
+
+def test_bytes_input_matches_array():
+    frame = STROKES["seven"]
+    for fmt in ENCODERS:
+        assert encode(frame.tobytes(), fmt) == encode(frame, fmt)
+
+
+@pytest.mark.parametrize("name", FRAMES)
+def test_auto_is_exact(name):
+    x = FRAMES[name].reshape(-1)
+    fmt, payload = encode_auto(FRAMES[name])
+    assert np.array_equal(decode(payload, fmt), x)
+    assert len(payload) <= FRAME_PIXELS
+
+
+@pytest.mark.parametrize("name", FRAMES)
+def test_lossy_auto_error_bound(name):
+    x = FRAMES[name].reshape(-1)
+    fmt, payload = encode_auto(FRAMES[name], lossy=True)
+    decoded = decode(payload, fmt)
+    assert np.array_equal(decoded, quantize4(x))
+    assert np.max(np.abs(decoded.astype(np.int64) - x)) <= 15
+    assert len(payload) <= len(encode_auto(FRAMES[name])[1])
+
+
+def test_auto_ratios_on_strokes():
+    # Lossless stays short of 5x on anti-aliased strokes; 4-bit RLE is
+    # what gets past 3.5x
+    for name, frame in STROKES.items():
+        _, payload = encode_auto(frame)
+        fmt, lossy = encode_auto(frame, lossy=True)
+        assert FRAME_PIXELS / len(payload) >= 1.4, name
+        assert fmt == FMT_RLE4, name
+        assert FRAME_PIXELS / len(lossy) >= 3.5, name
+
+
+def test_long_runs_are_split():
+    blank = np.zeros(FRAME_PIXELS, dtype=np.uint8)
+    rle = encode(blank, FMT_RLE)
+    assert len(rle) == 2 * -(-FRAME_PIXELS // frame_codec.MAX_RUN)
+    assert len(encode(blank, FMT_RLE4)) == -(-FRAME_PIXELS // frame_codec.MAX_RUN4)
+
+
+@pytest.mark.parametrize("fmt", ENCODERS)
+@pytest.mark.parametrize("delta", (-2, -1, 1, 2))
+def test_bad_payload_length(fmt, delta):
+    payload = encode(STROKES["zero"], fmt)
+    if delta < 0:
+        bad = payload[:delta]
+    else:
+        bad = payload + payload[-delta:]
+    with pytest.raises(ValueError):
+        decode(bad, fmt)
+
+
+def test_bad_rle_payloads():
+    with pytest.raises(ValueError):
+        decode(b"\x00\x10" + bytes([255, 0, 255, 0, 255, 0, 19, 0]), FMT_RLE)   # run length 0
+    with pytest.raises(ValueError):
+        decode(b"", FMT_RLE)
+    with pytest.raises(ValueError):
+        decode(b"", FMT_RLE4)
+
+
+def test_bad_frame_and_format():
+    with pytest.raises(ValueError):
+        encode(np.zeros(783, dtype=np.uint8), FMT_RAW)
+    with pytest.raises(ValueError):
+        encode(np.zeros(FRAME_PIXELS, dtype=np.uint8), 0x7F)
+    with pytest.raises(ValueError):
+        decode(bytes(FRAME_PIXELS), 0x7F)
@@ -0,0 +1,98 @@
+// tb_fc_core_vec.v
+// Regression testbench for fc_core: runs a directory of feature vectors
+// through one fc_core instance and prints the digit, cycle count and the
+// 10 scores of each, for Model/cosim.py to diff against the golden model.
+//
+// Run from a vector directory holding (written by cosim.py):
+//   - fc_w_flat.mem, fc_b.mem : weights, loaded by fc_core at time 0
+//   - features.mem            : vector 0 (fc_core's own $readmemh)
+//   - vec_00000.mem, ...      : one 400-byte feature vector each
+// Plusargs: +N=<number of vectors> (default 1)
+//
+// One line per vector:
+//   VEC <i> DIGIT <d> CYCLES <c> SCORES <s0> ... <s9>
+// CYCLES counts clock edges from the one that samples start to the one
+// that raises done (4022 for the single-MAC FSM).
+`timescale 1ns/1ps
+
+module tb_fc_core_vec;
+
+    localparam N_IN       = 400;
+    localparam N_OUT      = 10;
+    localparam MAX_CYCLES = 100000;
+
+    reg clk;
+    reg reset_n;
+    reg start;
+
+    wire       done;
+    wire [3:0] pred_digit;
+
+    fc_core #(
+        .N_IN  (N_IN),
+        .N_OUT (N_OUT)
+    ) dut (
+        .clk        (clk),
+        .reset_n    (reset_n),
+        .start      (start),
+        .done       (done),
+        .pred_digit (pred_digit)
+    );
+
+    // 50 MHz clock (20 ns period)
+    initial begin
+        clk = 1'b0;
+        forever #10 clk = ~clk;
+    end
+
+    integer n_vec;
+    integer v;
+    integer c;
+    integer cycles;
+    reg     done_seen;
+    reg [8*16-1:0] fname;
+
+    initial begin
+        if (!$value$plusargs("N=%d", n_vec)) begin
+            n_vec = 1;
+        end
+
+        reset_n = 1'b0;
+        start   = 1'b0;
+        #100;
+        reset_n = 1'b1;
+
+        for (v = 0; v < n_vec; v = v + 1) begin
+            // Load the next vector while the core is idle
+            $sformat(fname, "vec_%05d.mem", v);
+            $readmemh(fname, dut.feats);
+
+            // start is sampled on the next rising edge (cycle 1)
+            @(negedge clk);
+            start     = 1'b1;
+            cycles    = 0;
+            done_seen = 1'b0;
+            while (!done_seen && cycles < MAX_CYCLES) begin
+                @(posedge clk);
+                #1;
+                start     = 1'b0;
+                cycles    = cycles + 1;
+                done_seen = done;
+            end
+
+            if (!done_seen) begin
+                $display("VEC %0d TIMEOUT", v);
+            end else begin
+                $write("VEC %0d DIGIT %0d CYCLES %0d SCORES", v, pred_digit, cycles);
+                for (c = 0; c < N_OUT; c = c + 1) begin
+                    $write(" %0d", dut.scores[c]);
+                end
+                $write("\n");
+            end
+        end
+
+        $display("DONE %0d", n_vec);
+        $finish;
+    end
+
+endmodule